@@ -1,13 +1,22 @@
+import signal
+import sys
 from flask import Flask
 from flask_cors import CORS
 from auth import auth_bp
 from prediction import prediction_bp
+from db import ensure_indexes
+from metrics import metrics_bp
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Next-Cursor', 'Server-Timing'])
 
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(prediction_bp, url_prefix='/api/predict')
+app.register_blueprint(metrics_bp)
+
+ensure_indexes()
 
 if __name__ == '__main__':
+    # Exit normally on SIGTERM so atexit hooks (write-behind flush) run
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
     app.run(debug=True, use_reloader=False)  
\ No newline at end of file
@@ -0,0 +1,268 @@
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from inference import CompiledForest
+from lookup import LookupTable, parse_grid_spec
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Versioned bundles live in ARTIFACT_DIR/<version>/ and ARTIFACT_DIR/CURRENT
+# names the one to serve. Without a bundle the flat backend/*.pkl files are used.
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", os.path.join(BACKEND_DIR, "artifacts"))
+# Memory-map the compiled forest arrays instead of reading them into the heap
+MODEL_MMAP = os.getenv("MODEL_MMAP", "0") == "1"
+# Seconds between checks of CURRENT for a newer bundle; 0 disables hot reload
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", 10))
+
+# INFERENCE_ENGINE picks how levels are computed:
+#   compiled (default) - array-backed copy of the scaler + forest; batches
+#                        over COMPILED_MAX_BATCH rows find their leaves with
+#                        sklearn's apply. Matches model.predict exactly
+#   sklearn            - always scaler.transform + model.predict
+#   lookup             - nearest point of a precomputed LOOKUP_GRID grid
+#                        (approximate, see lookup.py)
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "compiled")
+COMPILED_MAX_BATCH = int(os.getenv("COMPILED_MAX_BATCH", 512))
+LOOKUP_GRID = os.getenv("LOOKUP_GRID", "128")
+LOOKUP_CACHE_DIR = os.getenv("LOOKUP_CACHE_DIR", BACKEND_DIR)
+
+BUNDLE_FILES = {
+    'model': 'model.pkl',
+    'scaler': 'scaler.pkl',
+    'shap_importance': 'feature_importance_shap.pkl',
+    'column_means': 'column_means.pkl',
+}
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ModelBundle:
+    """One model version: scaler, forest, SHAP summary and column means.
+
+    The sklearn forest is only unpickled when a batch too large for the
+    compiled forest needs it (or to compile a legacy bundle).
+    """
+
+    def __init__(self, path, manifest=None, mmap=False):
+        started = time.perf_counter()
+        self.path = path
+        self.manifest = manifest or {}
+        self.version = self.manifest.get('version', 'legacy')
+        self._model = None
+        self._model_lock = threading.Lock()
+
+        self.scaler = joblib.load(self._file('scaler'))
+        self.shap_importance = joblib.load(self._file('shap_importance'))
+        self.column_means = joblib.load(self._file('column_means'))
+        self.features = self.manifest.get('features') or list(self.scaler.feature_names_in_)
+        self.mean_vector = np.array([self.column_means[col] for col in self.features])
+
+        # The SHAP summary is fixed per level, so rank causes once
+        self.top_causes = {
+            int(level): sorted(weights.items(), key=lambda x: -x[1])[:2]
+            for level, weights in self.shap_importance.items()
+        }
+
+        compiled_dir = os.path.join(path, 'compiled')
+        if os.path.isdir(compiled_dir):
+            self.compiled = CompiledForest.load(compiled_dir, mmap=mmap)
+        else:
+            self.compiled = CompiledForest.from_estimators(self.model, self.scaler)
+
+        self.lookup_table = None
+        if INFERENCE_ENGINE == 'lookup':
+            self.lookup_table = LookupTable.load_or_build(
+                self.predict_exact, parse_grid_spec(LOOKUP_GRID), LOOKUP_CACHE_DIR,
+                [self._file('scaler'), self._file('model')]
+            )
+
+        self.load_seconds = time.perf_counter() - started
+
+    def _file(self, key):
+        return os.path.join(self.path, BUNDLE_FILES[key])
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = joblib.load(self._file('model'))
+        return self._model
+
+    def leaves(self, X):
+        """Global leaf index per (row, tree); large batches use sklearn's Cython apply."""
+        if len(X) <= COMPILED_MAX_BATCH:
+            return self.compiled.apply(self.compiled.transform(X))
+        local = self.model.apply(self.scaler.transform(pd.DataFrame(X, columns=self.features)))
+        return local + self.compiled.roots
+
+    def predict_exact(self, X):
+        if INFERENCE_ENGINE == 'sklearn':
+            return self.model.predict(self.scaler.transform(pd.DataFrame(X, columns=self.features)))
+        return self.compiled.predict_from_leaves(self.leaves(X))
+
+    def predict(self, X):
+        if self.lookup_table is not None:
+            return self.lookup_table.predict(X)
+        return self.predict_exact(X)
+
+    def predict_with_leaves(self, X):
+        """Levels plus the leaves behind them, or None when no traversal was needed."""
+        if self.lookup_table is not None or INFERENCE_ENGINE == 'sklearn':
+            return self.predict(X), None
+        leaves = self.leaves(X)
+        return self.compiled.predict_from_leaves(leaves), leaves
+
+    def info(self):
+        return {
+            "version": self.version,
+            "path": self.path,
+            "created_at": self.manifest.get('created_at'),
+            "load_seconds": self.load_seconds,
+            "model_loaded": self._model is not None,
+            "engine": INFERENCE_ENGINE,
+        }
+
+
+# ---------------------- bundle files ----------------------
+def write_bundle(model, scaler, shap_summary, column_means, root=ARTIFACT_DIR, version=None):
+    """Write a new bundle directory with a checksummed manifest and point CURRENT at it."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    version = version or now.strftime("%Y%m%dT%H%M%S%fZ")
+    final_dir = os.path.join(root, version)
+    tmp_dir = os.path.join(root, f".{version}.tmp")
+    os.makedirs(tmp_dir)
+
+    joblib.dump(model, os.path.join(tmp_dir, BUNDLE_FILES['model']))
+    joblib.dump(scaler, os.path.join(tmp_dir, BUNDLE_FILES['scaler']))
+    joblib.dump(shap_summary, os.path.join(tmp_dir, BUNDLE_FILES['shap_importance']))
+    joblib.dump(dict(column_means), os.path.join(tmp_dir, BUNDLE_FILES['column_means']))
+    CompiledForest.from_estimators(model, scaler).save(os.path.join(tmp_dir, 'compiled'))
+
+    files = {}
+    for dirpath, _, filenames in os.walk(tmp_dir):
+        for name in filenames:
+            full = os.path.join(dirpath, name)
+            rel = os.path.relpath(full, tmp_dir).replace(os.sep, '/')
+            files[rel] = {"sha256": sha256_file(full), "bytes": os.path.getsize(full)}
+
+    manifest = {
+        "version": version,
+        "created_at": now.isoformat(),
+        "sklearn_version": sklearn.__version__,
+        "features": list(scaler.feature_names_in_),
+        "files": files,
+    }
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Publish the directory, then the pointer, each with an atomic rename
+    os.replace(tmp_dir, final_dir)
+    pointer_tmp = os.path.join(root, f".CURRENT.{os.getpid()}.tmp")
+    with open(pointer_tmp, 'w') as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(root, 'CURRENT'))
+    return final_dir
+
+
+def current_version(root=ARTIFACT_DIR):
+    try:
+        with open(os.path.join(root, 'CURRENT')) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_bundle(version=None, root=ARTIFACT_DIR, mmap=MODEL_MMAP):
+    """Load a bundle by version (default: CURRENT), verifying checksums; legacy files if none."""
+    version = version or current_version(root)
+    if version is None:
+        return ModelBundle(BACKEND_DIR, mmap=mmap)
+
+    path = os.path.join(root, version)
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    for rel, meta in manifest['files'].items():
+        if sha256_file(os.path.join(path, rel)) != meta['sha256']:
+            raise ValueError(f"Checksum mismatch for {rel} in model bundle {version}")
+    return ModelBundle(path, manifest, mmap=mmap)
+
+
+# ---------------------- serving state ----------------------
+_current = None
+_current_lock = threading.Lock()
+reload_stats = {"reloads": 0, "failures": 0, "last_reload_seconds": None, "last_error": None}
+
+
+def current_bundle():
+    """Bundle to serve, loaded on first use. Callers should fetch it once per request."""
+    global _current
+    bundle = _current
+    if bundle is None:
+        with _current_lock:
+            if _current is None:
+                _current = load_bundle()
+                start_reload_watcher()
+            bundle = _current
+    return bundle
+
+
+def preload_bundle(with_model=False):
+    """Load the bundle to serve without starting the reload watcher, for a parent
+    process about to fork workers (threads do not survive a fork; each worker
+    calls start_reload_watcher). ``with_model`` also unpickles the sklearn forest.
+    """
+    global _current
+    with _current_lock:
+        if _current is None:
+            _current = load_bundle()
+    if with_model:
+        _current.model
+    return _current
+
+
+def start_reload_watcher():
+    if MODEL_RELOAD_INTERVAL > 0:
+        threading.Thread(target=_watch, name='model-reloader', daemon=True).start()
+
+
+def reload_if_changed(root=ARTIFACT_DIR):
+    """Swap in the CURRENT bundle if it differs from the one being served."""
+    global _current
+    version = current_version(root)
+    if _current is not None and (version or 'legacy') == _current.version:
+        return False
+
+    started = time.perf_counter()
+    try:
+        bundle = load_bundle(version, root)
+    except Exception as exc:
+        # Keep serving the previous bundle
+        reload_stats["failures"] += 1
+        reload_stats["last_error"] = f"{version}: {exc}"
+        return False
+
+    # In-flight requests keep the bundle they already fetched
+    _current = bundle
+    reload_stats["reloads"] += 1
+    reload_stats["last_reload_seconds"] = time.perf_counter() - started
+    return True
+
+
+def _watch():
+    while True:
+        time.sleep(MODEL_RELOAD_INTERVAL)
+        reload_if_changed()
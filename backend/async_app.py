@@ -0,0 +1,68 @@
+# Async serving mode: the auth and prediction routes on Quart. Mongo calls go
+# through PyMongo's AsyncMongoClient, so a request waiting on the database
+# holds no thread, and CPU-bound work (bcrypt, the forest, trends) runs on a
+# bounded pool of ASYNC_CPU_WORKERS threads. The live stream, /jobs and /export
+# routes and NDJSON /csv responses are only served by the sync app.
+#
+# Needs quart, quart-cors, hypercorn and pymongo>=4.13 (see
+# requirements-optional.txt) and a real MongoDB. Run from backend/:
+#
+#     hypercorn async_app:app --bind 127.0.0.1:5000 --workers 2
+#
+# Not yet load-tested against serve.py: compare the two on your own MongoDB
+# with `python benchmarks.py async` before choosing this mode.
+import signal
+import sys
+from quart import Quart, Response, request
+from quart_cors import cors
+import metrics
+from artifacts import current_bundle
+from async_auth import auth_bp
+from async_db import client, ensure_indexes
+from async_prediction import prediction_bp
+from utils import run_cpu
+
+app = Quart(__name__)
+app = cors(app, allow_origin="*", expose_headers=['X-Next-Cursor', 'Server-Timing'])
+
+app.register_blueprint(auth_bp, url_prefix='/api/auth')
+app.register_blueprint(prediction_bp, url_prefix='/api/predict')
+
+
+@app.before_serving
+async def startup():
+    await ensure_indexes()
+    # Load the model before the first request instead of during it
+    await run_cpu(current_bundle)
+
+
+@app.after_serving
+async def shutdown():
+    await client.close()
+
+
+@app.before_request
+async def start_timing():
+    metrics.begin(request.endpoint or 'unmatched', request.method)
+
+
+@app.after_request
+async def add_server_timing(response):
+    state = metrics.current()
+    if state is not None:
+        state.status = str(response.status_code)
+        response.headers['Server-Timing'] = metrics.server_timing(state)
+        metrics.finish(state)
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics_endpoint():
+    if not metrics.authorized(request.headers.get('Authorization', '')):
+        return {"error": "Unauthorized"}, 401
+    return Response(metrics.exposition(), mimetype='text/plain; version=0.0.4')
+
+
+if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    app.run()
@@ -0,0 +1,151 @@
+import functools
+from quart import Blueprint, request, jsonify
+from async_db import revoked_tokens_collection, users_collection
+from models.user import check_password, hash_password, user_cache
+from utils import (RevocationCache, generate_token, revocation_cache, run_cpu, token_cache, token_claims,
+                   token_revocation, user_revocation)
+from metrics import timed
+
+auth_bp = Blueprint('auth', __name__)
+
+
+def bearer_token():
+    return request.headers.get('Authorization', '').replace('Bearer ', '')
+
+
+async def verify_token(token):
+    """utils.verify_token on the async client."""
+    claims = token_claims(token)
+    if claims is None:
+        return None
+    if revocation_cache.begin_refresh():
+        try:
+            docs = await revoked_tokens_collection.find({}, RevocationCache.projection).to_list()
+        except Exception as exc:
+            revocation_cache.abort_refresh(exc)
+            raise
+        revocation_cache.finish_refresh(docs)
+    return None if revocation_cache.is_revoked(claims) else claims[0]
+
+
+async def revoke_token(token):
+    claims = token_claims(token)
+    if claims is None:
+        return
+    doc = token_revocation(claims)
+    await revoked_tokens_collection.replace_one({"_id": doc["_id"]}, doc, upsert=True)
+    revocation_cache.add(doc)
+
+
+async def revoke_user_tokens(username):
+    doc = user_revocation(username)
+    await revoked_tokens_collection.replace_one({"_id": doc["_id"]}, doc, upsert=True)
+    revocation_cache.add(doc)
+
+
+def require_auth(view):
+    """utils.require_auth for async views."""
+    @functools.wraps(view)
+    async def wrapped(*args, **kwargs):
+        with timed('jwt'):
+            username = await verify_token(bearer_token())
+        if not username:
+            return jsonify({"error": "Unauthorized"}), 401
+        return await view(username, *args, **kwargs)
+    return wrapped
+
+
+async def get_user(username):
+    return await users_collection.find_one({"username": username})
+
+
+async def get_user_cached(username):
+    user = user_cache.get(username)
+    if user is None:
+        user = await get_user(username)
+        if user is not None:
+            user_cache.put(username, user)
+    return user
+
+
+@auth_bp.route('/register', methods=['POST'])
+async def register():
+    data = await request.get_json()
+    username = data.get('username')
+    password = data.get('password')
+    email = data.get('email')
+
+    if not all([username, password, email]):
+        return jsonify({"error": "Missing fields"}), 400
+
+    if await get_user(username):
+        return jsonify({"error": "Username already exists"}), 400
+    hashed = await run_cpu(hash_password, password)
+    await users_collection.insert_one({"username": username, "password": hashed, "email": email})
+
+    return jsonify({"message": "User registered successfully"}), 201
+
+@auth_bp.route('/login', methods=['POST'])
+async def login():
+    data = await request.get_json()
+    username = data.get('username')
+    password = data.get('password')
+
+    with timed('user_lookup'):
+        user = await get_user(username)
+    if not user:
+        return jsonify({"error": "Invalid username or password"}), 401
+
+    with timed('password'):
+        valid = await run_cpu(check_password, password, user['password'])
+    if not valid:
+        return jsonify({"error": "Invalid username or password"}), 401
+
+    with timed('jwt_sign'):
+        token = generate_token(username)
+    return jsonify({"token": token})
+
+
+@auth_bp.route('/logout', methods=['POST'])
+@require_auth
+async def logout(username):
+    await revoke_token(bearer_token())
+    return jsonify({"message": "Logged out"})
+
+@auth_bp.route('/password', methods=['POST'])
+@require_auth
+async def change_password(username):
+    data = await request.get_json() or {}
+    current = data.get('current_password')
+    new = data.get('new_password')
+    if not all([current, new]):
+        return jsonify({"error": "Missing fields"}), 400
+
+    user = await get_user(username)
+    if not user or not await run_cpu(check_password, current, user['password']):
+        return jsonify({"error": "Invalid username or password"}), 401
+
+    hashed = await run_cpu(hash_password, new)
+    await users_collection.update_one({"username": username}, {"$set": {"password": hashed}})
+    user_cache.pop(username)
+    # Sessions opened with the old password end here, this one included
+    await revoke_user_tokens(username)
+    return jsonify({"token": generate_token(username)})
+
+@auth_bp.route('/profile', methods=['GET'])
+@require_auth
+async def profile(username):
+    user = await get_user_cached(username)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    return jsonify({
+        "username": user.get("username", ""),
+        "email": user.get("email", "")
+    }), 200
+
+@auth_bp.route('/cache', methods=['GET'])
+@require_auth
+async def cache_stats(username):
+    return jsonify({"tokens": token_cache.stats(), "users": user_cache.stats(),
+                    "revocations": revocation_cache.stats()})
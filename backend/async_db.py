@@ -0,0 +1,25 @@
+import os
+from pymongo import AsyncMongoClient
+from constants import DB_NAME, INDEXES
+
+MONGO_URI = os.getenv("MONGO_URI")
+# Connections one async worker may open; all of its in-flight requests share
+# them instead of each holding a thread while Mongo answers
+ASYNC_MONGO_POOL_SIZE = int(os.getenv("ASYNC_MONGO_POOL_SIZE", 100))
+
+if MONGO_URI and MONGO_URI.startswith("mongomock://"):
+    raise RuntimeError("The async app needs a real MongoDB; mongomock has no async client")
+
+client = AsyncMongoClient(MONGO_URI, maxPoolSize=ASYNC_MONGO_POOL_SIZE)
+db = client[DB_NAME]
+
+users_collection = db['users']
+predictions_collection = db['predictions']
+rollups_collection = db['prediction_rollups']
+uploads_collection = db['uploads']
+revoked_tokens_collection = db['revoked_tokens']
+
+
+async def ensure_indexes():
+    for collection, keys, options in INDEXES:
+        await db[collection].create_index(keys, **options)
@@ -0,0 +1,192 @@
+import pandas as pd
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+from quart import Blueprint, Response, current_app, request, jsonify
+from async_auth import require_auth
+from async_db import predictions_collection, rollups_collection, uploads_collection
+from artifacts import current_bundle, reload_stats
+from encoding import compress, encode, negotiate
+from explain import ATTRIBUTION_METHODS, FEEDBACK_ATTRIBUTION, attribution_cache
+from metrics import timed
+from rollups import apply_rollups_async
+from dedupe import UPLOAD_DEDUP, duplicate_mask, row_hashes, stored_hash_queries
+from utils import run_cpu
+from writer import new_documents
+from constants import INSERT_BATCH_SIZE, ROLLUPS_ENABLED
+# Validation, scoring and response shaping are shared with the sync blueprint;
+# only the Mongo calls differ
+from scoring import (
+    HISTORY_PAGE_SIZE, STUDENT_HISTORY_PAGE_SIZE, expected_columns,
+    check_manual_input, score_manual, score_rows, history_find, history_result, student_id_match,
+    summary_query, summary_body, trend_query, trend_body, trend_projection, trend_too_large, TREND_MAX_DOCS,
+)
+
+prediction_bp = Blueprint('prediction', __name__)
+
+
+async def save_predictions(docs):
+    """prediction.save_predictions: returns how many documents were new."""
+    inserted = []
+    for start in range(0, len(docs), INSERT_BATCH_SIZE):
+        batch = docs[start:start + INSERT_BATCH_SIZE]
+        try:
+            await predictions_collection.insert_many(batch, ordered=False)
+            inserted += batch
+        except BulkWriteError as exc:
+            inserted += new_documents(batch, exc)
+    if ROLLUPS_ENABLED and inserted:
+        await apply_rollups_async(rollups_collection, inserted)
+    return len(inserted)
+
+
+def response_format():
+    fmt, error = negotiate(request.args, request.accept_mimetypes)
+    if error:
+        return None, (jsonify({"error": error}), 406)
+    return fmt, None
+
+
+async def encoded_response(body, fmt, rows_key=None):
+    """prediction.encoded_response, serializing and compressing off the event loop."""
+    with timed('serialize'):
+        data, mimetype = await run_cpu(encode, body, fmt, current_app.json.dumps, rows_key)
+    with timed('compress'):
+        data, content_encoding = await run_cpu(compress, data, request.accept_encodings)
+    response = Response(data, mimetype=mimetype)
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    response.vary.update(['Accept', 'Accept-Encoding'])
+    return response
+
+# ---------------------- /manual route ----------------------
+@prediction_bp.route('/manual', methods=['POST'])
+@require_auth
+async def manual_predict(username):
+    student_id, data_for_model, error = check_manual_input(await request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+
+    doc, body = await run_cpu(score_manual, username, student_id, data_for_model, current_bundle())
+    with timed('insert'):
+        await save_predictions([doc])
+
+    return jsonify(body)
+
+@prediction_bp.route('/model', methods=['GET'])
+@require_auth
+async def model_info(username):
+    return jsonify({
+        **current_bundle().info(),
+        "reload": reload_stats,
+        "feedback_attribution": FEEDBACK_ATTRIBUTION,
+        "attribution_method": ATTRIBUTION_METHODS.get(FEEDBACK_ATTRIBUTION),
+        "attribution_cache": attribution_cache.stats()
+    })
+
+# ---------------------- /csv route ----------------------
+@prediction_bp.route('/csv', methods=['POST'])
+@require_auth
+async def csv_predict(username):
+    # Streaming (NDJSON) responses are only served by the sync app
+    with timed('upload'):
+        files = await request.files
+    if 'file' not in files:
+        return jsonify({"error": "CSV file is missing"}), 400
+    fmt, error = response_format()
+    if error:
+        return error
+
+    required_columns = expected_columns + ['student_id']
+    with timed('parse'):
+        df = await run_cpu(pd.read_csv, files['file'].stream)
+    if not all(col in df.columns for col in required_columns):
+        return jsonify({"error": f"CSV must contain columns: {required_columns}"}), 400
+
+    hashes, duplicates = None, 0
+    if UPLOAD_DEDUP:
+        # Whole-file caching is only done by the sync app; stored rows are skipped here too
+        with timed('dedupe'):
+            hashes = await run_cpu(row_hashes, df, expected_columns)
+            stored = set()
+            for query in stored_hash_queries(username, hashes):
+                cursor = predictions_collection.find(query, {"_id": 0, "row_hash": 1})
+                stored.update([doc["row_hash"] async for doc in cursor])
+            repeated = duplicate_mask(hashes, stored)
+        if repeated.any():
+            df, hashes = df[~repeated], hashes[~repeated]
+            duplicates = int(repeated.sum())
+
+    docs, records, rejected = await run_cpu(score_rows, df, username, current_bundle(), hashes)
+    if not records and not duplicates:
+        return jsonify({
+            "error": "All valid rows were skipped due to out-of-range values.",
+            "rejected": rejected
+        }), 400
+    with timed('insert'):
+        new = await save_predictions(docs)
+
+    body = {"results": records, "rejected": rejected, "duplicates": {"file": False, "rows": duplicates + len(docs) - new}}
+    return await encoded_response(body, fmt, 'results')
+
+# ---------------------- /history route ----------------------
+async def history_page(query, default_limit, default_order):
+    fmt, error = response_format()
+    if error:
+        return error
+    find, error = history_find(request.args, query, default_limit, default_order)
+    if error:
+        return jsonify({"error": error}), 400
+
+    docs, next_cursor = history_result(await predictions_collection.find(**find).to_list(), find)
+    response = await encoded_response(docs, fmt)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+@prediction_bp.route('/history', methods=['GET'])
+@require_auth
+async def prediction_history(username):
+    return await history_page({"username": username}, HISTORY_PAGE_SIZE, 'desc')
+
+@prediction_bp.route('/history/<string:history_id>', methods=['DELETE'])
+@require_auth
+async def delete_history_item(username, history_id):
+    deleted = await predictions_collection.find_one_and_delete({
+        "_id": ObjectId(history_id),
+        "username": username
+    })
+
+    if deleted is not None:
+        if ROLLUPS_ENABLED:
+            await apply_rollups_async(rollups_collection, [deleted], sign=-1)
+        # The sync app's cached uploads would still list the deleted row
+        await uploads_collection.delete_many({"username": username})
+        return jsonify({"message": "History item deleted successfully"})
+    return jsonify({"error": "History item not found or not authorized"}), 404
+
+@prediction_bp.route('/history/student/<string:student_id>', methods=['GET'])
+@require_auth
+async def get_history_by_student(username, student_id):
+    return await history_page({"username": username, "student_id": student_id_match([student_id])},
+                              STUDENT_HISTORY_PAGE_SIZE, 'asc')
+
+# ---------------------- /summary and /trend routes ----------------------
+@prediction_bp.route('/summary/<string:student_id>', methods=['GET'])
+@require_auth
+async def student_summary(username, student_id):
+    query, error = summary_query(request.args, username, student_id)
+    if error:
+        return jsonify({"error": error}), 400
+    rollups = await rollups_collection.find(query, {"_id": 0}).sort("day", 1).to_list()
+    return jsonify(summary_body(student_id, rollups))
+
+@prediction_bp.route('/trend', methods=['GET'])
+@require_auth
+async def student_trends(username):
+    query, window, points, error = trend_query(request.args, username)
+    if error:
+        return jsonify({"error": error}), 400
+    docs = await predictions_collection.find(query, trend_projection).sort("timestamp", 1).limit(TREND_MAX_DOCS + 1).to_list()
+    if len(docs) > TREND_MAX_DOCS:
+        return jsonify({"error": trend_too_large()}), 400
+    return jsonify(await run_cpu(trend_body, docs, window, points))
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
-from models.user import create_user, get_user, check_password
-from utils import generate_token, verify_token
+from models.user import create_user, get_user, get_user_cached, check_password, set_password, user_cache
+from utils import (generate_token, require_auth, bearer_token, revoke_token, revoke_user_tokens, token_cache,
+                   revocation_cache)
+from metrics import timed
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -26,33 +28,50 @@ def login():
     username = data.get('username')
     password = data.get('password')
 
-    user = get_user(username)
+    with timed('user_lookup'):
+        user = get_user(username)
     if not user:
         return jsonify({"error": "Invalid username or password"}), 401
 
-    if not check_password(password, user['password']):
+    with timed('password'):
+        valid = check_password(password, user['password'])
+    if not valid:
         return jsonify({"error": "Invalid username or password"}), 401
 
-    token = generate_token(username)
+    with timed('jwt_sign'):
+        token = generate_token(username)
     return jsonify({"token": token})
 
 
-@auth_bp.route('/profile', methods=['GET'])
-def profile():
-    # Extract token from Authorization header
-    auth_header = request.headers.get('Authorization', '')
-    if not auth_header.startswith('Bearer '):
-        return jsonify({"error": "Authorization header missing or invalid"}), 401
-
-    token = auth_header.replace('Bearer ', '')
+@auth_bp.route('/logout', methods=['POST'])
+@require_auth
+def logout(username):
+    revoke_token(bearer_token())
+    return jsonify({"message": "Logged out"})
 
-    # Verify token and extract username
-    username = verify_token(token)
-    if not username:
-        return jsonify({"error": "Invalid or expired token"}), 401
+@auth_bp.route('/password', methods=['POST'])
+@require_auth
+def change_password(username):
+    data = request.json or {}
+    current = data.get('current_password')
+    new = data.get('new_password')
+    if not all([current, new]):
+        return jsonify({"error": "Missing fields"}), 400
 
-    # Get user info from storage
     user = get_user(username)
+    if not user or not check_password(current, user['password']):
+        return jsonify({"error": "Invalid username or password"}), 401
+
+    set_password(username, new)
+    # Sessions opened with the old password end here, this one included
+    revoke_user_tokens(username)
+    return jsonify({"token": generate_token(username)})
+
+@auth_bp.route('/profile', methods=['GET'])
+@require_auth
+def profile(username):
+    # Get user info from storage (cached briefly; dashboards poll this)
+    user = get_user_cached(username)
     if not user:
         return jsonify({"error": "User not found"}), 404
 
@@ -62,6 +81,10 @@ def profile():
         "email": user.get("email", "")
     }
 
-    print(f"[DEBUG] /profile returning: {user_info}")  # Helpful for console debugging
+    return jsonify(user_info), 200
 
-    return jsonify(user_info), 200
\ No newline at end of file
+@auth_bp.route('/cache', methods=['GET'])
+@require_auth
+def cache_stats(username):
+    return jsonify({"tokens": token_cache.stats(), "users": user_cache.stats(),
+                    "revocations": revocation_cache.stats()})
@@ -0,0 +1,118 @@
+import threading
+import time
+import numpy as np
+
+
+class _Pending:
+    __slots__ = ('row', 'group', 'enqueued', 'done', 'result', 'error')
+
+    def __init__(self, row, group):
+        self.row = row
+        self.group = group
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row predictions into one batched call.
+
+    A background thread waits for the first pending row, then keeps
+    collecting until ``max_batch`` rows are queued or ``window_ms`` has passed
+    since that first row arrived, and runs ``predict_fn(rows, group)`` once
+    per ``group`` the rows were submitted with (the model bundle each request
+    resolved, so a hot reload never mixes two models in one call).
+    ``predict_fn`` returns one result per row.
+    """
+
+    def __init__(self, predict_fn, window_ms=2.0, max_batch=32):
+        self.predict_fn = predict_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+
+        self._pending = []
+        self._cond = threading.Condition()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+        self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._worker.start()
+
+    def _reset_stats(self):
+        self.requests = 0
+        self.batches = 0
+        self.max_batch_seen = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.total_predict_time = 0.0
+
+    def submit(self, row, group=None):
+        item = _Pending(row, group)
+        with self._cond:
+            self._pending.append(item)
+            self._cond.notify()
+        item.done.wait()
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = self._pending[0].enqueued + self.window
+            while len(self._pending) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            started = time.perf_counter()
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item.group), []).append(item)
+            for items in groups.values():
+                try:
+                    results = self.predict_fn(np.array([item.row for item in items], dtype=float), items[0].group)
+                    for item, result in zip(items, results):
+                        item.result = result
+                except Exception as exc:
+                    for item in items:
+                        item.error = exc
+            finished = time.perf_counter()
+
+            for item in batch:
+                item.done.set()
+
+            waits = [started - item.enqueued for item in batch]
+            with self._stats_lock:
+                self.requests += len(batch)
+                self.batches += 1
+                self.max_batch_seen = max(self.max_batch_seen, len(batch))
+                self.total_queue_wait += sum(waits)
+                self.max_queue_wait = max(self.max_queue_wait, max(waits))
+                self.total_predict_time += finished - started
+
+    def stats(self):
+        with self._stats_lock:
+            batches = self.batches or 1
+            requests = self.requests or 1
+            return {
+                "window_ms": self.window * 1000.0,
+                "max_batch": self.max_batch,
+                "queue_depth": len(self._pending),
+                "requests": self.requests,
+                "batches": self.batches,
+                "avg_batch_size": self.requests / batches,
+                "max_batch_size": self.max_batch_seen,
+                "avg_queue_wait_ms": self.total_queue_wait / requests * 1000.0,
+                "max_queue_wait_ms": self.max_queue_wait * 1000.0,
+                "avg_predict_ms": self.total_predict_time / batches * 1000.0,
+            }
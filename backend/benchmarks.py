@@ -0,0 +1,953 @@
+import argparse
+import gc
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+_import_started = time.perf_counter()
+import numpy as np
+import pandas as pd
+
+# Run offline against an in-memory Mongo unless a real one is configured
+os.environ.setdefault("MONGO_URI", "mongomock://")
+
+from flask import jsonify
+from app import app
+from utils import generate_token
+import prediction
+import scoring
+IMPORT_SECONDS = time.perf_counter() - _import_started
+import sklearn
+import encoding
+from artifacts import current_bundle
+from batcher import MicroBatcher
+from explain import FEEDBACK_ATTRIBUTION, attribution_cache, top_causes_batch
+from lookup import GRID_AXES, LookupTable, parse_grid_spec
+from writer import WriteBehindWriter
+
+
+class DiscardingCollection:
+    """Accepts writes and drops them, to time the pipeline without the database."""
+
+    def insert_one(self, doc):
+        pass
+
+    def insert_many(self, docs, ordered=True):
+        pass
+
+    def update_one(self, query, update, upsert=False):
+        pass
+
+    def delete_many(self, query):
+        pass
+
+
+class SlowCollection(DiscardingCollection):
+    """Drops writes after sleeping, as a database with fixed round-trip latency would."""
+
+    def __init__(self, latency_ms):
+        self.latency = latency_ms / 1000.0
+        self.written = 0
+
+    def insert_one(self, doc):
+        time.sleep(self.latency)
+        self.written += 1
+
+    def insert_many(self, docs, ordered=True):
+        time.sleep(self.latency)
+        self.written += len(docs)
+
+
+def synthetic_csv(n_rows, seed=42):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2025-06-25 09:00:00')
+    df = pd.DataFrame({
+        'student_id': rng.choice([f"Stu{i:02d}" for i in range(1, 31)], n_rows),
+        # Slightly wider than the valid ranges so some rows get rejected
+        'HeartRate': rng.uniform(15, 105, n_rows),
+        'SkinConductance': rng.uniform(0.05, 1.2, n_rows),
+        'EEG': rng.uniform(0.5, 21, n_rows),
+        'timestamp': (start + pd.to_timedelta(np.arange(n_rows) * 30, unit='s')).astype(str),
+    })
+    return df.to_csv(index=False).encode('utf-8')
+
+
+def auth_headers():
+    return {"Authorization": f"Bearer {generate_token('benchmark')}"}
+
+
+# ---------------------- /csv throughput ----------------------
+def bench_csv(sizes, discard_writes=False, stream=False, trace_memory=False):
+    if discard_writes:
+        prediction.predictions_collection = DiscardingCollection()
+        prediction.rollups_collection = DiscardingCollection()
+    collection = prediction.predictions_collection
+    client = app.test_client()
+    headers = auth_headers()
+    url = '/api/predict/csv?stream=true' if stream else '/api/predict/csv'
+
+    print(f"\n📄 {url} throughput\n")
+    for n_rows in sizes:
+        payload = synthetic_csv(n_rows)
+        collection.delete_many({})
+        prediction.rollups_collection.delete_many({})
+
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        res = client.post(
+            url,
+            headers=headers,
+            data={'file': (io.BytesIO(payload), 'bench.csv')},
+            content_type='multipart/form-data',
+            buffered=False,
+        )
+        first_byte = None
+        for _ in res.response:
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+        elapsed = time.perf_counter() - start
+        memory = ""
+        if trace_memory:
+            memory = f" | peak {tracemalloc.get_traced_memory()[1] / 2**20:7.1f} MiB"
+            tracemalloc.stop()
+
+        print(f"{n_rows:>9,} rows | status {res.status_code} | {elapsed:8.2f} s | "
+              f"{n_rows / elapsed:10,.0f} rows/sec | first byte {first_byte:6.2f} s{memory}")
+
+
+# ---------------------- compiled vs sklearn inference ----------------------
+def time_call(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return np.median(samples), np.percentile(samples, 99)
+
+
+def bench_inference(batch_sizes, repeats):
+    bundle = current_bundle()
+    test_df = pd.read_csv('data/test.csv')
+    X_test = test_df[scoring.expected_columns].to_numpy(dtype=float)
+    sklearn_preds = bundle.model.predict(bundle.scaler.transform(test_df[scoring.expected_columns]))
+    compiled_preds = bundle.compiled.predict(X_test)
+    matches = int((sklearn_preds == compiled_preds).sum())
+    print(f"\n🌲 Compiled forest agrees with model.predict on {matches}/{len(X_test)} rows of data/test.csv")
+    if matches != len(X_test):
+        raise SystemExit("❌ Compiled forest does not match model.predict")
+
+    print("\n⏱️  Latency per call (median / p99)\n")
+    rng = np.random.default_rng(0)
+    for n in batch_sizes:
+        X = X_test[rng.integers(0, len(X_test), n)]
+        df = pd.DataFrame(X, columns=scoring.expected_columns)
+        # The pre-compiled /manual path: DataFrame -> copy/fillna -> scaler -> forest
+        sk_med, sk_p99 = time_call(
+            lambda: bundle.model.predict(bundle.scaler.transform(df.copy().fillna(bundle.column_means))),
+            repeats)
+        cf_med, cf_p99 = time_call(lambda: bundle.compiled.predict(X), repeats)
+        print(f"batch {n:>6,} | sklearn {sk_med * 1e3:8.3f} / {sk_p99 * 1e3:8.3f} ms | "
+              f"compiled {cf_med * 1e3:8.3f} / {cf_p99 * 1e3:8.3f} ms | speedup {sk_med / cf_med:6.1f}x")
+
+
+# ---------------------- micro-batching ----------------------
+def run_concurrent(predict_one, concurrency, duration, rows):
+    latencies = [[] for _ in range(concurrency)]
+    stop_at = time.perf_counter() + duration
+
+    def worker(i):
+        n = 0
+        while time.perf_counter() < stop_at:
+            row = rows[(i + n * concurrency) % len(rows)]
+            start = time.perf_counter()
+            predict_one(row)
+            latencies[i].append(time.perf_counter() - start)
+            n += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    flat = np.concatenate([np.asarray(l) for l in latencies])
+    return len(flat) / duration, np.percentile(flat, 50), np.percentile(flat, 99)
+
+
+def bench_batcher(concurrency_levels, windows, max_batch, duration):
+    rows = pd.read_csv('data/test.csv')[scoring.expected_columns].to_numpy(dtype=float).tolist()
+    bundle = current_bundle()
+    # Levels and leaves, as score_manual needs them for sample attribution
+    modes = [('direct', lambda row: scoring.predict_with_leaves_rows(np.array([row]), bundle)[0], None)]
+    for window in windows:
+        batcher = MicroBatcher(scoring.predict_with_leaves_rows, window, max_batch)
+        modes.append((f'batched {window:g} ms', lambda row, submit=batcher.submit: submit(row, bundle), batcher))
+
+    print(f"\n📦 /manual prediction path, {duration:g} s per run (max batch {max_batch})\n")
+    for concurrency in concurrency_levels:
+        for name, predict_one, batcher in modes:
+            if batcher is not None:
+                batcher._reset_stats()
+            throughput, p50, p99 = run_concurrent(predict_one, concurrency, duration, rows)
+            extra = f" | avg batch {batcher.stats()['avg_batch_size']:5.1f}" if batcher else ""
+            print(f"concurrency {concurrency:>3} | {name:<16} | {throughput:9,.0f} req/s | "
+                  f"p50 {p50 * 1e3:7.3f} ms | p99 {p99 * 1e3:7.3f} ms{extra}")
+        print()
+
+
+# ---------------------- lookup table ----------------------
+def bench_lookup(grids, n_random):
+    bundle = current_bundle()
+    cols = scoring.expected_columns
+    test_X = pd.read_csv('data/test.csv')[cols].to_numpy(dtype=float)
+    train_X = (pd.read_csv('data/data2.csv')
+               .rename(columns={'HRV': 'HeartRate', 'GSR': 'SkinConductance', 'EEG_Alpha_Waves': 'EEG'})[cols]
+               .replace(0, np.nan).fillna(bundle.column_means).to_numpy(dtype=float))
+    rng = np.random.default_rng(0)
+    box_X = np.column_stack([
+        rng.uniform(low, high, n_random) if not log else np.exp(rng.uniform(np.log(low), np.log(high), n_random))
+        for _, low, high, log in GRID_AXES
+    ])
+    box_df = pd.DataFrame(box_X, columns=cols)
+    samples = [('test.csv', test_X), ('data2.csv', train_X), ('box sample', box_X)]
+    exact = {name: bundle.predict_exact(X) for name, X in samples}
+
+    one_row = test_X[:1]
+    cf_med, _ = time_call(lambda: bundle.compiled.predict(one_row), 200)
+    sk_med, _ = time_call(lambda: bundle.model.predict(bundle.scaler.transform(box_df)), 3)
+    print(f"\n🧮 Exact reference: compiled 1 row {cf_med * 1e3:.3f} ms, "
+          f"sklearn {len(box_X):,} rows {sk_med * 1e3:.1f} ms\n")
+
+    for spec in grids:
+        shape = parse_grid_spec(spec)
+        start = time.perf_counter()
+        table = LookupTable.build(bundle.predict_exact, shape)
+        build = time.perf_counter() - start
+
+        agreement = " | ".join(
+            f"{name} {np.mean(table.predict(X) == exact[name]) * 100:6.2f}%" for name, X in samples
+        )
+        one_med, _ = time_call(lambda: table.predict(one_row), 200)
+        box_med, _ = time_call(lambda: table.predict(box_X), 3)
+        print(f"grid {'x'.join(map(str, shape)):<12} | {table.table.nbytes / 2**20:6.1f} MiB | build {build:5.1f} s | "
+              f"{agreement} | 1 row {one_med * 1e3:.3f} ms | {len(box_X):,} rows {box_med * 1e3:.1f} ms")
+
+
+# ---------------------- startup and hot reload ----------------------
+def startup_child():
+    # Runs in a fresh interpreter (see bench_startup); `app` is already imported
+    import artifacts
+
+    client = app.test_client()
+    headers = auth_headers()
+    body = {"student_id": "bench", "HeartRate": 50, "SkinConductance": 0.5, "EEG": 10}
+
+    start = time.perf_counter()
+    client.post('/api/predict/manual', headers=headers, json=body)
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    client.post('/api/predict/manual', headers=headers, json=body)
+    second = time.perf_counter() - start
+
+    # Publish a new bundle and swap it in while requests keep flowing
+    bundle = artifacts.current_bundle()
+    artifacts.write_bundle(bundle.model, bundle.scaler, bundle.shap_importance, bundle.column_means)
+    statuses = []
+    stop = threading.Event()
+
+    def hammer():
+        while not stop.is_set():
+            statuses.append(client.post('/api/predict/manual', headers=headers, json=body).status_code)
+
+    worker = threading.Thread(target=hammer)
+    worker.start()
+    time.sleep(0.2)
+    artifacts.reload_if_changed()
+    time.sleep(0.2)
+    stop.set()
+    worker.join()
+
+    print(json.dumps({
+        "import_s": IMPORT_SECONDS,
+        "first_request_s": first,
+        "second_request_s": second,
+        "reload_s": artifacts.reload_stats["last_reload_seconds"],
+        "served_version": artifacts.current_bundle().version,
+        "requests_during_reload": len(statuses),
+        "failed_during_reload": sum(status != 200 for status in statuses),
+    }))
+
+
+def bench_startup():
+    print("\n🚀 Worker startup and model reload (fresh interpreter per run)\n")
+    for mmap in ('0', '1'):
+        with tempfile.TemporaryDirectory() as artifact_dir:
+            env = {**os.environ, "ARTIFACT_DIR": artifact_dir, "MODEL_MMAP": mmap, "MODEL_RELOAD_INTERVAL": "0"}
+            out = subprocess.run(
+                [sys.executable, '-W', 'ignore', __file__, 'startup', '--child'],
+                env=env, capture_output=True, text=True, check=True
+            ).stdout
+            r = json.loads(out.strip().splitlines()[-1])
+            print(f"MODEL_MMAP={mmap} | import {r['import_s'] * 1e3:7.1f} ms | first request {r['first_request_s'] * 1e3:7.1f} ms | "
+                  f"second {r['second_request_s'] * 1e3:5.1f} ms | reload {r['reload_s'] * 1e3:6.1f} ms | "
+                  f"{r['requests_during_reload']} requests during reload, {r['failed_during_reload']} failed")
+
+
+# ---------------------- per-sample attributions ----------------------
+def bench_attribution(requests_per_mode, budget_ms, csv_rows):
+    client = app.test_client()
+    headers = auth_headers()
+    prediction.predictions_collection = DiscardingCollection()
+    prediction.rollups_collection = DiscardingCollection()
+    rng = np.random.default_rng(0)
+    fresh = np.column_stack([rng.uniform(30, 70, requests_per_mode), rng.uniform(0.2, 0.8, requests_per_mode),
+                             rng.uniform(5, 15, requests_per_mode)])
+    repeated = fresh[rng.integers(0, 20, requests_per_mode)]
+
+    def run(rows):
+        samples = []
+        for hr, sc, eeg in rows.tolist():
+            body = {"student_id": "bench", "HeartRate": hr, "SkinConductance": sc, "EEG": eeg}
+            start = time.perf_counter()
+            client.post('/api/predict/manual', headers=headers, json=body)
+            samples.append(time.perf_counter() - start)
+        return np.percentile(samples, 50) * 1e3, np.percentile(samples, 99) * 1e3
+
+    print(f"\n🔍 /manual latency by feedback attribution ({requests_per_mode} requests each)\n")
+    run(fresh[:50])  # warm up
+    results = {}
+    for mode, rows, label in [('class', fresh, 'class averages'),
+                              ('sample', fresh, 'per-sample, unique'),
+                              ('sample', repeated, 'per-sample, repeats')]:
+        scoring.FEEDBACK_ATTRIBUTION = mode
+        attribution_cache._entries.clear()
+        results[label] = run(rows)
+        p50, p99 = results[label]
+        print(f"{label:<20} | p50 {p50:6.3f} ms | p99 {p99:6.3f} ms")
+
+    overhead = results['per-sample, unique'][1] - results['class averages'][1]
+    verdict = "✅ within" if overhead <= budget_ms else "❌ over"
+    print(f"\np99 overhead {overhead:+.3f} ms, {verdict} the {budget_ms:g} ms budget")
+
+    bundle = current_bundle()
+    X = np.column_stack([rng.uniform(20, 100, csv_rows), rng.uniform(0.05, 1.2, csv_rows),
+                                       rng.uniform(1, 20, csv_rows)])
+    start = time.perf_counter()
+    levels, leaves = bundle.predict_with_leaves(X)
+    predict_s = time.perf_counter() - start
+    attribution_cache._entries.clear()
+    start = time.perf_counter()
+    causes = top_causes_batch(bundle, X, levels, leaves)
+    explain_s = time.perf_counter() - start
+    start = time.perf_counter()
+    top_causes_batch(bundle, X, levels, leaves)
+    cached_s = time.perf_counter() - start
+    distinct = len({tuple(name for name, _ in c) for c in causes})
+    print(f"\n/csv batch of {csv_rows:,} rows: predict {predict_s * 1e3:.0f} ms, attributions {explain_s * 1e3:.0f} ms "
+          f"(cached rerun {cached_s * 1e3:.0f} ms), {distinct} distinct cause orderings")
+
+
+# ---------------------- history pagination ----------------------
+def plan_stages(plan):
+    """Every stage name in an explain() winning plan, outermost first."""
+    stages = [plan.get('stage')]
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            stages += plan_stages(plan[key])
+    for child in plan.get('inputStages', []):
+        stages += plan_stages(child)
+    return [stage for stage in stages if stage]
+
+
+def bench_history(n_docs, page_size):
+    collection = prediction.predictions_collection
+    username = 'benchmark-history'
+    collection.delete_many({"username": username})
+    start = pd.Timestamp('2025-06-25 09:00:00').to_pydatetime()
+    collection.insert_many([{
+        "username": username,
+        "student_id": f"Stu{i % 30:02d}",
+        "input_data": {"HeartRate": 60.0, "SkinConductance": 0.5, "EEG": 10.0},
+        "predicted_engagement_level": i % 3,
+        "feedback": "x" * 80,
+        "severities": {"HeartRate": "normal", "SkinConductance": "normal", "EEG": "normal"},
+        "timestamp": start + pd.Timedelta(seconds=i // 4).to_pytimedelta(),
+    } for i in range(n_docs)], ordered=False)
+
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {generate_token(username)}"}
+    print(f"\n📜 History pages of {page_size} over {n_docs:,} predictions\n")
+    for label, url in [('/history', '/api/predict/history'),
+                       ('/history/student', '/api/predict/history/student/Stu07')]:
+        timings, cursor, pages = [], None, 0
+        while True:
+            query = {'limit': page_size, 'fields': 'predicted_engagement_level'}
+            if cursor:
+                query['cursor'] = cursor
+            started = time.perf_counter()
+            response = client.get(url, headers=headers, query_string=query)
+            timings.append(time.perf_counter() - started)
+            pages += 1
+            cursor = response.headers.get('X-Next-Cursor')
+            if not cursor:
+                break
+        print(f"{label:<17} | {pages:5d} pages | first {timings[0] * 1e3:7.2f} ms | "
+              f"last {timings[-1] * 1e3:7.2f} ms | median {np.median(timings) * 1e3:7.2f} ms")
+
+    # Plans are only meaningful against a real mongod
+    try:
+        for label, query in [('/history', {"username": username}),
+                             ('/history/student', {"username": username, "student_id": "Stu07"})]:
+            explained = (collection.find(query).sort([("timestamp", -1), ("_id", -1)])
+                         .limit(page_size + 1).explain())
+            stages = plan_stages(explained['queryPlanner']['winningPlan'])
+            ok = 'IXSCAN' in stages and 'SORT' not in stages and 'COLLSCAN' not in stages
+            print(f"{label:<17} | plan {' <- '.join(stages)} {'✅' if ok else '❌'}")
+    except (AttributeError, NotImplementedError):
+        print("\nexplain() is not available on mongomock; set MONGO_URI to a mongod to check query plans")
+    collection.delete_many({"username": username})
+
+
+# ---------------------- write-behind persistence ----------------------
+def bench_writer(latency_ms, requests):
+    client = app.test_client()
+    headers = auth_headers()
+    body = {"student_id": "bench", "HeartRate": 60.0, "SkinConductance": 0.5, "EEG": 10.0}
+    print(f"\n💾 /manual latency with a {latency_ms:g} ms database ({requests} requests)\n")
+
+    for label in ['synchronous', 'write-behind', 'write-behind + spill']:
+        collection = SlowCollection(latency_ms)
+        prediction.predictions_collection = collection
+        prediction.rollups_collection = DiscardingCollection()
+        spill_dir = tempfile.mkdtemp() if label.endswith('spill') else None
+        prediction.write_behind = (
+            WriteBehindWriter(collection, flush_ms=50, spill_dir=spill_dir) if label != 'synchronous' else None
+        )
+        samples = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            client.post('/api/predict/manual', headers=headers, json=body)
+            samples.append(time.perf_counter() - start)
+        flush_started = time.perf_counter()
+        if prediction.write_behind is not None:
+            stats = prediction.write_behind.stats()
+            prediction.write_behind.close()
+        drain = time.perf_counter() - flush_started
+        extra = (f" | {stats['flushes']} flushes, drain on close {drain * 1e3:.0f} ms"
+                 if prediction.write_behind is not None else "")
+        print(f"{label:<21} | p50 {np.percentile(samples, 50) * 1e3:6.2f} ms | "
+              f"p99 {np.percentile(samples, 99) * 1e3:6.2f} ms | written {collection.written}{extra}")
+    prediction.write_behind = None
+
+
+# ---------------------- per-stage timings and regression gate ----------------------
+STAGES_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+
+def time_stage(fn, setup=None, min_seconds=0.2, min_runs=5, max_runs=2000):
+    """Run fn until min_seconds of it have been timed; setup() builds fresh arguments outside the clock.
+
+    Like timeit, the garbage collector is paused while the stage runs,
+    otherwise whichever run happens to trigger a full collection looks like
+    a regression.
+    """
+    samples, total = [], 0.0
+    gc.collect()
+    gc.disable()
+    try:
+        while (total < min_seconds or len(samples) < min_runs) and len(samples) < max_runs:
+            args = setup() if setup else ()
+            start = time.perf_counter()
+            fn(*args)
+            elapsed = time.perf_counter() - start
+            samples.append(elapsed)
+            total += elapsed
+    finally:
+        gc.enable()
+    return samples
+
+
+def stage_timings(n_rows, include_db=True):
+    """{stage: samples} for one /csv upload of n_rows, following score_frame step by step."""
+    bundle = current_bundle()
+    payload = synthetic_csv(n_rows)
+    username = 'benchmark-stages'
+    sample_mode = FEEDBACK_ATTRIBUTION == 'sample'
+
+    raw = pd.read_csv(io.BytesIO(payload))
+    df, rejected = scoring.clean_frame(raw.copy(), bundle)
+    X = df[scoring.expected_columns].to_numpy(dtype=float)
+    levels, leaves = bundle.predict_with_leaves(X) if sample_mode else (bundle.predict(X), None)
+    levels = levels.astype(int)
+    causes = top_causes_batch(bundle, X, levels, leaves) if sample_mode else None
+    feedback, top_feats, severities = scoring.generate_feedback_batch(levels, df, bundle, causes)
+    timestamps = scoring.parse_timestamps(df)
+    docs, records = scoring.build_documents(username, df, levels, feedback, top_feats, severities, timestamps)
+
+    stages = {
+        'csv_parse': time_stage(lambda: pd.read_csv(io.BytesIO(payload))),
+        'fillna_validate': time_stage(lambda frame: scoring.clean_frame(frame, bundle),
+                                      setup=lambda: (raw.copy(),)),
+        'scaler_transform': time_stage(lambda: bundle.compiled.transform(X)),
+        'model_predict': time_stage(lambda: bundle.predict_with_leaves(X) if sample_mode else bundle.predict(X)),
+    }
+    if sample_mode:
+        # Cold cache: every distinct reading is attributed
+        stages['attribution'] = time_stage(lambda: top_causes_batch(bundle, X, levels, leaves),
+                                           setup=lambda: (attribution_cache.clear(), ())[1])
+    stages['generate_feedback'] = time_stage(lambda: scoring.generate_feedback_batch(levels, df, bundle, causes))
+    stages['parse_timestamps'] = time_stage(lambda: scoring.parse_timestamps(df))
+    stages['build_documents'] = time_stage(lambda: scoring.build_documents(
+        username, df, levels, feedback, top_feats, severities, timestamps))
+    with app.app_context():
+        stages['json_serialize'] = time_stage(lambda: app.json.dumps({"results": records, "rejected": rejected}))
+    if include_db:
+        stages['insert'] = time_stage(prediction.save_predictions,
+                                      setup=lambda: ([dict(doc) for doc in docs],), min_runs=3)
+        prediction.predictions_collection.delete_many({"username": username})
+        prediction.rollups_collection.delete_many({"username": username})
+    return stages
+
+
+def compare_stages(results, baseline, tolerance, noise_ms):
+    """Regressions: stages slower than the baseline by more than tolerance and noise_ms."""
+    previous = {(r['stage'], r['rows']): r for r in baseline['results']}
+    regressions = []
+    print(f"\n{'stage':<18} {'rows':>7} {'median ms':>10} {'baseline':>10} {'change':>8}")
+    for result in results:
+        before = previous.get((result['stage'], result['rows']))
+        if before is None:
+            print(f"{result['stage']:<18} {result['rows']:>7,} {result['median_ms']:>10.3f} {'-':>10} {'new':>8}")
+            continue
+        change = result['median_ms'] / before['median_ms'] - 1.0 if before['median_ms'] else 0.0
+        regressed = change > tolerance and result['median_ms'] - before['median_ms'] > noise_ms
+        if regressed:
+            regressions.append(result)
+        print(f"{result['stage']:<18} {result['rows']:>7,} {result['median_ms']:>10.3f} "
+              f"{before['median_ms']:>10.3f} {change:>+8.0%}{' ❌' if regressed else ''}")
+    return regressions
+
+
+def bench_stages(sizes, include_db, output, baseline_path, tolerance, noise_ms, update_baseline):
+    prediction.write_behind = None
+    print(f"\n⏱️  /csv pipeline stages (attribution: {FEEDBACK_ATTRIBUTION}, "
+          f"db: {os.environ['MONGO_URI'].split('://')[0] if include_db else 'off'})\n")
+    results = []
+    for n_rows in sizes:
+        for stage, samples in stage_timings(n_rows, include_db).items():
+            samples_ms = np.array(samples) * 1000.0
+            median = float(np.median(samples_ms))
+            results.append({
+                "stage": stage,
+                "rows": n_rows,
+                "median_ms": median,
+                "p90_ms": float(np.percentile(samples_ms, 90)),
+                "us_per_row": median * 1000.0 / n_rows,
+                "runs": len(samples),
+            })
+            print(f"{n_rows:>7,} rows | {stage:<18} | median {median:9.3f} ms | "
+                  f"{median * 1000.0 / n_rows:8.2f} µs/row | {len(samples):4} runs")
+
+    report = {
+        "meta": {
+            "created_at": pd.Timestamp.now(tz='UTC').isoformat(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sklearn": sklearn.__version__,
+            "bundle": current_bundle().version,
+            "feedback_attribution": FEEDBACK_ATTRIBUTION,
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📁 Results written to {output}")
+    if update_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📁 Baseline updated: {baseline_path}")
+        return
+    if not os.path.exists(baseline_path):
+        print(f"\n⚠️ No baseline at {baseline_path}; run with --update-baseline to create one")
+        return
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = compare_stages(results, baseline, tolerance, noise_ms)
+    if regressions:
+        print(f"\n❌ {len(regressions)} stage(s) regressed by more than {tolerance:.0%}")
+        sys.exit(1)
+    print(f"\n✅ No stage regressed by more than {tolerance:.0%}")
+
+
+# ---------------------- pre-fork workers ----------------------
+SERVE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serve.py')
+
+
+def parse_smaps_rollup(text):
+    """Rss, Pss and private (unshared) kB from the text of /proc/<pid>/smaps_rollup."""
+    fields = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) == 3 and parts[2] == 'kB':
+            fields[parts[0].rstrip(':')] = int(parts[1])
+    return {"rss": fields["Rss"], "pss": fields["Pss"],
+            "private": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+def memory_kb(pid):
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        return parse_smaps_rollup(f.read())
+
+
+def bare_interpreter_kb():
+    out = subprocess.run([sys.executable, '-c', 'print(open("/proc/self/smaps_rollup").read())'],
+                         capture_output=True, text=True, check=True).stdout
+    return parse_smaps_rollup(out)
+
+
+def load_client(port, body, headers, duration, results):
+    import http.client
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    payload = json.dumps(body)
+    ok = failed = 0
+    stop_at = time.perf_counter() + duration
+    while time.perf_counter() < stop_at:
+        conn.request('POST', '/api/predict/manual', payload, {**headers, "Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        if response.status == 200:
+            ok += 1
+        else:
+            failed += 1
+    conn.close()
+    results.put((ok, failed))
+
+
+def drive_load(port, clients, duration):
+    import multiprocessing
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    body = {"student_id": "bench", "HeartRate": 50, "SkinConductance": 0.5, "EEG": 10}
+    procs = [ctx.Process(target=load_client, args=(port, body, auth_headers(), duration, results))
+             for _ in range(clients)]
+    for proc in procs:
+        proc.start()
+    totals = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    return sum(ok for ok, _ in totals) / duration, sum(failed for _, failed in totals)
+
+
+def start_server(workers, preload, env):
+    command = [sys.executable, '-W', 'ignore', SERVE_SCRIPT, '--port', '0', '--workers', str(workers)]
+    if not preload:
+        command.append('--no-preload')
+    server = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True)
+    port, ready = None, 0
+    deadline = time.monotonic() + 120
+    while ready < workers and time.monotonic() < deadline:
+        line = server.stdout.readline()
+        if not line:
+            break
+        if 'Serving on' in line:
+            port = int(line.split('http://')[1].split()[0].rsplit(':', 1)[1])
+        else:
+            # Workers print concurrently, so their lines can arrive merged
+            ready += line.count(' ready')
+    if port is None or ready < workers:
+        server.kill()
+        raise RuntimeError(f"serve.py did not start {workers} workers")
+    with open(f'/proc/{server.pid}/task/{server.pid}/children') as f:
+        children = [int(pid) for pid in f.read().split()]
+    return server, port, children
+
+
+def bench_serve(worker_counts, duration, clients_per_worker):
+    baseline = bare_interpreter_kb()
+    print(f"\n🧮 Pre-fork workers: /manual for {duration:g} s per run, {os.cpu_count()} CPU(s)")
+    print(f"bare interpreter: RSS {baseline['rss'] / 1024:.1f} MB, private {baseline['private'] / 1024:.1f} MB\n")
+    print(f"{'mode':<10} {'workers':>7} {'req/s':>8} {'failed':>6} {'parent RSS':>11} "
+          f"{'worker RSS':>11} {'worker PSS':>11} {'private':>9} {'total PSS':>10}")
+
+    with tempfile.TemporaryDirectory() as artifact_dir:
+        import artifacts
+        bundle = current_bundle()
+        artifacts.write_bundle(bundle.model, bundle.scaler, bundle.shap_importance, bundle.column_means,
+                               root=artifact_dir)
+        env = {**os.environ, "ARTIFACT_DIR": artifact_dir, "MODEL_MMAP": "1", "MODEL_RELOAD_INTERVAL": "0",
+               "MONGO_URI": "mongomock://", "METRICS_ENABLED": "0"}
+
+        for preload in (True, False):
+            for workers in worker_counts:
+                server, port, children = start_server(workers, preload, env)
+                try:
+                    # Warm up: first requests load the bundle lazily without preloading
+                    drive_load(port, workers, 1.0)
+                    rps, failed = drive_load(port, max(2, clients_per_worker * workers), duration)
+                    per_worker = [memory_kb(pid) for pid in children]
+                    parent = memory_kb(server.pid)
+                finally:
+                    server.terminate()
+                    server.wait(timeout=30)
+                mb = lambda key: np.median([m[key] for m in per_worker]) / 1024
+                total_pss = (parent['pss'] + sum(m['pss'] for m in per_worker)) / 1024
+                print(f"{'preload' if preload else 'no-preload':<10} {workers:>7} {rps:>8,.0f} {failed:>6} "
+                      f"{parent['rss'] / 1024:>8.1f} MB {mb('rss'):>8.1f} MB {mb('pss'):>8.1f} MB "
+                      f"{mb('private'):>6.1f} MB {total_pss:>7.1f} MB")
+
+
+# ---------------------- sync vs async serving ----------------------
+ASYNC_PATHS = ['/api/predict/history', '/api/auth/profile']
+
+
+async def http_get_loop(port, paths, headers, stop_at, latencies, errors):
+    """One client issuing GETs until stop_at over a keep-alive connection, reconnecting
+    when the server closes it (werkzeug does after every response)."""
+    import asyncio
+    head = "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+    reader = writer = None
+    n = 0
+    try:
+        while time.perf_counter() < stop_at:
+            path = paths[n % len(paths)]
+            n += 1
+            started = time.perf_counter()
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n{head}\r\n".encode())
+            status_line = await reader.readline()
+            length, close = 0, False
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                name = name.lower()
+                if name == 'content-length':
+                    length = int(value)
+                elif name == 'connection' and value.strip().lower() == 'close':
+                    close = True
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            if b' 200 ' not in status_line:
+                errors.append(status_line)
+            if close:
+                writer.close()
+                writer = None
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def drive_concurrent_gets(port, concurrency, duration, headers):
+    import asyncio
+    latencies, errors = [], []
+
+    async def run():
+        stop_at = time.perf_counter() + duration
+        results = await asyncio.gather(*[
+            http_get_loop(port, ASYNC_PATHS, headers, stop_at, latencies, errors) for _ in range(concurrency)
+        ], return_exceptions=True)
+        errors.extend(r for r in results if isinstance(r, Exception))
+
+    asyncio.run(run())
+    lat_ms = np.array(latencies) * 1000.0
+    return len(latencies) / duration, np.percentile(lat_ms, 50), np.percentile(lat_ms, 99), len(errors)
+
+
+def wait_until_serving(port, headers, timeout=60):
+    import http.client
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/api/auth/cache', headers=headers)
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Nothing serving on port {port}")
+
+
+def bench_async(concurrency_levels, duration, seed_rows):
+    """/history and /profile polling against serve.py (sync) and async_app.py, one process each."""
+    import importlib.util
+    import socket
+    if not os.getenv("MONGO_URI") or os.getenv("MONGO_URI").startswith("mongomock://"):
+        raise SystemExit("❌ The async mode needs a real MongoDB; set MONGO_URI")
+    missing = [name for name in ('quart', 'quart_cors', 'hypercorn') if importlib.util.find_spec(name) is None]
+    if missing:
+        raise SystemExit(f"❌ Install {', '.join(missing)} for the async mode")
+
+    from db import predictions_collection, rollups_collection, users_collection
+    from models.user import create_user
+    username = 'bench_async'
+    create_user(username, 'bench-password', 'bench@example.com')
+    headers = {"Authorization": f"Bearer {generate_token(username)}"}
+    app.test_client().post('/api/predict/csv', headers=headers,
+                           data={"file": (io.BytesIO(synthetic_csv(seed_rows)), 'seed.csv')})
+
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    print(f"\n⚡ GET {' + '.join(ASYNC_PATHS)} for {duration:g} s per run, one server process each\n")
+    try:
+        for mode in ('sync', 'async'):
+            with socket.socket() as probe:
+                probe.bind(('127.0.0.1', 0))
+                port = probe.getsockname()[1]
+            if mode == 'sync':
+                command = [sys.executable, '-W', 'ignore', SERVE_SCRIPT, '--port', str(port), '--workers', '1']
+            else:
+                command = [sys.executable, '-W', 'ignore', '-m', 'hypercorn', 'async_app:app',
+                           '--bind', f'127.0.0.1:{port}', '--workers', '1']
+            server = subprocess.Popen(command, cwd=backend_dir, stdout=subprocess.DEVNULL)
+            try:
+                wait_until_serving(port, headers)
+                for concurrency in concurrency_levels:
+                    rps, p50, p99, failed = drive_concurrent_gets(port, concurrency, duration, headers)
+                    print(f"{mode:<5} | {concurrency:>4} connections | {rps:8,.0f} req/s | "
+                          f"p50 {p50:8.2f} ms | p99 {p99:8.2f} ms | {failed} failed")
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+            print()
+    finally:
+        predictions_collection.delete_many({"username": username})
+        rollups_collection.delete_many({"username": username})
+        users_collection.delete_one({"username": username})
+
+
+# ---------------------- response encodings ----------------------
+def bench_encodings(sizes):
+    bundle = current_bundle()
+    codecs = [('identity', None), ('gzip', lambda data: gzip.compress(data, encoding.GZIP_LEVEL))]
+    if encoding.brotli is not None:
+        codecs.append(('br', lambda data: encoding.brotli.compress(data, quality=encoding.BROTLI_QUALITY)))
+    if encoding.msgpack is None:
+        print("\nmsgpack is not installed; MessagePack is left out")
+
+    print("\n🗜️  /csv response body by format and compression, against jsonify(records)\n")
+    for n_rows in sizes:
+        df = pd.read_csv(io.BytesIO(synthetic_csv(n_rows)))
+        _, records, rejected = scoring.score_rows(df, 'benchmark-encodings', bundle)
+        body = {"results": records, "rejected": rejected}
+        with app.test_request_context():
+            baseline_ms = np.median(time_stage(lambda: jsonify(body).get_data())) * 1e3
+            baseline_size = len(jsonify(body).get_data())
+            for fmt in encoding.available_formats():
+                data, _ = encoding.encode(body, fmt, app.json.dumps, 'results')
+                serialize_ms = np.median(time_stage(lambda: encoding.encode(body, fmt, app.json.dumps, 'results'))) * 1e3
+                for codec, compress_data in codecs:
+                    compressed = compress_data(data) if compress_data else data
+                    compress_ms = np.median(time_stage(lambda: compress_data(data))) * 1e3 if compress_data else 0.0
+                    total_ms = serialize_ms + compress_ms
+                    print(f"{n_rows:>9,} rows | {fmt:<8} {codec:<8} | {len(compressed) / 1024:9.1f} KiB "
+                          f"({len(compressed) / baseline_size:6.1%}) | serialize {serialize_ms:8.2f} ms "
+                          f"+ compress {compress_ms:8.2f} ms ({total_ms / baseline_ms:5.2f}x jsonify)")
+        print()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the prediction API")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    csv_parser = sub.add_parser('csv', help="Rows/sec of the /csv route for several file sizes")
+    csv_parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    csv_parser.add_argument('--discard-writes', action='store_true',
+                            help="Drop inserts instead of writing them, to time the pipeline alone")
+    csv_parser.add_argument('--stream', action='store_true', help="Use the NDJSON streaming mode")
+    csv_parser.add_argument('--trace-memory', action='store_true',
+                            help="Report peak traced memory (tracemalloc slows the run down severalfold)")
+
+    inference_parser = sub.add_parser('inference', help="Compiled forest vs sklearn latency")
+    inference_parser.add_argument('--batch', type=int, nargs='+', default=[1, 10, 100, 1_000, 10_000])
+    inference_parser.add_argument('--repeats', type=int, default=50)
+
+    batcher_parser = sub.add_parser('batcher', help="Throughput vs p99 with and without micro-batching")
+    batcher_parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    batcher_parser.add_argument('--window-ms', type=float, nargs='+', default=[1.0, 2.0])
+    batcher_parser.add_argument('--max-batch', type=int, default=32)
+    batcher_parser.add_argument('--duration', type=float, default=3.0)
+
+    lookup_parser = sub.add_parser('lookup', help="Lookup-table agreement and latency per grid resolution")
+    lookup_parser.add_argument('--grid', nargs='+', default=['32', '64', '128', '128,512,64', '256'])
+    lookup_parser.add_argument('--random-rows', type=int, default=100_000)
+
+    startup_parser = sub.add_parser('startup', help="Time to first request and hot-reload latency")
+    startup_parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+
+    attribution_parser = sub.add_parser('attribution', help="/manual p99 with per-sample attributions")
+    attribution_parser.add_argument('--requests', type=int, default=2000)
+    attribution_parser.add_argument('--budget-ms', type=float, default=1.0)
+    attribution_parser.add_argument('--csv-rows', type=int, default=100_000)
+
+    history_parser = sub.add_parser('history', help="History page latency by depth and query plans")
+    history_parser.add_argument('--docs', type=int, default=100_000)
+    history_parser.add_argument('--page-size', type=int, default=500)
+
+    writer_parser = sub.add_parser('writer', help="/manual latency with synchronous vs write-behind inserts")
+    writer_parser.add_argument('--latency-ms', type=float, default=5.0)
+    writer_parser.add_argument('--requests', type=int, default=1000)
+
+    stages_parser = sub.add_parser('stages', help="Per-stage /csv timings checked against a stored baseline")
+    stages_parser.add_argument('--rows', type=int, nargs='+', default=[1, 100, 10_000])
+    stages_parser.add_argument('--no-db', action='store_true', help="Leave out the insert stage")
+    stages_parser.add_argument('--output', help="Also write the results to this JSON file")
+    stages_parser.add_argument('--baseline', default=STAGES_BASELINE)
+    stages_parser.add_argument('--tolerance', type=float, default=0.25,
+                               help="Allowed slowdown per stage before failing (0.25 = 25%%)")
+    stages_parser.add_argument('--noise-ms', type=float, default=0.05,
+                               help="Ignore slowdowns smaller than this many milliseconds")
+    stages_parser.add_argument('--update-baseline', action='store_true', help="Store these results as the baseline")
+
+    serve_parser = sub.add_parser('serve', help="Memory per worker and req/s of serve.py as workers scale")
+    serve_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    serve_parser.add_argument('--duration', type=float, default=5.0)
+    serve_parser.add_argument('--clients-per-worker', type=int, default=2)
+
+    async_parser = sub.add_parser('async', help="History/profile polling: serve.py vs async_app.py")
+    async_parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 100, 500])
+    async_parser.add_argument('--duration', type=float, default=10.0)
+    async_parser.add_argument('--seed-rows', type=int, default=10_000)
+
+    encodings_parser = sub.add_parser('encodings', help="/csv response size and encode time per format")
+    encodings_parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+
+    args = parser.parse_args()
+    if args.command == 'csv':
+        bench_csv(args.rows, args.discard_writes, args.stream, args.trace_memory)
+    elif args.command == 'inference':
+        bench_inference(args.batch, args.repeats)
+    elif args.command == 'batcher':
+        bench_batcher(args.concurrency, args.window_ms, args.max_batch, args.duration)
+    elif args.command == 'lookup':
+        bench_lookup(args.grid, args.random_rows)
+    elif args.command == 'startup':
+        startup_child() if args.child else bench_startup()
+    elif args.command == 'attribution':
+        bench_attribution(args.requests, args.budget_ms, args.csv_rows)
+    elif args.command == 'history':
+        bench_history(args.docs, args.page_size)
+    elif args.command == 'writer':
+        bench_writer(args.latency_ms, args.requests)
+    elif args.command == 'stages':
+        bench_stages(args.rows, not args.no_db, args.output, args.baseline, args.tolerance,
+                     args.noise_ms, args.update_baseline)
+    elif args.command == 'serve':
+        bench_serve(args.workers, args.duration, args.clients_per_worker)
+    elif args.command == 'async':
+        bench_async(args.concurrency, args.duration, args.seed_rows)
+    elif args.command == 'encodings':
+        bench_encodings(args.rows)
@@ -0,0 +1,33 @@
+# Settings shared by the sync (db.py, prediction.py) and async (async_db.py,
+# async_prediction.py) apps. Importing this module opens no connection.
+import os
+from pymongo import ASCENDING, DESCENDING
+
+DB_NAME = 'focus_monitor_db'
+
+# Documents per insert_many call for bulk uploads
+INSERT_BATCH_SIZE = int(os.getenv("INSERT_BATCH_SIZE", 5000))
+
+# Keep the per-day rollups in step with every stored prediction
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "1") == "1"
+
+# (collection, keys, options) for every index the queries rely on; _id is the
+# tiebreaker of the history sort, so it is part of each key and the whole
+# sort is served by the index
+INDEXES = [
+    ('predictions', [("username", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+     {"name": "username_timestamp"}),
+    ('predictions', [("username", ASCENDING), ("student_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+     {"name": "username_student_timestamp"}),
+    ('users', [("username", ASCENDING)], {"name": "username"}),
+    ('prediction_rollups', [("username", ASCENDING), ("student_id", ASCENDING), ("day", ASCENDING)],
+     {"name": "username_student_day", "unique": True}),
+    # Uploaded rows carry a hash of their readings; a row already stored is not inserted again
+    ('predictions', [("username", ASCENDING), ("row_hash", ASCENDING)],
+     {"name": "username_row_hash", "unique": True, "partialFilterExpression": {"row_hash": {"$exists": True}}}),
+    ('uploads', [("username", ASCENDING), ("file_hash", ASCENDING), ("model_version", ASCENDING)],
+     {"name": "username_file_hash", "unique": True}),
+    ('uploads', [("expires_at", ASCENDING)], {"name": "expires_at", "expireAfterSeconds": 0}),
+    # A revocation is dropped once every token it applies to has expired
+    ('revoked_tokens', [("expires_at", ASCENDING)], {"name": "expires_at", "expireAfterSeconds": 0}),
+]
@@ -1,10 +1,35 @@
 from pymongo import MongoClient
 import os
+from constants import DB_NAME, INDEXES
 
 MONGO_URI = os.getenv("MONGO_URI")  # Set this in your environment variables
 
-client = MongoClient(MONGO_URI)
-db = client['focus_monitor_db']
+if MONGO_URI and MONGO_URI.startswith("mongomock://"):
+    # In-memory database for offline benchmarks and local experiments
+    import mongomock
+    client = mongomock.MongoClient()
+else:
+    mongomock = None
+    client = MongoClient(MONGO_URI)
+db = client[DB_NAME]
 
 users_collection = db['users']
 predictions_collection = db['predictions']
+# Per (username, student_id, day) engagement totals, see rollups.py
+rollups_collection = db['prediction_rollups']
+# Cached /csv responses by file hash, see dedupe.py
+uploads_collection = db['uploads']
+# Logged-out tokens and per-user password-change cutoffs, see utils.verify_token
+revoked_tokens_collection = db['revoked_tokens']
+
+
+def ensure_indexes():
+    """Create the indexes in INDEXES (no-op when they already exist)."""
+    for collection, keys, options in INDEXES:
+        if mongomock is not None and "partialFilterExpression" in options:
+            # mongomock checks a unique index by scanning the collection on
+            # every insert, which makes bulk uploads quadratic. /csv and jobs
+            # still skip rows already stored by looking their hashes up
+            # first, but two uploads racing can both store a row
+            continue
+        db[collection].create_index(keys, **options)
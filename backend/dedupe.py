@@ -0,0 +1,136 @@
+import binascii
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+from bson.binary import Binary
+from pymongo.errors import DuplicateKeyError
+
+# Hash /csv uploads so an identical file is answered from the cache and rows
+# already stored are skipped; set to 0 to score and store every upload
+UPLOAD_DEDUP = os.getenv("UPLOAD_DEDUP", "1") == "1"
+# How long the response to an upload is kept for identical re-uploads
+UPLOAD_CACHE_TTL = float(os.getenv("UPLOAD_CACHE_TTL", 7 * 86400))
+# Larger (compressed) responses are not cached; Mongo documents stop at 16 MB
+UPLOAD_CACHE_MAX_BYTES = int(os.getenv("UPLOAD_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+
+# Two 64-bit row hashes with different keys make one 128-bit digest
+_HASH_KEYS = ('focus-rows-key-1', 'focus-rows-key-2')
+
+
+def file_digest(stream):
+    """sha256 of an uploaded file, leaving the stream rewound."""
+    digest = hashlib.sha256()
+    for block in iter(lambda: stream.read(1 << 20), b''):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def row_hashes(df, columns):
+    """Hex digest of (student_id, timestamp, columns) per row as uploaded, before any filling.
+
+    Rows without a timestamp get None: their stored timestamp is the upload
+    time, so they are never the same reading twice.
+    """
+    if 'timestamp' not in df.columns:
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+    timestamps = df['timestamp'].astype('string').str.strip()
+    frame = pd.DataFrame({
+        'student_id': df['student_id'].astype('string'),
+        'timestamp': timestamps,
+        # "60" and "60.0" are the same reading
+        **{col: pd.to_numeric(df[col], errors='coerce').astype(float) for col in columns},
+    })
+    digests = np.stack([pd.util.hash_pandas_object(frame, index=False, hash_key=key).to_numpy()
+                        for key in _HASH_KEYS], axis=1)
+    # One hexlify call for the whole block is ~4x faster than formatting each row
+    hexed = binascii.hexlify(digests.astype('>u8').tobytes()).decode('ascii')
+    hashes = pd.Series([hexed[i:i + 32] for i in range(0, len(hexed), 32)], index=df.index, dtype=object)
+    hashes[(timestamps.isna() | (timestamps == '')).to_numpy()] = None
+    return hashes
+
+
+def stored_hash_queries(username, hashes, batch=10_000):
+    """Filters finding which of hashes are already stored, batch hashes per $in (covered by the row_hash index)."""
+    wanted = [h for h in hashes if h is not None]
+    for start in range(0, len(wanted), batch):
+        yield {"username": username, "row_hash": {"$in": wanted[start:start + batch]}}
+
+
+def duplicate_mask(hashes, stored):
+    """True for rows already stored, and for repeats of an earlier row in the same upload."""
+    return (hashes.isin(stored) | (hashes.notna() & hashes.duplicated())).to_numpy()
+
+
+class UploadCache:
+    """/csv responses by (username, file hash, model version), kept in Mongo so every worker shares them.
+
+    A TTL index on expires_at (constants.INDEXES) removes entries after ttl
+    seconds; any deleted prediction drops the user's entries, so a cached
+    upload never claims rows that are no longer stored. Also counts the
+    files and rows deduplicated by this process.
+    """
+
+    def __init__(self, collection, ttl=UPLOAD_CACHE_TTL, max_bytes=UPLOAD_CACHE_MAX_BYTES):
+        self.collection = collection
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.files = 0
+        self.misses = 0
+        self.stored = 0
+        self.too_large = 0
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def get(self, username, file_hash, model_version):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        # The TTL monitor only runs once a minute, so check expiry here too
+        doc = self.collection.find_one({
+            "username": username, "file_hash": file_hash, "model_version": model_version,
+            "expires_at": {"$gt": now},
+        })
+        with self._lock:
+            if doc is None:
+                self.misses += 1
+                return None
+            self.files += 1
+        return json.loads(gzip.decompress(doc["body"]))
+
+    def put(self, username, file_hash, model_version, body, dumps):
+        data = gzip.compress(dumps(body).encode('utf-8'), 1)
+        if len(data) > self.max_bytes:
+            with self._lock:
+                self.too_large += 1
+            return False
+        now = datetime.datetime.now(datetime.timezone.utc)
+        try:
+            self.collection.update_one(
+                {"username": username, "file_hash": file_hash, "model_version": model_version},
+                {"$set": {"body": Binary(data), "created_at": now,
+                          "expires_at": now + datetime.timedelta(seconds=self.ttl)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # The same file finished in another request first
+            return False
+        with self._lock:
+            self.stored += 1
+        return True
+
+    def forget(self, username):
+        self.collection.delete_many({"username": username})
+
+    def count_rows(self, duplicates):
+        with self._lock:
+            self.rows += duplicates
+
+    def stats(self):
+        with self._lock:
+            return {"enabled": UPLOAD_DEDUP, "duplicate_files": self.files, "duplicate_rows": self.rows,
+                    "cache_misses": self.misses, "cached": self.stored, "too_large": self.too_large,
+                    "ttl_seconds": self.ttl, "max_bytes": self.max_bytes}
@@ -0,0 +1,116 @@
+import gzip
+import os
+
+try:
+    import msgpack
+except ImportError:  # MessagePack responses are offered only when installed
+    msgpack = None
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Response bodies shorter than this go out uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1400))
+# Level 1 takes a fifth of level 6's time on columnar bodies for ~9% more bytes
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 1))
+# Brotli's default quality (11) is far too slow for responses; 4-5 still beats gzip on size
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 4))
+
+COLUMNAR_MIMETYPE = 'application/vnd.focus.columnar+json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+FORMATS = {
+    'json': 'application/json',
+    'columnar': COLUMNAR_MIMETYPE,
+    'msgpack': MSGPACK_MIMETYPE,
+}
+# Accept values that select a format, in order of preference for "*/*"
+ACCEPT_TYPES = {
+    'application/json': 'json',
+    COLUMNAR_MIMETYPE: 'columnar',
+    MSGPACK_MIMETYPE: 'msgpack',
+    'application/x-msgpack': 'msgpack',
+}
+
+# Columns with few distinct values per response: sent once per response in
+# "dictionaries", with each row holding an index into that list
+DICTIONARY_COLUMNS = frozenset({
+    'student_id', 'Feedback', 'TopFeatures', 'Severities',
+    'feedback', 'top_features', 'severities',
+})
+
+
+def _key(value):
+    if isinstance(value, dict):
+        return tuple(value.items())
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def columnar(rows, dictionary_columns=DICTIONARY_COLUMNS):
+    """A list of row dicts as {"count", "columns", "dictionaries"}.
+
+    columns maps each key to its values in row order (None where a row lacks
+    it); for dictionary columns the values are indexes into
+    dictionaries[key], which lists every distinct value once.
+    """
+    names = dict.fromkeys(name for row in rows for name in row)
+    columns, dictionaries = {}, {}
+    for name in names:
+        values = [row.get(name) for row in rows]
+        if name in dictionary_columns:
+            codes, table = {}, []
+            for i, value in enumerate(values):
+                key = _key(value)
+                code = codes.get(key)
+                if code is None:
+                    code = codes[key] = len(table)
+                    table.append(value)
+                values[i] = code
+            dictionaries[name] = table
+        columns[name] = values
+    return {"count": len(rows), "columns": columns, "dictionaries": dictionaries}
+
+
+def available_formats():
+    return [fmt for fmt in FORMATS if fmt != 'msgpack' or msgpack is not None]
+
+
+def negotiate(args, accept_mimetypes):
+    """The response format from ?format= or the Accept header: (format, error message or None)."""
+    formats = available_formats()
+    requested = args.get('format')
+    if requested:
+        if requested == 'msgpack' and msgpack is None:
+            return None, "MessagePack responses need the msgpack package"
+        if requested not in formats:
+            return None, f"format must be one of {formats}"
+        return requested, None
+    offered = [mimetype for mimetype, fmt in ACCEPT_TYPES.items() if fmt in formats]
+    return ACCEPT_TYPES[accept_mimetypes.best_match(offered, 'application/json')], None
+
+
+def encode(body, fmt, dumps, rows_key=None):
+    """Serialize body in fmt; returns (bytes, mimetype).
+
+    The rows (body itself, or body[rows_key]) keep today's list-of-objects
+    layout for "json" and become columnar() for "columnar" (JSON) and
+    "msgpack". dumps is the app's JSON encoder (app.json.dumps).
+    """
+    if fmt != 'json':
+        body = columnar(body) if rows_key is None else {**body, rows_key: columnar(body[rows_key])}
+    if fmt == 'msgpack':
+        return msgpack.packb(body, default=str), MSGPACK_MIMETYPE
+    return dumps(body, separators=(',', ':')).encode('utf-8'), FORMATS[fmt]
+
+
+def compress(data, accept_encodings):
+    """data compressed with the best encoding the client accepts: (bytes, Content-Encoding or None)."""
+    if len(data) < COMPRESS_MIN_BYTES:
+        return data, None
+    if brotli is not None and accept_encodings['br']:
+        return brotli.compress(data, quality=BROTLI_QUALITY), 'br'
+    if accept_encodings['gzip']:
+        return gzip.compress(data, GZIP_LEVEL), 'gzip'
+    return data, None
@@ -0,0 +1,107 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Where feedback "causes" come from:
+#   sample (default) - each row's own tree-path (Saabas) contributions toward
+#                      its predicted level (see CompiledForest.contributions).
+#                      These approximate SHAP values but are not SHAP: each
+#                      change in probability is credited to the feature split
+#                      on at that node, so order along the path matters
+#   class            - the per-level SHAP averages saved at training time
+FEEDBACK_ATTRIBUTION = os.getenv("FEEDBACK_ATTRIBUTION", "sample")
+# What the weights behind the feedback are, as reported by /model
+ATTRIBUTION_METHODS = {
+    'sample': "tree-path (Saabas) contributions per prediction, an approximation of SHAP values",
+    'class': "mean SHAP values per engagement level, computed at training time",
+}
+ATTRIBUTION_CACHE_SIZE = int(os.getenv("ATTRIBUTION_CACHE_SIZE", 100_000))
+# Readings that round to the same multiple of these steps (HeartRate,
+# SkinConductance, EEG) and share a level reuse one cached attribution
+ATTRIBUTION_QUANTUM = np.array([float(q) for q in os.getenv("ATTRIBUTION_QUANTUM", "0.5,0.01,0.1").split(',')])
+
+
+class AttributionCache:
+    """Bounded LRU of top causes keyed by (bundle version, level, quantized input)."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        with self._lock:
+            found = []
+            for key in keys:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                found.append(value)
+            hits = sum(value is not None for value in found)
+            self.hits += hits
+            self.misses += len(found) - hits
+            return found
+
+    def put_many(self, items):
+        with self._lock:
+            for key, value in items:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "max_size": self.max_size,
+                    "hits": self.hits, "misses": self.misses}
+
+
+attribution_cache = AttributionCache(ATTRIBUTION_CACHE_SIZE)
+
+
+def top_causes_batch(bundle, X, levels, leaves=None, k=2):
+    """Top-k (feature, path contribution) pairs per row, strongest push toward its level first.
+
+    Rows are deduplicated by quantized input before anything is computed, and
+    only cache misses are attributed. ``leaves`` can be passed when the
+    prediction already traversed the forest; otherwise misses are traversed here.
+    """
+    X = np.atleast_2d(np.asarray(X, dtype=float))
+    levels = np.asarray(levels, dtype=int)
+
+    # One int64 key per row: level and each quantized feature in 20-bit fields
+    quantized = np.clip(np.rint(X / ATTRIBUTION_QUANTUM), 0, (1 << 20) - 1).astype(np.int64)
+    packed = levels.astype(np.int64)
+    for col in range(quantized.shape[1]):
+        packed = (packed << 20) | quantized[:, col]
+    if len(packed) == 1:
+        unique, first, inverse = packed, np.zeros(1, dtype=np.intp), np.zeros(1, dtype=np.intp)
+    else:
+        unique, first, inverse = np.unique(packed, return_index=True, return_inverse=True)
+
+    keys = [(bundle.version, key) for key in unique.tolist()]
+    found = attribution_cache.get_many(keys)
+
+    missing = [i for i, value in enumerate(found) if value is None]
+    if missing:
+        rows = first[missing]
+        leaf_rows = leaves[rows] if leaves is not None else bundle.leaves(X[rows])
+        contrib = bundle.compiled.contributions(leaf_rows, levels[rows])
+        order = np.argsort(-contrib, axis=1)[:, :k]
+        features = bundle.features
+        computed = [
+            [(features[j], row_contrib[j]) for j in row_order]
+            for row_order, row_contrib in zip(order.tolist(), contrib.tolist())
+        ]
+        for i, value in zip(missing, computed):
+            found[i] = value
+        attribution_cache.put_many(zip([keys[i] for i in missing], computed))
+
+    return [found[i] for i in inverse.tolist()]
@@ -0,0 +1,126 @@
+import csv
+import io
+import itertools
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # CSV exports only
+    pa = pq = None
+
+# Documents fetched per cursor round trip, and rows per CSV chunk / Parquet row group
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 5000))
+
+SENSOR_COLUMNS = ['HeartRate', 'SkinConductance', 'EEG']
+# One flat row per prediction; top features are joined with ";"
+EXPORT_COLUMNS = (
+    ['id', 'student_id', 'timestamp'] + SENSOR_COLUMNS
+    + ['predicted_engagement_level', 'feedback', 'top_features']
+    + [f"{col}_severity" for col in SENSOR_COLUMNS]
+)
+export_projection = {"username": 0}
+
+
+def batches(cursor, size=EXPORT_BATCH_SIZE):
+    """Lists of up to size documents from cursor; only one list is held at a time."""
+    while True:
+        batch = list(itertools.islice(cursor, size))
+        if not batch:
+            return
+        yield batch
+
+
+def export_columns(docs):
+    """A batch of prediction documents as {column: values}, in EXPORT_COLUMNS order."""
+    inputs = [doc.get('input_data') or {} for doc in docs]
+    severities = [doc.get('severities') or {} for doc in docs]
+    columns = {
+        'id': [str(doc['_id']) for doc in docs],
+        # A CSV with numeric ids stores them as ints; the column is always text
+        'student_id': [None if doc.get('student_id') is None else str(doc['student_id']) for doc in docs],
+        'timestamp': [doc.get('timestamp') for doc in docs],
+    }
+    for col in SENSOR_COLUMNS:
+        columns[col] = [row.get(col) for row in inputs]
+    columns['predicted_engagement_level'] = [doc.get('predicted_engagement_level') for doc in docs]
+    columns['feedback'] = [doc.get('feedback') for doc in docs]
+    columns['top_features'] = [';'.join(doc.get('top_features') or []) for doc in docs]
+    for col in SENSOR_COLUMNS:
+        columns[f"{col}_severity"] = [row.get(col) for row in severities]
+    return columns
+
+
+def csv_chunks(cursor, batch_size=EXPORT_BATCH_SIZE):
+    """CSV text for every prediction in cursor: the header, then one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for docs in batches(cursor, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        columns = export_columns(docs)
+        columns['timestamp'] = [ts.isoformat() if ts is not None else None for ts in columns['timestamp']]
+        writer.writerows(zip(*columns.values()))
+        yield buffer.getvalue()
+
+
+class _Drain(io.RawIOBase):
+    """A write-only file whose contents are handed out (and forgotten) by take()."""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b''.join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def parquet_schema():
+    return pa.schema(
+        [('id', pa.string()), ('student_id', pa.string()), ('timestamp', pa.timestamp('ms'))]
+        + [(col, pa.float64()) for col in SENSOR_COLUMNS]
+        + [('predicted_engagement_level', pa.int64()), ('feedback', pa.string()), ('top_features', pa.string())]
+        + [(f"{col}_severity", pa.string()) for col in SENSOR_COLUMNS]
+    )
+
+
+def parquet_chunks(cursor, batch_size=EXPORT_BATCH_SIZE):
+    """A Parquet file of every prediction in cursor, sent one row group per batch."""
+    schema = parquet_schema()
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    try:
+        for docs in batches(cursor, batch_size):
+            writer.write_batch(pa.RecordBatch.from_pydict(export_columns(docs), schema=schema))
+            data = sink.take()
+            if data:
+                yield data
+    finally:
+        # The footer (row group index) goes out last
+        writer.close()
+    yield sink.take()
+
+
+EXPORT_FORMATS = {
+    'csv': (csv_chunks, 'text/csv'),
+    'parquet': (parquet_chunks, 'application/vnd.apache.parquet'),
+}
+
+
+def available_export_formats():
+    return [fmt for fmt in EXPORT_FORMATS if fmt != 'parquet' or pq is not None]
@@ -0,0 +1,163 @@
+import os
+import numpy as np
+
+
+class CompiledForest:
+    """StandardScaler + RandomForestClassifier flattened into contiguous NumPy arrays.
+
+    Every tree's nodes are concatenated into one table. Leaves point back to
+    themselves, so a fixed number of descent steps (the deepest tree's depth)
+    lands every (row, tree) pair on its leaf without branching per tree.
+    ``children`` is interleaved as [right, left] per node so one gather with
+    the comparison result picks the next node.
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth,
+                 scaler_mean, scaler_scale, classes, path_contributions=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.scaler_mean = scaler_mean
+        self.scaler_scale = scaler_scale
+        self.classes = classes
+        # Built here rather than on first use, so it is ready (and, in a
+        # pre-fork server, shared) before any request; saved with the
+        # other arrays so loading a bundle only maps it
+        self.path_contributions = (self.compute_path_contributions()
+                                   if path_contributions is None else path_contributions)
+
+    @classmethod
+    def from_estimators(cls, model, scaler):
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            children.append(np.stack([
+                np.where(is_leaf, node_ids, tree.children_right),
+                np.where(is_leaf, node_ids, tree.children_left),
+            ], axis=1).ravel() + offset)
+
+            # Per-tree class probabilities at each node, as DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :]
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(value / normalizer)
+            offset += tree.node_count
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.intp),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            children=np.ascontiguousarray(np.concatenate(children), dtype=np.intp),
+            value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max(estimator.tree_.max_depth for estimator in model.estimators_),
+            scaler_mean=np.asarray(scaler.mean_, dtype=np.float64),
+            scaler_scale=np.asarray(scaler.scale_, dtype=np.float64),
+            classes=np.asarray(model.classes_),
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def transform(self, X):
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        # sklearn trees compare float32 inputs against float64 thresholds
+        return ((X - self.scaler_mean) / self.scaler_scale).astype(np.float32)
+
+    def apply(self, X_scaled):
+        """Leaf index of every (row, tree) pair for already-scaled rows."""
+        n_rows, n_features = X_scaled.shape
+        flat = X_scaled.ravel()
+        row_base = (np.arange(n_rows) * n_features)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_trees))
+        for _ in range(self.max_depth):
+            go_left = flat.take(row_base + self.feature.take(nodes)) <= self.threshold.take(nodes)
+            nodes = self.children.take(2 * nodes + go_left)
+        return nodes
+
+    def proba_from_leaves(self, leaves):
+        # Trees are added in order, as sklearn does, so ties between classes
+        # break identically
+        if len(leaves) <= 64:
+            proba = self.value[leaves].sum(axis=1)
+        else:
+            # Tree by tree over contiguous columns; never builds a
+            # (rows, trees, classes) block for large batches
+            proba = np.zeros((len(leaves), self.value.shape[1]))
+            for tree_leaves in np.ascontiguousarray(leaves.T):
+                proba += self.value.take(tree_leaves, axis=0)
+        return proba / self.n_trees
+
+    def predict_from_leaves(self, leaves):
+        return self.classes[np.argmax(self.proba_from_leaves(leaves), axis=1)]
+
+    def predict_proba(self, X):
+        return self.proba_from_leaves(self.apply(self.transform(X)))
+
+    def predict(self, X):
+        return self.predict_from_leaves(self.apply(self.transform(X)))
+
+    # ---------------------- attributions ----------------------
+    def compute_path_contributions(self):
+        """(classes, nodes, features) change in class probability credited to
+        each feature along the root-to-node path (Saabas decomposition)."""
+        n_features, n_classes = len(self.scaler_mean), self.value.shape[1]
+        contrib = np.zeros((len(self.threshold), n_features, n_classes))
+        children = self.children.reshape(-1, 2)
+        frontier = self.roots
+        while len(frontier):
+            internal = frontier[children[frontier, 0] != frontier]
+            for side in (0, 1):
+                child = children[internal, side]
+                contrib[child] = contrib[internal]
+                contrib[child, self.feature[internal]] += self.value[child] - self.value[internal]
+            frontier = children[internal].ravel()
+        return np.ascontiguousarray(contrib.transpose(2, 0, 1))
+
+    def contributions(self, leaves, levels):
+        """(rows, features) contribution of each feature toward each row's predicted level.
+
+        With the forest's mean root probability these add up to the
+        predicted probability of that level.
+        """
+        class_idx = np.searchsorted(self.classes, levels)
+        path = self.path_contributions
+        if len(leaves) <= 64:
+            return path[class_idx[:, None], leaves].sum(axis=1) / self.n_trees
+        out = np.zeros((len(leaves), path.shape[2]))
+        for tree_leaves in np.ascontiguousarray(leaves.T):
+            out += path[class_idx, tree_leaves]
+        return out / self.n_trees
+
+    # ---------------------- persistence ----------------------
+    _arrays = ('feature', 'threshold', 'children', 'value', 'roots', 'scaler_mean', 'scaler_scale', 'classes')
+    # Derived from _arrays; recomputed when loading a bundle saved without them
+    _derived_arrays = ('path_contributions',)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in self._arrays + self._derived_arrays:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        np.save(os.path.join(directory, "max_depth.npy"), np.asarray(self.max_depth))
+
+    @classmethod
+    def load(cls, directory, mmap=False):
+        """Load saved arrays; with mmap=True they are read-only views of the files."""
+        mode = 'r' if mmap else None
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode) for name in cls._arrays}
+        for name in cls._derived_arrays:
+            path = os.path.join(directory, f"{name}.npy")
+            if os.path.exists(path):
+                arrays[name] = np.load(path, mmap_mode=mode)
+        max_depth = int(np.load(os.path.join(directory, "max_depth.npy")))
+        return cls(max_depth=max_depth, **arrays)
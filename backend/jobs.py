@@ -0,0 +1,411 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import re
+import shutil
+import signal
+import sys
+import threading
+import time
+import traceback
+import uuid
+import pandas as pd
+from bson.objectid import ObjectId
+
+try:
+    import fcntl
+except ImportError:  # Windows: jobs are only claimed within one process
+    fcntl = None
+
+FINISHED = ('done', 'failed', 'cancelled')
+JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def _write_json(path, payload):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(payload, f, default=str)
+    os.replace(tmp, path)
+
+
+def count_rows(path, chunk_rows=100_000):
+    """Data rows in a CSV file as pandas parses them (blank lines dropped, quoted newlines kept), for progress reporting."""
+    # Only the first column is kept; the tokenizer still walks every field
+    return sum(len(chunk) for chunk in pd.read_csv(path, usecols=[0], dtype=str, chunksize=chunk_rows))
+
+
+def parsed_chunks(path, chunk_rows, skip_rows):
+    """pd.read_csv chunks of path after its first skip_rows parsed rows.
+
+    Rows are counted as pandas parses them, like count_rows and the
+    checkpoint, so blank lines and quoted multi-line fields cannot shift the
+    resume point. Skipped chunks are parsed and discarded.
+    """
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        if skip_rows >= len(chunk):
+            skip_rows -= len(chunk)
+            continue
+        if skip_rows:
+            chunk, skip_rows = chunk.iloc[skip_rows:], 0
+        yield chunk
+
+
+def row_object_id(job_id, row):
+    """The same ObjectId for a file row every time it is scored, so a resumed chunk inserts nothing twice."""
+    return ObjectId(hashlib.blake2b(f"{job_id}:{row}".encode(), digest_size=12).digest())
+
+
+class JobStore:
+    """Upload, checkpoint and result pages of every job, one directory each under ``root``.
+
+    <root>/<job id>/upload.csv   the uploaded file
+                   /state.json   status and checkpoint, replaced atomically
+                   /pages/<n>.json  results and rejected rows of chunk n
+                   /cancel       present once a cancel was requested
+                   /lock         flock'ed by whichever worker runs the job
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        # Without fcntl, claims only exclude the threads of this process
+        self._claimed = set()
+        self._claimed_lock = threading.Lock()
+
+    def path(self, job_id, *parts):
+        if not JOB_ID.match(job_id):
+            raise KeyError(job_id)
+        return os.path.join(self.root, job_id, *parts)
+
+    def create(self, username, upload, filename):
+        """Save an upload (a file-like object or a path to move) as a new queued job."""
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.path(job_id, 'pages'))
+        target = self.path(job_id, 'upload.csv')
+        if isinstance(upload, str):
+            shutil.move(upload, target)
+        else:
+            with open(target, 'wb') as f:
+                shutil.copyfileobj(upload, f, 1 << 20)
+        state = {
+            "id": job_id,
+            "username": username,
+            "filename": filename,
+            "status": "queued",
+            "created_at": _now(),
+            "started_at": None,
+            "finished_at": None,
+            "upload_bytes": os.path.getsize(target),
+            "total_rows": None,
+            "rows_done": 0,
+            "pages": 0,
+            "accepted": 0,
+            "rejected": 0,
+            "already_stored": 0,
+            "duplicate_rows": 0,
+            "resumed": 0,
+            "attempts": 0,
+            "retry_at": None,
+            "error": None,
+        }
+        # The state file appears last, so workers never see a half-saved upload
+        self.save(state)
+        return state
+
+    def load(self, job_id):
+        try:
+            with open(self.path(job_id, 'state.json')) as f:
+                return json.load(f)
+        except (FileNotFoundError, KeyError):
+            return None
+
+    def save(self, state):
+        _write_json(self.path(state["id"], 'state.json'), state)
+
+    def jobs(self, username=None):
+        states = []
+        for job_id in os.listdir(self.root):
+            state = self.load(job_id) if JOB_ID.match(job_id) else None
+            if state is not None and (username is None or state["username"] == username):
+                states.append(state)
+        return sorted(states, key=lambda s: s["created_at"])
+
+    def write_page(self, job_id, page, payload):
+        _write_json(self.path(job_id, 'pages', f"{page}.json"), payload)
+
+    def read_page(self, job_id, page):
+        try:
+            with open(self.path(job_id, 'pages', f"{page}.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def request_cancel(self, job_id):
+        open(self.path(job_id, 'cancel'), 'w').close()
+
+    def cancel_requested(self, job_id):
+        return os.path.exists(self.path(job_id, 'cancel'))
+
+    def remove(self, job_id):
+        """Delete a job; call it while holding the job's claim, so no worker picks it up halfway."""
+        shutil.rmtree(self.path(job_id), ignore_errors=True)
+
+    def exists(self, job_id):
+        return os.path.exists(self.path(job_id, 'state.json'))
+
+    def requeue(self, job_id):
+        """Queue a failed job again from its checkpoint; returns the new state, or None if it is not a failed job nobody holds."""
+        claim = self.claim(job_id)
+        if claim is None:
+            return None
+        try:
+            state = self.load(job_id)
+            if state is None or state["status"] != 'failed':
+                return None
+            state.update(status='queued', attempts=0, retry_at=None, finished_at=None)
+            self.save(state)
+            return state
+        finally:
+            self.release(claim)
+
+    # ---------------------- claims ----------------------
+    def claim(self, job_id):
+        """Lock a job for one worker; returns a handle for release(), or None if it is taken."""
+        with self._claimed_lock:
+            if job_id in self._claimed:
+                return None
+            self._claimed.add(job_id)
+        handle = None
+        try:
+            handle = open(self.path(job_id, 'lock'), 'a')
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return (job_id, handle)
+        except (BlockingIOError, FileNotFoundError):
+            if handle is not None:
+                handle.close()
+            with self._claimed_lock:
+                self._claimed.discard(job_id)
+            return None
+
+    def release(self, claim):
+        job_id, handle = claim
+        handle.close()
+        with self._claimed_lock:
+            self._claimed.discard(job_id)
+
+
+class JobRunner:
+    """Worker threads that score queued jobs chunk by chunk.
+
+    A job is claimed with a file lock, so several server processes (and
+    ``python jobs.py`` workers) can share one job directory; the lock dies
+    with its process, and the next worker to poll resumes from the last
+    checkpoint. Each chunk is scored, stored, written as a result page and
+    only then checkpointed, and rows get deterministic ``_id``s, so
+    redoing a chunk after a crash stores nothing twice.
+
+    ``score(df, username, ids)`` returns (docs, records, rejected, duplicate
+    rows) for a chunk, giving each document its ``_id`` from ids (a Series
+    on the chunk's index); ``store_docs(docs)`` inserts them and returns how
+    many were new.
+
+    An error of a ``retryable`` type (the database or disk being briefly
+    unavailable) puts the job back in the queue with its checkpoint; it is
+    retried after ``retry_seconds`` (doubling each time) and fails only
+    after ``max_attempts``. Any other error (a malformed file) fails the
+    job at once. A failed job can be queued again with JobStore.requeue().
+    """
+
+    def __init__(self, store, score, store_docs, workers=1, chunk_rows=10_000, poll_seconds=1.0,
+                 retention_seconds=86_400, required_columns=(), retryable=(OSError,), max_attempts=5,
+                 retry_seconds=30.0):
+        self.store = store
+        self.score = score
+        self.store_docs = store_docs
+        self.chunk_rows = chunk_rows
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_seconds
+        self.required_columns = list(required_columns)
+        self.retryable = tuple(retryable)
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True) for i in range(workers)
+        ]
+        self.chunks = 0
+        self.rows = 0
+        self.failures = 0
+        self.retries = 0
+        self.errors = 0
+        for thread in self._threads:
+            thread.start()
+
+    def notify(self):
+        """A job was queued; wake an idle worker instead of waiting for the next poll."""
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def stats(self):
+        return {"workers": len(self._threads), "chunk_rows": self.chunk_rows,
+                "chunks": self.chunks, "rows": self.rows, "failures": self.failures,
+                "retries": self.retries, "errors": self.errors}
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                if not self.run_next():
+                    self._wake.wait(self.poll_seconds)
+                    self._wake.clear()
+                    self.remove_expired()
+            except Exception:
+                # Keep the worker alive for the other jobs; this one is picked up again on a later poll
+                self.errors += 1
+                print(f"⚠️ {threading.current_thread().name} failed between jobs:", file=sys.stderr, flush=True)
+                traceback.print_exc()
+                self._wake.wait(self.poll_seconds)
+
+    def run_next(self):
+        """Claim and run the oldest unfinished job nobody else holds; False if there was none."""
+        now = _now()
+        for state in self.store.jobs():
+            if state["status"] in FINISHED or (state.get("retry_at") or '') > now:
+                continue
+            claim = self.store.claim(state["id"])
+            if claim is None:
+                continue
+            try:
+                # Re-read under the lock: another worker may have finished it meanwhile
+                state = self.store.load(state["id"])
+                if state is not None and state["status"] not in FINISHED and (state.get("retry_at") or '') <= now:
+                    self.run_job(state)
+            finally:
+                self.store.release(claim)
+            return True
+        return False
+
+    def run_job(self, state):
+        job_id = state["id"]
+        path = self.store.path(job_id, 'upload.csv')
+        if state["status"] == 'running':
+            state["resumed"] += 1
+        state["status"] = 'running'
+        state["started_at"] = state["started_at"] or _now()
+        state["retry_at"] = None
+
+        try:
+            if state["total_rows"] is None:
+                state["total_rows"] = count_rows(path)
+            self.store.save(state)
+            for chunk in parsed_chunks(path, self.chunk_rows, state["rows_done"]):
+                if self._stopping.is_set():
+                    return
+                if self.store.cancel_requested(job_id):
+                    state["status"] = 'cancelled'
+                    break
+                missing = [col for col in self.required_columns if col not in chunk.columns]
+                if missing:
+                    raise ValueError(f"CSV is missing columns: {missing}")
+                self.run_chunk(state, chunk)
+            else:
+                state["status"] = 'done'
+                state["error"] = None
+        except Exception as exc:
+            if not self.store.exists(job_id):
+                # Deleted while it ran; there is nothing left to report to
+                return
+            state["attempts"] = state.get("attempts", 0) + 1
+            state["error"] = f"{type(exc).__name__}: {exc}"
+            if isinstance(exc, self.retryable) and state["attempts"] < self.max_attempts:
+                # Back in the queue; rows_done still points after the last stored chunk
+                self.retries += 1
+                state["status"] = 'queued'
+                delay = self.retry_seconds * 2 ** (state["attempts"] - 1)
+                state["retry_at"] = (datetime.datetime.now(datetime.timezone.utc)
+                                     + datetime.timedelta(seconds=delay)).isoformat()
+                self.store.save(state)
+                return
+            self.failures += 1
+            state["status"] = 'failed'
+        state["finished_at"] = _now()
+        self.store.save(state)
+
+    def run_chunk(self, state, chunk):
+        start = state["rows_done"]
+        # Row numbers count data rows of the whole file, also in "rejected"
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        ids = pd.Series([row_object_id(state["id"], row) for row in chunk.index], index=chunk.index, dtype=object)
+        docs, records, rejected, duplicates = self.score(chunk, state["username"], ids)
+        new = self.store_docs(docs) if docs else 0
+
+        page = state["pages"]
+        self.store.write_page(state["id"], page, {
+            "page": page,
+            "rows": [start, start + len(chunk)],
+            "results": records,
+            "rejected": rejected,
+        })
+        state["pages"] = page + 1
+        state["rows_done"] = start + len(chunk)
+        state["accepted"] += len(records)
+        state["rejected"] += len(rejected)
+        state["already_stored"] += len(docs) - new
+        state["duplicate_rows"] = state.get("duplicate_rows", 0) + duplicates
+        self.store.save(state)
+        self.chunks += 1
+        self.rows += len(chunk)
+
+    def remove_expired(self):
+        """Delete finished jobs older than retention_seconds (with their uploads and pages)."""
+        if self.retention_seconds <= 0:
+            return
+        cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=self.retention_seconds)
+        for state in self.store.jobs():
+            try:
+                finished = state.get("finished_at")
+                if not (state["status"] in FINISHED and finished and datetime.datetime.fromisoformat(finished) < cutoff):
+                    continue
+                claim = self.store.claim(state["id"])
+                if claim is None:
+                    continue
+                try:
+                    self.store.remove(state["id"])
+                finally:
+                    self.store.release(claim)
+            except Exception as exc:
+                # One bad job directory must not stop the others from expiring
+                print(f"⚠️ Could not remove expired job {state.get('id')}: {exc}", file=sys.stderr, flush=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run background CSV scoring jobs outside the web server")
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+
+    # This process only runs jobs; don't also start prediction's in-server runner
+    os.environ['JOB_WORKERS'] = '0'
+    import prediction
+
+    runner = prediction.start_job_runner(args.workers)
+    print(f"🧵 {args.workers} job worker(s) polling {prediction.JOBS_DIR}", flush=True)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runner.stop(timeout=5)
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import numpy as np
+
+
+# Feature box enforced by validate_ranges, in expected_columns order.
+# SkinConductance spans three decades but real readings sit below ~1.5 µS,
+# so that axis is spaced geometrically to keep resolution where the data is.
+GRID_AXES = [
+    ('HeartRate', 20.0, 100.0, False),
+    ('SkinConductance', 0.01, 20.0, True),
+    ('EEG', 1.0, 20.0, False),
+]
+
+
+def parse_grid_spec(spec):
+    """"128" -> (128, 128, 128); "96,256,64" -> per-axis sizes."""
+    sizes = [int(part) for part in spec.split(',') if part.strip()]
+    if len(sizes) == 1:
+        sizes = sizes * len(GRID_AXES)
+    if len(sizes) != len(GRID_AXES) or min(sizes) < 2:
+        raise ValueError(f"LOOKUP_GRID must be one size or {len(GRID_AXES)} comma-separated sizes >= 2")
+    return tuple(sizes)
+
+
+class LookupTable:
+    """Predicted level at every point of a quantized grid over the feature box.
+
+    Levels are stored as a uint8 array (optionally memory-mapped from disk) and
+    a row is answered by snapping each feature to its nearest grid point.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.shape = table.shape
+        self._scale = []
+        self._offset = []
+        for (_, low, high, log), n in zip(GRID_AXES, self.shape):
+            if log:
+                low, high = np.log(low), np.log(high)
+            self._scale.append((n - 1) / (high - low))
+            self._offset.append(low)
+
+    @staticmethod
+    def grid_points(shape):
+        axes = []
+        for (_, low, high, log), n in zip(GRID_AXES, shape):
+            axes.append(np.geomspace(low, high, n) if log else np.linspace(low, high, n))
+        return axes
+
+    @classmethod
+    def build(cls, predict_fn, shape, chunk_rows=500_000):
+        axes = cls.grid_points(shape)
+        mesh = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, len(axes))
+        levels = np.empty(len(mesh), dtype=np.uint8)
+        for start in range(0, len(mesh), chunk_rows):
+            levels[start:start + chunk_rows] = predict_fn(mesh[start:start + chunk_rows])
+        return cls(levels.reshape(shape))
+
+    @staticmethod
+    def cache_key(model_paths, shape):
+        """Hash of everything the table depends on: the model files (scaler and forest), GRID_AXES and shape."""
+        digest = hashlib.sha256()
+        for path in model_paths:
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        digest.update(repr((GRID_AXES, tuple(shape))).encode())
+        return digest.hexdigest()[:16]
+
+    @classmethod
+    def load_or_build(cls, predict_fn, shape, cache_dir, model_paths, mmap=True):
+        """The table for predict_fn, cached in cache_dir under cache_key(model_paths, shape)."""
+        grid = 'x'.join(str(n) for n in shape)
+        path = os.path.join(cache_dir, f"lookup_{cls.cache_key(model_paths, shape)}_{grid}.npy")
+
+        if not os.path.exists(path):
+            table = cls.build(predict_fn, shape).table
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, table)
+            os.replace(tmp_path, path)
+
+        return cls(np.load(path, mmap_mode='r' if mmap else None))
+
+    def indices(self, X):
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        idx = []
+        for col, ((_, low, high, log), n) in enumerate(zip(GRID_AXES, self.shape)):
+            values = np.clip(X[:, col], low, high)
+            if log:
+                values = np.log(values)
+            idx.append(np.rint((values - self._offset[col]) * self._scale[col]).astype(np.intp))
+        return tuple(idx)
+
+    def predict(self, X):
+        return self.table[self.indices(X)].astype(int)
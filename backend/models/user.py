@@ -1,5 +1,12 @@
+import os
 import bcrypt
-from db import users_collection
+from utils import TTLCache
+
+# User documents are served from memory for up to USER_CACHE_TTL seconds;
+# writes through this module invalidate them immediately in this process, and
+# other worker processes pick them up once their entry expires
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 30))
+user_cache = TTLCache(int(os.getenv("USER_CACHE_SIZE", 10_000)), USER_CACHE_TTL)
 
 def hash_password(password: str) -> bytes:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
@@ -7,7 +14,11 @@ def hash_password(password: str) -> bytes:
 def check_password(password: str, hashed: bytes) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed)
 
+# db is imported inside the functions below: the async app uses this module's
+# password helpers and cache but must not open the sync client
+
 def create_user(username: str, password: str, email: str):
+    from db import users_collection
     if users_collection.find_one({"username": username}):
         return False, "Username already exists"
     hashed = hash_password(password)
@@ -16,5 +27,20 @@ def create_user(username: str, password: str, email: str):
     return True, "User created"
 
 def get_user(username: str):
+    from db import users_collection
     user = users_collection.find_one({"username": username})
     return user
+
+def get_user_cached(username: str):
+    """get_user through the TTL cache; misses (including unknown users) go to Mongo."""
+    user = user_cache.get(username)
+    if user is None:
+        user = get_user(username)
+        if user is not None:
+            user_cache.put(username, user)
+    return user
+
+def set_password(username: str, password: str):
+    from db import users_collection
+    users_collection.update_one({"username": username}, {"$set": {"password": hash_password(password)}})
+    user_cache.pop(username)
@@ -1,261 +1,719 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 import pandas as pd
-import joblib
-import numpy as np
-import random
-from db import predictions_collection
-from utils import verify_token
+import os
+import itertools
+import atexit
+import shutil
+import tempfile
+import functools
+from constants import INSERT_BATCH_SIZE, ROLLUPS_ENABLED
+from db import predictions_collection, rollups_collection, uploads_collection
+from utils import bearer_token, require_auth, verify_token
+from batcher import MicroBatcher
+from writer import WriteBehindWriter, insert_ignoring_duplicates
+from jobs import JobRunner, JobStore
+from rollups import apply_rollups
+from streaming import StreamHub
+import json
+import queue
+import threading
+from artifacts import current_bundle, reload_stats
+from explain import ATTRIBUTION_METHODS, FEEDBACK_ATTRIBUTION, attribution_cache
+from scoring import (
+    expected_columns, predict_with_leaves_rows, check_manual_input, score_manual, score_rows,
+    HISTORY_PAGE_SIZE, STUDENT_HISTORY_PAGE_SIZE, history_find, history_result,
+    summary_query, summary_body, TREND_MAX_DOCS, trend_projection, timestamp_range, trend_query, trend_too_large, trend_body,
+    student_id_match,
+)
+from metrics import timed
+from encoding import compress, encode, negotiate
+from dedupe import UPLOAD_DEDUP, UploadCache, duplicate_mask, file_digest, row_hashes, stored_hash_queries
+from export import EXPORT_BATCH_SIZE, EXPORT_FORMATS, available_export_formats, export_projection
 from bson.objectid import ObjectId
+from pymongo.errors import PyMongoError
 
 
 prediction_bp = Blueprint('prediction', __name__)
 
-# Load model, scaler, and SHAP weights
-model = joblib.load('backend/model.pkl')
-scaler = joblib.load('backend/scaler.pkl')
-shap_importance = joblib.load('backend/feature_importance_shap.pkl')
-column_means = joblib.load('backend/column_means.pkl')
-
-expected_columns = ['HeartRate', 'SkinConductance', 'EEG']
-
-feedback_templates = {
-    0: [
-        "Your focus seems low. Consider improving {cause1} and monitoring your {cause2}.",
-        "Low engagement was detected. Try managing your {cause1} and {cause2}.",
-        "You can increase focus by enhancing your {cause1} and stabilizing {cause2}."
-    ],
-    1: [
-        "Moderate focus detected. Improving your {cause1} may boost engagement.",
-        "You're doing okay. For better focus, monitor {cause1} and {cause2}.",
-        "To reach high engagement, fine-tune your {cause1} and control {cause2}."
-    ],
-    2: [
-        "Excellent engagement! Keep maintaining your {cause1} and {cause2}.",
-        "Great job! Your {cause1} levels indicate strong focus.",
-        "You're highly engaged. Keep it up by balancing your {cause2}."
-    ]
-}
-
-def grade_severity(value, mean):
-    deviation = abs(value - mean)
-    if deviation < 0.5:
-        return 'normal'
-    elif deviation < 1.5:
-        return 'mild'
-    else:
-        return 'severe'
-    
-def validate_ranges(input_data):
-    errors = []
-    
-    # HRV: 20 - 100 ms (based on real-world HRV values)
-    if not (20 <= input_data['HeartRate'] <= 100):
-        errors.append("HRV must be between 20 and 100 ms.")
 
-    # EEG Alpha: 1 - 20 Hz (realistic range from dataset and EEG norms)
-    if not (1 <= input_data['EEG'] <= 20):
-        errors.append("EEG Alpha Waves must be between 1 and 20 Hz.")
-
-    # GSR: 0.01 - 20 µS (based on typical GSR range)
-    if not (0.01 <= input_data['SkinConductance'] <= 20):
-        errors.append("GSR must be between 0.01 and 20 µS.")
-    
-    return errors
-
-def generate_feedback(level, features):
-    shap_weights = shap_importance.get(int(level), {})
-    top_features = sorted(shap_weights.items(), key=lambda x: -x[1])[:2]
-    cause1, cause2 = [f[0] for f in top_features]
-    template = random.choice(feedback_templates[int(level)])
-    feedback = template.format(cause1=cause1, cause2=cause2)
-
-    severities = {
-        feat: grade_severity(features[feat], column_means[feat]) for feat in expected_columns
-    }
-
-    return feedback, top_features, severities
-
-def predict_df(df):
-    df = df.copy()
-    for col in expected_columns:
-        df[col] = df[col].fillna(column_means[col])
-    df_scaled = scaler.transform(df)
-    return model.predict(df_scaled)
+# Write-behind persistence: when WRITE_BEHIND=1 prediction documents are
+# buffered and written by a background thread instead of before responding.
+# WRITE_BEHIND_SPILL_DIR keeps an append-only copy until each batch is in Mongo.
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "0") == "1"
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", 50_000))
+WRITE_BEHIND_FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", 200))
+WRITE_BEHIND_PUT_TIMEOUT = float(os.getenv("WRITE_BEHIND_PUT_TIMEOUT", 5))
+WRITE_BEHIND_SPILL_DIR = os.getenv("WRITE_BEHIND_SPILL_DIR") or None
+WRITE_BEHIND_FSYNC = os.getenv("WRITE_BEHIND_FSYNC", "0") == "1"
+# Rows per chunk when /csv streams its response (?stream=true)
+CSV_CHUNK_SIZE = int(os.getenv("CSV_CHUNK_SIZE", 10000))
+
+# Optionally coalesce concurrent /manual requests into one forest traversal
+# per MICROBATCH_WINDOW_MS (or MICROBATCH_MAX_SIZE rows); 0 disables batching.
+# The leaves come back with each level, so attribution does not traverse again
+MICROBATCH_WINDOW_MS = float(os.getenv("MICROBATCH_WINDOW_MS", 0))
+MICROBATCH_MAX_SIZE = int(os.getenv("MICROBATCH_MAX_SIZE", 32))
+manual_batcher = (
+    MicroBatcher(predict_with_leaves_rows, MICROBATCH_WINDOW_MS, MICROBATCH_MAX_SIZE)
+    if MICROBATCH_WINDOW_MS > 0 else None
+)
+
+def update_rollups(docs, sign=1):
+    if ROLLUPS_ENABLED:
+        apply_rollups(rollups_collection, docs, sign)
+
+write_behind = None
+if WRITE_BEHIND:
+    write_behind = WriteBehindWriter(
+        predictions_collection, WRITE_BEHIND_MAX_QUEUE, INSERT_BATCH_SIZE, WRITE_BEHIND_FLUSH_MS,
+        WRITE_BEHIND_PUT_TIMEOUT, WRITE_BEHIND_SPILL_DIR, WRITE_BEHIND_FSYNC, on_written=update_rollups
+    )
+    atexit.register(write_behind.close)
+
+def save_predictions(docs):
+    """Store prediction documents; returns how many were new (None with write-behind, which stores them later).
+
+    Uploaded rows already stored (same row_hash) are skipped by the unique index.
+    """
+    if write_behind is not None:
+        write_behind.submit(docs)
+        return None
+    inserted = []
+    for start in range(0, len(docs), INSERT_BATCH_SIZE):
+        inserted += insert_ignoring_duplicates(predictions_collection, docs[start:start + INSERT_BATCH_SIZE])
+    update_rollups(inserted)
+    return len(inserted)
+
+upload_cache = UploadCache(uploads_collection)
+
+# ---------------------- response encodings ----------------------
+def response_format():
+    """Format negotiated for this request's result rows: (format, error response or None)."""
+    fmt, error = negotiate(request.args, request.accept_mimetypes)
+    if error:
+        return None, (jsonify({"error": error}), 406)
+    return fmt, None
+
+def encoded_response(body, fmt, rows_key=None):
+    """body as JSON records, columnar JSON or MessagePack, compressed if the client accepts it."""
+    with timed('serialize'):
+        data, mimetype = encode(body, fmt, current_app.json.dumps, rows_key)
+    with timed('compress'):
+        data, content_encoding = compress(data, request.accept_encodings)
+    response = Response(data, mimetype=mimetype)
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    response.vary.update(['Accept', 'Accept-Encoding'])
+    return response
 
 # ---------------------- /manual route ----------------------
 @prediction_bp.route('/manual', methods=['POST'])
-def manual_predict():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    username = verify_token(token)
-    if not username:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    input_data = request.json
-
-    # Check for student_id
-    student_id = input_data.get("student_id")
-    if not student_id:
-        return jsonify({"error": "Missing student_id"}), 400
-
-    for col in expected_columns:
-        if col not in input_data:
-            return jsonify({"error": f"Missing column: {col}"}), 400
-
-    data_for_model = {col: input_data[col] for col in expected_columns}
-    range_errors = validate_ranges(data_for_model)
-    if range_errors:
-        return jsonify({"error": " | ".join(range_errors)}), 400
-
-    df = pd.DataFrame([data_for_model], columns=expected_columns)
-    pred = int(predict_df(df)[0])
-
-    feedback, top_feats, severities = generate_feedback(pred, data_for_model)
-
-    doc = {
-        "username": username,
-        "student_id": student_id,
-        "input_data": data_for_model,
-        "predicted_engagement_level": pred,
-        "feedback": feedback,
-        "top_features": [f[0] for f in top_feats],
-        "severities": severities,
-        "timestamp": pd.Timestamp.now()
-    }
-    predictions_collection.insert_one(doc)
-
+@require_auth
+def manual_predict(username):
+    student_id, data_for_model, error = check_manual_input(request.json)
+    if error:
+        return jsonify({"error": error}), 400
+
+    doc, body = score_manual(username, student_id, data_for_model, current_bundle(), manual_batcher)
+    with timed('insert'):
+        save_predictions([doc])
+
+    return jsonify(body)
+
+@prediction_bp.route('/batcher', methods=['GET'])
+@require_auth
+def batcher_stats(username):
+    if manual_batcher is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **manual_batcher.stats()})
+
+@prediction_bp.route('/writer', methods=['GET'])
+@require_auth
+def writer_stats(username):
+    if write_behind is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **write_behind.stats()})
+
+@prediction_bp.route('/dedupe', methods=['GET'])
+@require_auth
+def dedupe_stats(username):
+    return jsonify(upload_cache.stats())
+
+@prediction_bp.route('/model', methods=['GET'])
+@require_auth
+def model_info(username):
     return jsonify({
-        "StudentID": student_id,
-        "EngagementLevel": pred,
-        "Feedback": feedback,
-        "TopFeatures": [f[0] for f in top_feats],
-        "Severities": severities
+        **current_bundle().info(),
+        "reload": reload_stats,
+        "feedback_attribution": FEEDBACK_ATTRIBUTION,
+        "attribution_method": ATTRIBUTION_METHODS.get(FEEDBACK_ATTRIBUTION),
+        "attribution_cache": attribution_cache.stats()
     })
 
 # ---------------------- /csv route ----------------------
-@prediction_bp.route('/csv', methods=['POST'])
-def csv_predict():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    username = verify_token(token)
-    if not username:
-        return jsonify({"error": "Unauthorized"}), 401
+def stored_row_hashes(username, hashes):
+    stored = set()
+    for query in stored_hash_queries(username, hashes):
+        stored.update(doc["row_hash"] for doc in predictions_collection.find(query, {"_id": 0, "row_hash": 1}))
+    return stored
+
+def stored_row_ids(username, hashes):
+    """{row hash: _id} of the hashes already stored."""
+    stored = {}
+    for query in stored_hash_queries(username, hashes):
+        stored.update((doc["row_hash"], doc["_id"]) for doc in predictions_collection.find(query, {"row_hash": 1}))
+    return stored
+
+def score_frame(df, username, bundle=None):
+    """Score one block of CSV rows, store the predictions and return (records, rejected, duplicate rows).
+
+    Rows already stored, or repeated within the block, are dropped before scoring.
+    """
+    hashes, duplicates = None, 0
+    if UPLOAD_DEDUP:
+        # Hash the readings as uploaded, before missing values are filled in
+        with timed('dedupe'):
+            hashes = row_hashes(df, expected_columns)
+            repeated = duplicate_mask(hashes, stored_row_hashes(username, hashes))
+        if repeated.any():
+            df, hashes = df[~repeated], hashes[~repeated]
+            duplicates = int(repeated.sum())
+
+    docs, records, rejected = score_rows(df, username, bundle or current_bundle(), hashes)
+    if docs:
+        with timed('insert'):
+            new = save_predictions(docs)
+        # Rows another upload stored in the meantime are caught by the unique index
+        if new is not None:
+            duplicates += len(docs) - new
+    upload_cache.count_rows(duplicates)
+    return records, rejected, duplicates
+
+def stream_scored_chunks(chunks, username, bundle):
+    # One JSON object per line: result rows, rejected rows (they carry
+    # "errors"), then a closing summary line
+    accepted = rejected_count = duplicates = 0
+    chunks = iter(chunks)
+    while True:
+        # Later chunks are parsed as the body streams
+        with timed('parse'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        records, rejected, chunk_duplicates = score_frame(chunk, username, bundle)
+        accepted += len(records)
+        rejected_count += len(rejected)
+        duplicates += chunk_duplicates
+        with timed('serialize'):
+            lines = [current_app.json.dumps(item) for item in rejected + records]
+        if lines:
+            yield "\n".join(lines) + "\n"
+    yield current_app.json.dumps({"summary": {
+        "accepted": accepted, "rejected": rejected_count, "duplicate_rows": duplicates
+    }}) + "\n"
+
+def wants_stream():
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
 
-    if 'file' not in request.files:
+@prediction_bp.route('/csv', methods=['POST'])
+@require_auth
+def csv_predict(username):
+    # The multipart body is parsed on first access
+    with timed('upload'):
+        files = request.files
+    if 'file' not in files:
         return jsonify({"error": "CSV file is missing"}), 400
 
-    file = request.files['file']
-    df = pd.read_csv(file)
-
+    file = files['file']
     required_columns = expected_columns + ['student_id']
-    if not all(col in df.columns for col in required_columns):
-        return jsonify({"error": f"CSV must contain columns: {required_columns}"}), 400
 
-    # Fill missing values with column means
-    for col in expected_columns:
-        df[col] = df[col].fillna(column_means[col])
+    if wants_stream():
+        # Flask closes request.files as soon as the view returns, before the
+        # body is streamed, so read from a private (disk-spooled) copy
+        upload = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        shutil.copyfileobj(file.stream, upload)
+        upload.seek(0)
 
-    df_model = df[expected_columns]
-    preds = predict_df(df_model)
-    df['PredictedEngagementLevel'] = preds.astype(int)
+        # Read and score the upload CSV_CHUNK_SIZE rows at a time so memory
+        # stays flat and the first results go out before the file is done
+        with timed('parse'):
+            try:
+                reader = pd.read_csv(upload, chunksize=CSV_CHUNK_SIZE)
+                first = next(reader, None)
+            except pd.errors.EmptyDataError:
+                first = None
+        if first is None or not all(col in first.columns for col in required_columns):
+            upload.close()
+            return jsonify({"error": f"CSV must contain columns: {required_columns}"}), 400
+
+        chunks = itertools.chain([first], reader)
+        response = Response(
+            # Score every chunk with the same model, even if a reload lands mid-upload
+            stream_with_context(stream_scored_chunks(chunks, username, current_bundle())),
+            mimetype='application/x-ndjson'
+        )
+        response.call_on_close(upload.close)
+        return response
+
+    # Negotiate before scoring so an unsupported format stores nothing
+    fmt, error = response_format()
+    if error:
+        return error
+
+    bundle = current_bundle()
+    file_hash = None
+    if UPLOAD_DEDUP:
+        with timed('hash'):
+            file_hash = file_digest(file.stream)
+        with timed('upload_cache'):
+            cached = upload_cache.get(username, file_hash, bundle.version)
+        if cached is not None:
+            # This file was scored and stored before: answer without scoring or inserting
+            rows = len(cached["results"])
+            upload_cache.count_rows(rows)
+            return encoded_response({**cached, "duplicates": {"file": True, "rows": rows}}, fmt, 'results')
+
+    with timed('parse'):
+        df = pd.read_csv(file)
+    if not all(col in df.columns for col in required_columns):
+        return jsonify({"error": f"CSV must contain columns: {required_columns}"}), 400
 
-    records = []
-    for idx, row in df.iterrows():
-        student_id = row['student_id']
-        input_row = row[expected_columns].to_dict()
+    records, rejected, duplicates = score_frame(df, username, bundle)
+    if not records and not duplicates:
+        return jsonify({
+            "error": "All valid rows were skipped due to out-of-range values.",
+            "rejected": rejected
+        }), 400
+
+    body = {"results": records, "rejected": rejected}
+    if file_hash is not None:
+        with timed('upload_cache'):
+            upload_cache.put(username, file_hash, bundle.version, body, current_app.json.dumps)
+    return encoded_response({**body, "duplicates": {"file": False, "rows": duplicates}}, fmt, 'results')
+
+# ---------------------- /jobs routes ----------------------
+# Large uploads can be scored as background jobs: the file is saved under
+# JOBS_DIR and a pool of JOB_WORKERS threads per process scores it
+# JOB_CHUNK_ROWS rows at a time, checkpointing after every chunk so a job
+# interrupted by a restart resumes where it stopped. JOB_WORKERS=0 leaves
+# the jobs to `python jobs.py` workers sharing the same directory.
+JOBS_DIR = os.getenv("JOBS_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs')
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 1))
+JOB_CHUNK_ROWS = int(os.getenv("JOB_CHUNK_ROWS", 10000))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 1))
+# Finished jobs (upload and results) are deleted after this long
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", 86400))
+# A job hitting a Mongo or disk error waits JOB_RETRY_SECONDS (doubling each
+# time) and resumes from its checkpoint; it fails after JOB_MAX_ATTEMPTS tries
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+JOB_RETRY_SECONDS = float(os.getenv("JOB_RETRY_SECONDS", 30))
+
+job_store = JobStore(JOBS_DIR)
+job_runner = None
+
+def score_job_rows(df, username, ids):
+    """score_rows for one job chunk, giving each document its _id from ids (same index as df).
+
+    Returns (docs, records, rejected, duplicate rows). Like /csv, rows
+    stored by another upload or repeated in the chunk are dropped before
+    scoring. Rows stored under their own _id came from an earlier attempt at
+    this chunk: they are scored again, so the redone chunk pages the same
+    results, and their insert is skipped as already stored.
+    """
+    hashes, duplicates = None, 0
+    if UPLOAD_DEDUP:
+        hashes = row_hashes(df, expected_columns)
+        stored_ids = hashes.map(stored_row_ids(username, hashes))
+        elsewhere = stored_ids.notna() & (stored_ids != ids)
+        repeated = (hashes.notna() & (elsewhere | hashes.duplicated())).to_numpy()
+        if repeated.any():
+            df, hashes, ids = df[~repeated], hashes[~repeated], ids[~repeated]
+            duplicates = int(repeated.sum())
+
+    docs, records, rejected = score_rows(df, username, current_bundle(), hashes)
+    rejected_rows = {item["row"] for item in rejected}
+    for doc, row_id in zip(docs, [row_id for row, row_id in ids.items() if row not in rejected_rows]):
+        doc["_id"] = row_id
+    return docs, records, rejected, duplicates
+
+def store_job_documents(docs):
+    """Insert scored job rows, skipping any a resumed chunk already stored; returns how many were new."""
+    new = 0
+    for start in range(0, len(docs), INSERT_BATCH_SIZE):
+        inserted = insert_ignoring_duplicates(predictions_collection, docs[start:start + INSERT_BATCH_SIZE])
+        update_rollups(inserted)
+        new += len(inserted)
+    return new
+
+def start_job_runner(workers):
+    global job_runner
+    job_runner = JobRunner(
+        job_store, score_job_rows, store_job_documents, workers, JOB_CHUNK_ROWS, JOB_POLL_SECONDS,
+        JOB_RETENTION_SECONDS, required_columns=expected_columns + ['student_id'],
+        retryable=(PyMongoError, OSError), max_attempts=JOB_MAX_ATTEMPTS, retry_seconds=JOB_RETRY_SECONDS
+    )
+    atexit.register(job_runner.stop, 5)
+    return job_runner
+
+if JOB_WORKERS > 0:
+    start_job_runner(JOB_WORKERS)
+
+def job_body(state):
+    total = state["total_rows"]
+    return {
+        **{key: value for key, value in state.items() if key != "username"},
+        "progress": state["rows_done"] / total if total else (1.0 if state["status"] == 'done' else 0.0),
+        "status_url": f"{request.script_root}/api/predict/jobs/{state['id']}",
+        "results_url": f"{request.script_root}/api/predict/jobs/{state['id']}/results",
+    }
 
-        range_errors = validate_ranges(input_row)
-        if range_errors:
-            continue  # Skip if out of range
+def owned_job(username, job_id):
+    state = job_store.load(job_id)
+    if state is None or state["username"] != username:
+        return None
+    return state
 
-        level = int(row['PredictedEngagementLevel'])
-        feedback, top_feats, severities = generate_feedback(level, input_row)
+@prediction_bp.route('/jobs', methods=['POST'])
+@require_auth
+def create_job(username):
+    if 'file' not in request.files:
+        return jsonify({"error": "CSV file is missing"}), 400
+    file = request.files['file']
 
-        timestamp = row.get('timestamp')
-        if pd.isna(timestamp) or not isinstance(timestamp, str) or timestamp.strip() == "":
-            timestamp = pd.Timestamp.now()
-        else:
-            try:
-                timestamp = pd.to_datetime(timestamp)
-            except Exception:
-                timestamp = pd.Timestamp.now()
-
-        doc = {
-            "username": username,
-            "student_id": student_id,
-            "input_data": input_row,
-            "predicted_engagement_level": level,
-            "feedback": feedback,
-            "top_features": [f[0] for f in top_feats],
-            "severities": severities,
-            "timestamp": timestamp.to_pydatetime() if hasattr(timestamp, "to_pydatetime") else timestamp
-        }
-        predictions_collection.insert_one(doc)
-
-        result = {
-            "student_id": student_id,
-            **input_row,
-            "PredictedEngagementLevel": level,
-            "Feedback": feedback,
-            "TopFeatures": [f[0] for f in top_feats],
-            "Severities": severities,
-            "timestamp": str(timestamp)
-        }
-        records.append(result)
-
-    if not records:
-        return jsonify({"error": "All valid rows were skipped due to out-of-range values."}), 400
-
-    return jsonify(records)
+    # Only the header is checked here; bad rows are reported per chunk
+    required_columns = expected_columns + ['student_id']
+    try:
+        columns = pd.read_csv(file.stream, nrows=0).columns
+    except (ValueError, pd.errors.ParserError):
+        columns = []
+    if not all(col in columns for col in required_columns):
+        return jsonify({"error": f"CSV must contain columns: {required_columns}"}), 400
+    file.stream.seek(0)
+
+    state = job_store.create(username, file.stream, file.filename)
+    if job_runner is not None:
+        job_runner.notify()
+    return jsonify(job_body(state)), 202
+
+@prediction_bp.route('/jobs', methods=['GET'])
+@require_auth
+def list_jobs(username):
+    return jsonify([job_body(state) for state in job_store.jobs(username)])
+
+@prediction_bp.route('/jobs/<string:job_id>', methods=['GET'])
+@require_auth
+def job_status(username, job_id):
+    state = owned_job(username, job_id)
+    if state is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_body(state))
+
+@prediction_bp.route('/jobs/<string:job_id>/results', methods=['GET'])
+@require_auth
+def job_results(username, job_id):
+    state = owned_job(username, job_id)
+    if state is None:
+        return jsonify({"error": "Job not found"}), 404
+    fmt, error = response_format()
+    if error:
+        return error
+    try:
+        page = int(request.args.get('page', 0))
+    except ValueError:
+        return jsonify({"error": "page must be an integer"}), 400
+    if page < 0:
+        return jsonify({"error": "page must be an integer"}), 400
+
+    # Pages are written as chunks finish, so early pages are ready mid-job
+    body = job_store.read_page(job_id, page) if page < state["pages"] else None
+    if body is None:
+        if state["status"] in ('queued', 'running'):
+            return jsonify({"error": "Page not ready yet", "status": state["status"], "pages": state["pages"]}), 404
+        return jsonify({"error": "Page not found", "pages": state["pages"]}), 404
+    body["pages"] = state["pages"]
+    body["status"] = state["status"]
+    response = encoded_response(body, fmt, 'results')
+    if page + 1 < state["pages"]:
+        response.headers['X-Next-Page'] = str(page + 1)
+    return response
+
+@prediction_bp.route('/jobs/<string:job_id>', methods=['DELETE'])
+@require_auth
+def delete_job(username, job_id):
+    state = owned_job(username, job_id)
+    if state is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    claim = job_store.claim(job_id)
+    if claim is None:
+        # A worker holds it; it stops before the next chunk
+        job_store.request_cancel(job_id)
+        return jsonify({"message": "Job cancellation requested"}), 202
+    try:
+        # Removed while still claimed, so no worker starts it in between
+        job_store.remove(job_id)
+    finally:
+        job_store.release(claim)
+    return jsonify({"message": "Job deleted"})
+
+@prediction_bp.route('/jobs/<string:job_id>/retry', methods=['POST'])
+@require_auth
+def retry_job(username, job_id):
+    """Requeue a failed job; it resumes after the last chunk it stored."""
+    state = owned_job(username, job_id)
+    if state is None:
+        return jsonify({"error": "Job not found"}), 404
+    if state["status"] != 'failed':
+        return jsonify({"error": "Only failed jobs can be retried", "status": state["status"]}), 409
+    state = job_store.requeue(job_id)
+    if state is None:
+        return jsonify({"error": "Job is being changed by a worker; try again"}), 409
+    if job_runner is not None:
+        job_runner.notify()
+    return jsonify(job_body(state)), 202
 
 
 
 # ---------------------- /history route ----------------------
-@prediction_bp.route('/history', methods=['GET'])
-def prediction_history():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    username = verify_token(token)
-    if not username:
-        return jsonify({"error": "Unauthorized"}), 401
-
-    user_preds = list(predictions_collection.find({"username": username}).sort("timestamp", -1).limit(50))
-    for pred in user_preds:
-        pred['_id'] = str(pred['_id'])
-        pred['timestamp'] = pred['timestamp'].isoformat()
+def history_page(query, default_limit, default_order):
+    """One keyset page of predictions matching query, in the negotiated format.
+
+    Pages are ordered by (timestamp, _id), which the indexes from
+    db.ensure_indexes cover, so each page is an index range scan however deep
+    it is. The cursor for the next page comes back in X-Next-Cursor.
+    """
+    fmt, error = response_format()
+    if error:
+        return error
+    find, error = history_find(request.args, query, default_limit, default_order)
+    if error:
+        return jsonify({"error": error}), 400
+
+    docs, next_cursor = history_result(list(predictions_collection.find(**find)), find)
+    response = encoded_response(docs, fmt)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
 
-    return jsonify(user_preds)
+@prediction_bp.route('/history', methods=['GET'])
+@require_auth
+def prediction_history(username):
+    return history_page({"username": username}, HISTORY_PAGE_SIZE, 'desc')
 
 @prediction_bp.route('/history/<string:history_id>', methods=['DELETE'])
-def delete_history_item(history_id):
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    username = verify_token(token)
-    if not username:
-        return jsonify({"error": "Unauthorized"}), 401
-
+@require_auth
+def delete_history_item(username, history_id):
     # Try to delete the history item if it belongs to the user
-    result = predictions_collection.delete_one({
+    deleted = predictions_collection.find_one_and_delete({
         "_id": ObjectId(history_id),
         "username": username
     })
 
-    if result.deleted_count == 1:
+    if deleted is not None:
+        update_rollups([deleted], sign=-1)
+        # A cached upload would claim the deleted row is still stored
+        upload_cache.forget(username)
         return jsonify({"message": "History item deleted successfully"})
     else:
         return jsonify({"error": "History item not found or not authorized"}), 404
     
 
 @prediction_bp.route('/history/student/<string:student_id>', methods=['GET'])
-def get_history_by_student(student_id):
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    username = verify_token(token)
+@require_auth
+def get_history_by_student(username, student_id):
+    return history_page({"username": username, "student_id": student_id_match([student_id])},
+                        STUDENT_HISTORY_PAGE_SIZE, 'asc')
+
+# ---------------------- /summary route ----------------------
+@prediction_bp.route('/summary/<string:student_id>', methods=['GET'])
+@require_auth
+def student_summary(username, student_id):
+    """Per-day engagement for one student from the rollups (?from=, ?to= as YYYY-MM-DD)."""
+    query, error = summary_query(request.args, username, student_id)
+    if error:
+        return jsonify({"error": error}), 400
+    rollups = list(rollups_collection.find(query, {"_id": 0}).sort("day", 1))
+    return jsonify(summary_body(student_id, rollups))
+
+# ---------------------- /trend route ----------------------
+@prediction_bp.route('/trend', methods=['GET'])
+@require_auth
+def student_trends(username):
+    """Rolling engagement and sensor means per student, downsampled with LTTB.
+
+    ?student_id= (repeat or comma-separate; all students if omitted),
+    ?from= / ?to= ISO timestamps, ?window= pandas offset (default 15min),
+    ?points= series length per student (default 300).
+    """
+    query, window, points, error = trend_query(request.args, username)
+    if error:
+        return jsonify({"error": error}), 400
+    docs = list(predictions_collection.find(query, trend_projection).sort("timestamp", 1).limit(TREND_MAX_DOCS + 1))
+    if len(docs) > TREND_MAX_DOCS:
+        return jsonify({"error": trend_too_large()}), 400
+    return jsonify(trend_body(docs, window, points))
+
+
+# ---------------------- /export route ----------------------
+@prediction_bp.route('/export', methods=['GET'])
+@require_auth
+def export_predictions(username):
+    """Every matching prediction as a CSV or Parquet download, streamed as it is read.
+
+    The cursor is walked EXPORT_BATCH_SIZE documents at a time in
+    (timestamp, _id) order, which the history indexes cover, so memory stays
+    flat however many predictions there are and the download starts at once.
+    """
+    fmt = request.args.get('format', 'csv')
+    formats = available_export_formats()
+    if fmt not in formats:
+        if fmt in EXPORT_FORMATS:
+            return jsonify({"error": "Parquet exports need the pyarrow package"}), 406
+        return jsonify({"error": f"format must be one of {formats}"}), 400
+
+    query = {"username": username}
+    student_ids = [sid for arg in request.args.getlist('student_id') for sid in arg.split(',') if sid]
+    if student_ids:
+        query["student_id"] = student_id_match(student_ids)
+    time_range, error = timestamp_range(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    if time_range:
+        query["timestamp"] = time_range
+
+    cursor = predictions_collection.find(
+        query, export_projection, sort=[("timestamp", 1), ("_id", 1)], batch_size=EXPORT_BATCH_SIZE
+    )
+    chunks, mimetype = EXPORT_FORMATS[fmt]
+    response = Response(stream_with_context(chunks(cursor, EXPORT_BATCH_SIZE)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="predictions.{fmt}"'
+    response.call_on_close(cursor.close)
+    return response
+
+# ---------------------- /stream routes ----------------------
+# Live samples are scored every STREAM_BATCH_MS; each active student keeps
+# its last STREAM_RING_SIZE scored samples, for up to STREAM_MAX_STUDENTS
+STREAM_BATCH_MS = float(os.getenv("STREAM_BATCH_MS", 250))
+STREAM_RING_SIZE = int(os.getenv("STREAM_RING_SIZE", 256))
+STREAM_MAX_STUDENTS = int(os.getenv("STREAM_MAX_STUDENTS", 2000))
+STREAM_IDLE_SECONDS = float(os.getenv("STREAM_IDLE_SECONDS", 600))
+STREAM_KEEPALIVE_SECONDS = 15.0
+# Set by serve.py to its number of worker processes. The hub lives in one
+# process, so with several workers an ingest and a subscriber would usually
+# land on different hubs and never see each other
+STREAM_SERVER_PROCESSES = int(os.getenv("SERVE_WORKER_PROCESSES", 1))
+# Lines of an ingest body handed to the hub at a time
+STREAM_INGEST_BATCH = 64
+stream_fields = ['student_id', 'timestamp'] + expected_columns
+
+_stream_hub = None
+_stream_hub_lock = threading.Lock()
+
+def score_stream_samples(username, samples):
+    df = pd.DataFrame(samples, columns=stream_fields)
+    df['timestamp'] = df['timestamp'].astype('string')
+    return score_frame(df, username, current_bundle())[:2]
+
+def single_process(view):
+    """Answer 503 instead of running a live-stream view when serve.py runs several workers."""
+    @functools.wraps(view)
+    def wrapped(*args, **kwargs):
+        if STREAM_SERVER_PROCESSES > 1:
+            return jsonify({"error": "Live streaming needs a single server process (serve.py --workers 1)"}), 503
+        return view(*args, **kwargs)
+    return wrapped
+
+def stream_hub():
+    global _stream_hub
+    if _stream_hub is None:
+        with _stream_hub_lock:
+            if _stream_hub is None:
+                _stream_hub = StreamHub(score_stream_samples, STREAM_RING_SIZE, STREAM_BATCH_MS,
+                                        max_students=STREAM_MAX_STUDENTS, idle_seconds=STREAM_IDLE_SECONDS)
+    return _stream_hub
+
+def parse_sample(line):
+    sample = json.loads(line)
+    if not isinstance(sample, dict) or not sample.get('student_id'):
+        raise ValueError("sample needs a student_id")
+    for col in expected_columns:
+        value = sample.get(col)
+        if value is not None and not isinstance(value, (int, float)):
+            raise ValueError(f"{col} must be a number")
+    return sample
+
+@prediction_bp.route('/stream/ingest', methods=['POST'])
+@single_process
+@require_auth
+def stream_ingest(username):
+    """Accept NDJSON samples, one per line, for as long as the client keeps sending.
+
+    Missing sensors are filled like /csv does. The body may be a long-lived
+    chunked upload; samples are queued every STREAM_INGEST_BATCH lines.
+    """
+    hub = stream_hub()
+    accepted = invalid = 0
+    batch = []
+    for line in request.stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            batch.append(parse_sample(line))
+        except ValueError:
+            invalid += 1
+            continue
+        if len(batch) >= STREAM_INGEST_BATCH:
+            accepted += hub.ingest(username, batch)
+            batch = []
+    if batch:
+        accepted += hub.ingest(username, batch)
+    return jsonify({"accepted": accepted, "invalid": invalid})
+
+@prediction_bp.route('/stream/updates', methods=['GET'])
+@single_process
+def stream_updates():
+    """Server-sent events with every scored sample of this user's students.
+
+    EventSource cannot set headers, so the token may also be passed as ?token=.
+    """
+    username = verify_token(bearer_token() or request.args.get('token', ''))
     if not username:
         return jsonify({"error": "Unauthorized"}), 401
 
-    history = list(predictions_collection.find({
-        "username": username,
-        "student_id": student_id
-    }))
-
-    for item in history:
-        item["_id"] = str(item["_id"])  # Convert ObjectId for JSON
-        item["timestamp"] = item.get("timestamp").isoformat()
-
-    return jsonify(history), 200
\ No newline at end of file
+    student_ids = [sid for arg in request.args.getlist('student_id') for sid in arg.split(',') if sid]
+    hub = stream_hub()
+    subscription = hub.subscribe(username, student_ids)
+
+    def events():
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    update = subscription.queue.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(update)}\n\n"
+        finally:
+            hub.unsubscribe(subscription)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@prediction_bp.route('/stream/students/<string:student_id>', methods=['GET'])
+@single_process
+@require_auth
+def stream_snapshot(username, student_id):
+    snapshot = stream_hub().snapshot(username, student_id)
+    if snapshot is None:
+        return jsonify({"error": "No live data for this student"}), 404
+    return jsonify(snapshot)
+
+@prediction_bp.route('/stream/stats', methods=['GET'])
+@single_process
+@require_auth
+def stream_stats(username):
+    return jsonify(stream_hub().stats())
@@ -0,0 +1,146 @@
+import argparse
+import math
+import os
+from pymongo.errors import DuplicateKeyError
+
+FEATURES = ['HeartRate', 'SkinConductance', 'EEG']
+# Also break each day down by hour (counts and levels only)
+ROLLUP_HOURLY = os.getenv("ROLLUP_HOURLY", "1") == "1"
+
+
+# Dotted field names, built once instead of per document
+_SUM_FIELDS = [(col, f'sum.{col}', f'sumsq.{col}') for col in FEATURES]
+_LEVEL_FIELDS = {}
+_HOUR_FIELDS = {}
+_SEVERITY_FIELDS = {}
+
+
+def rollup_increments(docs, sign=1):
+    """{(username, student_id, day): {dotted field: increment}} for prediction documents."""
+    increments = {}
+    for doc in docs:
+        ts = doc['timestamp']
+        key = (doc['username'], doc['student_id'], ts.date().isoformat())
+        inc = increments.get(key)
+        if inc is None:
+            inc = increments[key] = {}
+
+        level = doc['predicted_engagement_level']
+        fields = _LEVEL_FIELDS.get(level) or _LEVEL_FIELDS.setdefault(level, ('count', f'levels.{level}'))
+        if ROLLUP_HOURLY:
+            hour_key = (ts.hour, level)
+            fields += _HOUR_FIELDS.get(hour_key) or _HOUR_FIELDS.setdefault(
+                hour_key, (f'hours.{ts.hour:02d}.count', f'hours.{ts.hour:02d}.levels.{level}'))
+        for grade_key in (doc.get('severities') or {}).items():
+            fields += (_SEVERITY_FIELDS.get(grade_key)
+                       or _SEVERITY_FIELDS.setdefault(grade_key, ('severity.{}.{}'.format(*grade_key),)))
+        for field in fields:
+            inc[field] = inc.get(field, 0) + sign
+
+        input_data = doc['input_data']
+        for col, sum_field, sumsq_field in _SUM_FIELDS:
+            value = input_data[col]
+            inc[sum_field] = inc.get(sum_field, 0) + sign * value
+            inc[sumsq_field] = inc.get(sumsq_field, 0) + sign * value * value
+    return increments
+
+
+def apply_rollups(collection, docs, sign=1):
+    """Fold prediction documents into the daily rollups with one upserting $inc per day.
+
+    An upload touches one rollup per (student, day), however many rows it
+    has. Pass sign=-1 to take deleted predictions back out.
+    """
+    for (username, student_id, day), inc in rollup_increments(docs, sign).items():
+        key = {"username": username, "student_id": student_id, "day": day}
+        try:
+            collection.update_one(key, {"$inc": inc}, upsert=True)
+        except DuplicateKeyError:
+            # Another writer created this day's rollup first; now it exists
+            collection.update_one(key, {"$inc": inc})
+
+
+async def apply_rollups_async(collection, docs, sign=1):
+    """apply_rollups for an async (AsyncMongoClient) collection."""
+    for (username, student_id, day), inc in rollup_increments(docs, sign).items():
+        key = {"username": username, "student_id": student_id, "day": day}
+        try:
+            await collection.update_one(key, {"$inc": inc}, upsert=True)
+        except DuplicateKeyError:
+            await collection.update_one(key, {"$inc": inc})
+
+
+def summarize_day(rollup):
+    """Counts, means and standard deviations for one rollup document."""
+    count = rollup.get('count', 0)
+    summary = {
+        "day": rollup['day'],
+        "count": count,
+        "levels": {str(level): rollup.get('levels', {}).get(str(level), 0) for level in range(3)},
+        "mean": {},
+        "std": {},
+        "severity": rollup.get('severity', {}),
+    }
+    for col in FEATURES:
+        if count:
+            mean = rollup['sum'][col] / count
+            variance = max(rollup['sumsq'][col] / count - mean * mean, 0.0)
+            summary["mean"][col] = mean
+            summary["std"][col] = math.sqrt(variance)
+    if 'hours' in rollup:
+        summary["hours"] = rollup['hours']
+    return summary
+
+
+def merge_days(rollups):
+    """One rollup-shaped document adding up several days."""
+    total = {"day": None, "count": 0, "levels": {}, "sum": {}, "sumsq": {}, "severity": {}}
+    for rollup in rollups:
+        total["count"] += rollup.get('count', 0)
+        for field in ('levels', 'sum', 'sumsq'):
+            for key, value in rollup.get(field, {}).items():
+                total[field][key] = total[field].get(key, 0) + value
+        for col, grades in rollup.get('severity', {}).items():
+            tallies = total["severity"].setdefault(col, {})
+            for grade, n in grades.items():
+                tallies[grade] = tallies.get(grade, 0) + n
+        for hour, tally in rollup.get('hours', {}).items():
+            merged = total.setdefault("hours", {}).setdefault(hour, {"count": 0, "levels": {}})
+            merged["count"] += tally.get('count', 0)
+            for level, n in tally.get('levels', {}).items():
+                merged["levels"][level] = merged["levels"].get(level, 0) + n
+    return total
+
+
+def rebuild(predictions, rollups, username=None, batch_size=10_000):
+    """Recompute rollups from stored predictions (all users, or one).
+
+    Predictions written while this runs may be counted twice or not at all;
+    run it while uploads are paused.
+    """
+    scope = {"username": username} if username else {}
+    rollups.delete_many(scope)
+    projection = {"username": 1, "student_id": 1, "timestamp": 1, "predicted_engagement_level": 1,
+                  "input_data": 1, "severities": 1, "_id": 0}
+    batch, total = [], 0
+    for doc in predictions.find(scope, projection).batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            apply_rollups(rollups, batch)
+            total += len(batch)
+            batch = []
+    apply_rollups(rollups, batch)
+    return total + len(batch)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Maintain the per-student daily engagement rollups")
+    sub = parser.add_subparsers(dest='command', required=True)
+    rebuild_parser = sub.add_parser('rebuild', help="Backfill rollups from prediction history")
+    rebuild_parser.add_argument('--username', help="Only rebuild this user's rollups")
+    args = parser.parse_args()
+
+    from db import ensure_indexes, predictions_collection, rollups_collection
+    ensure_indexes()
+    n = rebuild(predictions_collection, rollups_collection, args.username)
+    print(f"✅ Rebuilt rollups from {n:,} predictions")
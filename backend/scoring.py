@@ -0,0 +1,488 @@
+# Validation, scoring and response shaping shared by the sync (prediction.py)
+# and async (async_prediction.py) blueprints. Nothing here touches Mongo or
+# starts threads, so the async app can import it without the sync client.
+import base64
+import datetime
+import itertools
+import os
+import random
+import numpy as np
+import pandas as pd
+from bson.objectid import ObjectId
+from artifacts import current_bundle
+from explain import FEEDBACK_ATTRIBUTION, top_causes_batch
+from metrics import timed
+from rollups import merge_days, summarize_day
+from trend import student_trend, trend_frames
+
+expected_columns = ['HeartRate', 'SkinConductance', 'EEG']
+
+feedback_templates = {
+    0: [
+        "Your focus seems low. Consider improving {cause1} and monitoring your {cause2}.",
+        "Low engagement was detected. Try managing your {cause1} and {cause2}.",
+        "You can increase focus by enhancing your {cause1} and stabilizing {cause2}."
+    ],
+    1: [
+        "Moderate focus detected. Improving your {cause1} may boost engagement.",
+        "You're doing okay. For better focus, monitor {cause1} and {cause2}.",
+        "To reach high engagement, fine-tune your {cause1} and control {cause2}."
+    ],
+    2: [
+        "Excellent engagement! Keep maintaining your {cause1} and {cause2}.",
+        "Great job! Your {cause1} levels indicate strong focus.",
+        "You're highly engaged. Keep it up by balancing your {cause2}."
+    ]
+}
+
+# Allowed sensor ranges, checked in this order
+valid_ranges = {
+    # HRV: 20 - 100 ms (based on real-world HRV values)
+    'HeartRate': (20, 100, "HRV must be between 20 and 100 ms."),
+    # EEG Alpha: 1 - 20 Hz (realistic range from dataset and EEG norms)
+    'EEG': (1, 20, "EEG Alpha Waves must be between 1 and 20 Hz."),
+    # GSR: 0.01 - 20 µS (based on typical GSR range)
+    'SkinConductance': (0.01, 20, "GSR must be between 0.01 and 20 µS."),
+}
+
+def grade_severity(value, mean):
+    deviation = abs(value - mean)
+    if deviation < 0.5:
+        return 'normal'
+    elif deviation < 1.5:
+        return 'mild'
+    else:
+        return 'severe'
+    
+def validate_ranges(input_data):
+    errors = []
+    for col, (low, high, message) in valid_ranges.items():
+        if not (low <= input_data[col] <= high):
+            errors.append(message)
+    return errors
+
+def validate_ranges_df(df):
+    # Boolean mask per feature column, True where the row is out of range
+    return {
+        col: ~df[col].between(low, high).to_numpy()
+        for col, (low, high, _) in valid_ranges.items()
+    }
+
+def grade_severity_array(values, mean):
+    deviation = np.abs(np.asarray(values, dtype=float) - mean)
+    return np.select([deviation < 0.5, deviation < 1.5], ['normal', 'mild'], default='severe')
+
+def generate_feedback(level, features, bundle=None, top_features=None):
+    bundle = bundle or current_bundle()
+    if top_features is None:
+        top_features = bundle.top_causes.get(int(level), [])
+    cause1, cause2 = [f[0] for f in top_features]
+    template = random.choice(feedback_templates[int(level)])
+    feedback = template.format(cause1=cause1, cause2=cause2)
+
+    severities = {
+        feat: grade_severity(features[feat], bundle.column_means[feat]) for feat in expected_columns
+    }
+
+    return feedback, top_features, severities
+
+def generate_feedback_batch(levels, df, bundle=None, top_features=None):
+    # top_features: per-row (feature, weight) pairs; defaults to the level's SHAP summary
+    bundle = bundle or current_bundle()
+    levels = np.asarray(levels, dtype=int)
+    picks = np.random.randint(0, len(feedback_templates[0]), size=len(levels))
+
+    if top_features is None:
+        # Fill each level's templates once, then pick one per row
+        top_names = {level: [f[0] for f in causes] for level, causes in bundle.top_causes.items()}
+        feedback_table = np.array([
+            [template.format(cause1=top_names[level][0], cause2=top_names[level][1]) for template in templates]
+            for level, templates in sorted(feedback_templates.items())
+        ], dtype=object)
+        feedback = feedback_table[levels, picks].tolist()
+        top_features = [top_names[level] for level in levels.tolist()]
+    else:
+        feedback = [
+            feedback_templates[level][pick].format(cause1=causes[0][0], cause2=causes[1][0])
+            for level, pick, causes in zip(levels.tolist(), picks.tolist(), top_features)
+        ]
+        top_features = [[f[0] for f in causes] for causes in top_features]
+
+    severity_cols = [
+        grade_severity_array(df[feat], bundle.column_means[feat]).tolist() for feat in expected_columns
+    ]
+    severities = [dict(zip(expected_columns, row)) for row in zip(*severity_cols)]
+
+    return feedback, top_features, severities
+
+def _to_datetime(raw, **kwargs):
+    try:
+        return pd.to_datetime(raw, errors='coerce', **kwargs)
+    except ValueError:
+        # Rows carry different UTC offsets: compare them in UTC, as MongoDB stores them
+        return pd.to_datetime(raw, errors='coerce', format='mixed', utc=True)
+
+def parse_timestamps(df):
+    """Each row's timestamp; blank or unparseable ones become the current time."""
+    if 'timestamp' not in df.columns or not pd.api.types.is_string_dtype(df['timestamp']):
+        return pd.Series(pd.Timestamp.now(), index=df.index)
+
+    raw = df['timestamp'].str.strip().replace('', np.nan)
+    parsed = _to_datetime(raw)
+    # Rows that don't match the inferred format: parse value by value
+    if (parsed.isna() & raw.notna()).any():
+        parsed = _to_datetime(raw, format='mixed')
+    # A naive "now" would turn a timezone-aware column into objects
+    return parsed.fillna(pd.Timestamp.now(tz=parsed.dt.tz))
+
+def predict_array(X, bundle=None):
+    # Rows in expected_columns order; NaNs are filled with column means
+    bundle = bundle or current_bundle()
+    X = np.array(X, dtype=float, ndmin=2)
+    missing = np.isnan(X)
+    if missing.any():
+        X = np.where(missing, bundle.mean_vector, X)
+    return bundle.predict(X)
+
+def predict_with_leaves_rows(X, bundle):
+    """Per-row (level, leaves) for the /manual micro-batcher; leaves is a
+    one-row slice, or None when the bundle predicted without traversing."""
+    levels, leaves = bundle.predict_with_leaves(X)
+    if leaves is None:
+        return [(level, None) for level in levels]
+    return [(level, leaves[i:i + 1]) for i, level in enumerate(levels)]
+
+def predict_df(df, bundle=None):
+    return predict_array(df[expected_columns].to_numpy(dtype=float), bundle)
+
+# ---------------------- /manual ----------------------
+def check_manual_input(input_data):
+    """(student_id, readings by feature, error message or None) for a /manual body."""
+    student_id = input_data.get("student_id")
+    if not student_id:
+        return None, None, "Missing student_id"
+
+    for col in expected_columns:
+        if col not in input_data:
+            return None, None, f"Missing column: {col}"
+
+    data_for_model = {col: input_data[col] for col in expected_columns}
+    range_errors = validate_ranges(data_for_model)
+    if range_errors:
+        return None, None, " | ".join(range_errors)
+    return student_id, data_for_model, None
+
+def score_manual(username, student_id, data_for_model, bundle, batcher=None):
+    """Predict one reading; returns the document to store and the response body.
+
+    batcher (a batcher.MicroBatcher over predict_with_leaves_rows) coalesces
+    the prediction with concurrent requests scored by the same bundle.
+    """
+    row = [data_for_model[col] for col in expected_columns]
+    leaves = None
+    with timed('predict'):
+        if batcher is not None:
+            level, leaves = batcher.submit(row, bundle)
+            pred = int(level)
+        elif FEEDBACK_ATTRIBUTION == 'sample':
+            levels, leaves = bundle.predict_with_leaves(np.array([row], dtype=float))
+            pred = int(levels[0])
+        else:
+            pred = int(predict_array([row], bundle)[0])
+
+    top_feats = None
+    if FEEDBACK_ATTRIBUTION == 'sample':
+        with timed('attribution'):
+            top_feats = top_causes_batch(bundle, [row], [pred], leaves)[0]
+    with timed('feedback'):
+        feedback, top_feats, severities = generate_feedback(pred, data_for_model, bundle, top_feats)
+
+    doc = {
+        "username": username,
+        "student_id": student_id,
+        "input_data": data_for_model,
+        "predicted_engagement_level": pred,
+        "feedback": feedback,
+        "top_features": [f[0] for f in top_feats],
+        "severities": severities,
+        "timestamp": pd.Timestamp.now()
+    }
+    body = {
+        "StudentID": student_id,
+        "EngagementLevel": pred,
+        "Feedback": feedback,
+        "TopFeatures": [f[0] for f in top_feats],
+        "Severities": severities
+    }
+    return doc, body
+
+# ---------------------- /csv scoring ----------------------
+def clean_frame(df, bundle):
+    """Fill missing values with column means and split off non-numeric and
+    out-of-range rows; returns (df, rejected)."""
+    # Cast so every chunk of a streamed upload stores the same types
+    not_numeric = {}
+    for col in expected_columns:
+        values = pd.to_numeric(df[col], errors='coerce').astype(float)
+        not_numeric[col] = (values.isna() & df[col].notna()).to_numpy()
+        df[col] = values.fillna(bundle.column_means[col])
+
+    # Reject bad rows up front, reporting why for each one
+    invalid = validate_ranges_df(df)
+    rejected_mask = np.logical_or.reduce(list(invalid.values()) + list(not_numeric.values()))
+    rejected = [
+        {
+            "row": int(idx),
+            "student_id": student_id,
+            "errors": [f"{col} must be a number." for col in expected_columns if not_numeric[col][pos]]
+                      + [valid_ranges[col][2] for col in valid_ranges if invalid[col][pos]]
+        }
+        for pos, idx, student_id in zip(
+            np.flatnonzero(rejected_mask),
+            df.index[rejected_mask],
+            df['student_id'][rejected_mask].tolist()
+        )
+    ]
+    return df[~rejected_mask], rejected
+
+def build_documents(username, df, levels, feedback, top_feats, severities, timestamps):
+    """Prediction documents to store and the matching response records."""
+    input_rows = df[expected_columns].to_dict('records')
+    student_ids = df['student_id'].tolist()
+    level_list = levels.tolist()
+    ts_list = list(timestamps.dt.to_pydatetime())
+
+    docs = [
+        {
+            "username": username,
+            "student_id": student_id,
+            "input_data": input_row,
+            "predicted_engagement_level": level,
+            "feedback": fb,
+            "top_features": feats,
+            "severities": sev,
+            "timestamp": ts
+        }
+        for student_id, input_row, level, fb, feats, sev, ts in zip(
+            student_ids, input_rows, level_list, feedback, top_feats, severities, ts_list
+        )
+    ]
+    records = [
+        {
+            "student_id": student_id,
+            **input_row,
+            "PredictedEngagementLevel": level,
+            "Feedback": fb,
+            "TopFeatures": feats,
+            "Severities": sev,
+            "timestamp": str(ts)
+        }
+        for student_id, input_row, level, fb, feats, sev, ts in zip(
+            student_ids, input_rows, level_list, feedback, top_feats, severities, ts_list
+        )
+    ]
+    return docs, records
+
+def score_rows(df, username, bundle, hashes=None):
+    """Score one block of CSV rows without storing them; returns (docs, records, rejected).
+
+    hashes (from dedupe.row_hashes, same index as df) are stored as each document's row_hash.
+    """
+    with timed('validate'):
+        df, rejected = clean_frame(df, bundle)
+    if df.empty:
+        return [], [], rejected
+
+    X = df[expected_columns].to_numpy(dtype=float)
+    if FEEDBACK_ATTRIBUTION == 'sample':
+        # Attribute from the same leaves the prediction reached
+        with timed('predict'):
+            levels, leaves = bundle.predict_with_leaves(X)
+        with timed('attribution'):
+            causes = top_causes_batch(bundle, X, levels, leaves)
+    else:
+        with timed('predict'):
+            levels, causes = bundle.predict(X), None
+    levels = levels.astype(int)
+    with timed('feedback'):
+        feedback, top_feats, severities = generate_feedback_batch(levels, df, bundle, causes)
+    with timed('timestamps'):
+        timestamps = parse_timestamps(df)
+
+    with timed('documents'):
+        docs, records = build_documents(username, df, levels, feedback, top_feats, severities, timestamps)
+    if hashes is not None:
+        for doc, row_hash in zip(docs, hashes.loc[df.index].tolist()):
+            if row_hash is not None:
+                doc["row_hash"] = row_hash
+    return docs, records, rejected
+
+# ---------------------- /history ----------------------
+# Page sizes for the history endpoints; clients pass ?limit= up to the max
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 50))
+STUDENT_HISTORY_PAGE_SIZE = int(os.getenv("STUDENT_HISTORY_PAGE_SIZE", 200))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", 1000))
+history_fields = ['student_id', 'input_data', 'predicted_engagement_level', 'feedback',
+                  'top_features', 'severities', 'timestamp']
+
+def encode_cursor(doc):
+    raw = f"{doc['timestamp'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    timestamp, oid = raw.split('|')
+    return datetime.datetime.fromisoformat(timestamp), ObjectId(oid)
+
+def history_find(args, query, default_limit, default_order):
+    """The find() for one keyset page described by the request args: (find, error message or None).
+
+    find holds the filter, projection, sort and limit; one extra document is
+    fetched to tell whether another page follows.
+    """
+    try:
+        limit = int(args.get('limit', default_limit))
+    except ValueError:
+        return None, "limit must be an integer"
+    if not 1 <= limit <= HISTORY_MAX_PAGE_SIZE:
+        return None, f"limit must be between 1 and {HISTORY_MAX_PAGE_SIZE}"
+
+    order = args.get('order', default_order)
+    if order not in ('asc', 'desc'):
+        return None, "order must be 'asc' or 'desc'"
+    direction, after = (1, '$gt') if order == 'asc' else (-1, '$lt')
+
+    # Row hashes are internal (see dedupe.py)
+    projection = {"row_hash": 0}
+    if args.get('fields'):
+        fields = [f.strip() for f in args['fields'].split(',') if f.strip()]
+        unknown = [f for f in fields if f not in history_fields]
+        if unknown:
+            return None, f"Unknown fields: {unknown}. Allowed: {history_fields}"
+        # The cursor is built from timestamp, so it is always returned
+        projection = dict.fromkeys(fields + ['timestamp'], 1)
+
+    if args.get('cursor'):
+        try:
+            timestamp, oid = decode_cursor(args['cursor'])
+        except Exception:
+            return None, "Invalid cursor"
+        query = {**query, "$or": [
+            {"timestamp": {after: timestamp}},
+            {"timestamp": timestamp, "_id": {after: oid}},
+        ]}
+
+    return {
+        "filter": query,
+        "projection": projection,
+        "sort": [("timestamp", direction), ("_id", direction)],
+        "limit": limit + 1,
+    }, None
+
+def history_result(docs, find):
+    """The page's documents made JSON-ready, and the cursor of the next page (or None)."""
+    limit = find["limit"] - 1
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    next_cursor = encode_cursor(docs[-1]) if has_more else None
+
+    for doc in docs:
+        doc['_id'] = str(doc['_id'])
+        doc['timestamp'] = doc['timestamp'].isoformat()
+    return docs, next_cursor
+
+# ---------------------- /summary ----------------------
+def summary_query(args, username, student_id):
+    day_range = {}
+    for arg, op in (('from', '$gte'), ('to', '$lte')):
+        value = args.get(arg)
+        if value:
+            try:
+                day_range[op] = datetime.date.fromisoformat(value).isoformat()
+            except ValueError:
+                return None, f"{arg} must be a date like 2025-06-25"
+
+    query = {"username": username, "student_id": student_id_match([student_id])}
+    if day_range:
+        query["day"] = day_range
+    return query, None
+
+def summary_body(student_id, rollups):
+    """rollups sorted by day; a numeric id stored both as text and as a number
+    has two rollups for some days, which are added up."""
+    days = []
+    for day, group in itertools.groupby(rollups, key=lambda rollup: rollup['day']):
+        group = list(group)
+        days.append(summarize_day(group[0] if len(group) == 1 else {**merge_days(group), "day": day}))
+    total = summarize_day(merge_days(rollups))
+    del total["day"]
+    total.pop("hours", None)
+    return {
+        "student_id": student_id,
+        "days": days,
+        "total": total,
+    }
+
+# ---------------------- /trend ----------------------
+TREND_MAX_POINTS = int(os.getenv("TREND_MAX_POINTS", 5000))
+# Most predictions one /trend request reads; larger ranges get a 400 asking
+# for a narrower from/to or fewer students instead of loading them all
+TREND_MAX_DOCS = int(os.getenv("TREND_MAX_DOCS", 200_000))
+
+trend_projection = {"_id": 0, "student_id": 1, "timestamp": 1, "predicted_engagement_level": 1, "input_data": 1}
+
+def timestamp_range(args):
+    """Mongo range on timestamp from the ?from= / ?to= ISO timestamps: (range or None, error or None)."""
+    time_range = {}
+    for arg, op in (('from', '$gte'), ('to', '$lte')):
+        if args.get(arg):
+            try:
+                time_range[op] = datetime.datetime.fromisoformat(args[arg])
+            except ValueError:
+                return None, f"{arg} must be an ISO timestamp"
+    return time_range or None, None
+
+def student_id_match(student_ids):
+    """Mongo condition on student_id for ids taken from a URL.
+
+    A CSV with numeric ids stores them as ints, so digit-only ids match both forms.
+    """
+    ids = student_ids + [int(sid) for sid in student_ids if sid.isdigit()]
+    return ids[0] if len(ids) == 1 else {"$in": ids}
+
+def trend_query(args, username):
+    """(Mongo filter, window, points, error message or None) for the /trend query string."""
+    student_ids = [sid for arg in args.getlist('student_id') for sid in arg.split(',') if sid]
+    window = args.get('window', '15min')
+    try:
+        # Calendar offsets (1W, 1ME) have no fixed length, which rolling() needs
+        pd.tseries.frequencies.to_offset(window).nanos
+        points = int(args.get('points', 300))
+    except ValueError:
+        return None, None, None, "window must be a fixed offset like 15min or 1h, points an integer"
+    if not 3 <= points <= TREND_MAX_POINTS:
+        return None, None, None, f"points must be between 3 and {TREND_MAX_POINTS}"
+
+    query = {"username": username}
+    if student_ids:
+        query["student_id"] = student_id_match(student_ids)
+    time_range, error = timestamp_range(args)
+    if error:
+        return None, None, None, error
+    if time_range:
+        query["timestamp"] = time_range
+    return query, window, points, None
+
+def trend_too_large():
+    return f"More than {TREND_MAX_DOCS} predictions match; narrow from/to or student_id"
+
+def trend_body(docs, window, points):
+    frames = trend_frames(docs)
+    return {
+        "window": window,
+        "points": points,
+        "students": [
+            {"student_id": student_id, **student_trend(frame, window, points)}
+            for student_id, frame in frames.items()
+        ],
+    }
@@ -0,0 +1,176 @@
+import argparse
+import gc
+import importlib
+import os
+import signal
+import socket
+import sys
+import time
+
+# Pre-fork server: the parent loads the libraries and the model bundle once,
+# then forks the workers, which share those pages copy-on-write. With
+# MODEL_MMAP the compiled forest arrays are file-backed, so they stay shared
+# even across hot reloads (every worker maps the same page cache).
+#
+# Shared between workers through Mongo: token revocations (logout, password
+# change), the /csv upload cache, stored predictions and rollups, and the job
+# directory. Per worker process: the token and user caches (bounded by their
+# TTLs), the /dedupe, /writer and /metrics counters (each request sees the
+# worker that served it), and the live-stream hub. An ingest and an SSE
+# subscriber on different workers never see each other, so the /stream
+# routes answer 503 unless the server runs with --workers 1.
+os.environ.setdefault("MODEL_MMAP", "1")
+
+SERVE_HOST = os.getenv("SERVE_HOST", "127.0.0.1")
+SERVE_PORT = int(os.getenv("SERVE_PORT", 5000))
+# Worker processes; defaults to one per core
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", os.cpu_count() or 1))
+# Handle each connection on its own thread inside a worker (needed for the SSE streams)
+SERVE_THREADED = os.getenv("SERVE_THREADED", "1") == "1"
+# Also unpickle the sklearn forest in the parent; it is only used for batches
+# over COMPILED_MAX_BATCH rows, and would otherwise be loaded once per worker
+SERVE_PRELOAD_MODEL = os.getenv("SERVE_PRELOAD_MODEL", "1") == "1"
+SERVE_ACCESS_LOG = os.getenv("SERVE_ACCESS_LOG", "0") == "1"
+SERVE_BACKLOG = int(os.getenv("SERVE_BACKLOG", 1024))
+# Seconds a worker gets to finish after SIGTERM before it is killed
+SERVE_GRACEFUL_TIMEOUT = float(os.getenv("SERVE_GRACEFUL_TIMEOUT", 10))
+
+# Imported before forking; none of them opens a connection or starts a thread
+# at import time (db, auth and prediction do, so workers import the app themselves)
+PRELOAD_MODULES = [
+    'numpy', 'pandas', 'sklearn.ensemble', 'joblib', 'flask', 'flask_cors', 'werkzeug.serving',
+    'bcrypt', 'jwt', 'pymongo', 'bson', 'inference', 'lookup', 'explain', 'metrics', 'utils',
+    'trend', 'streaming', 'writer', 'batcher', 'jobs',
+]
+
+
+def listen(host, port, backlog=SERVE_BACKLOG):
+    sock = socket.create_server((host, port), backlog=backlog, reuse_port=False)
+    # Every worker waits on the same socket; a worker that loses the race for
+    # a connection gets EAGAIN instead of blocking in accept()
+    sock.setblocking(False)
+    return sock
+
+
+def preload(with_model=SERVE_PRELOAD_MODEL):
+    started = time.perf_counter()
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+    import artifacts
+    bundle = artifacts.preload_bundle(with_model=with_model)
+    # Objects that exist now are never collected, so the collector does not
+    # write to (and un-share) their pages in every worker
+    gc.collect()
+    gc.freeze()
+    return bundle, time.perf_counter() - started
+
+
+def run_worker(sock, threaded=SERVE_THREADED):
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from app import app
+    import artifacts
+
+    artifacts.start_reload_watcher()
+
+    class RequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            if SERVE_ACCESS_LOG:
+                super().log_request(*args, **kwargs)
+
+    server = make_server(sock.getsockname()[0], sock.getsockname()[1], app, threaded=threaded,
+                         request_handler=RequestHandler, fd=sock.fileno())
+    server.socket.setblocking(False)
+    print(f"✅ Worker {os.getpid()} ready", flush=True)
+    server.serve_forever()
+
+
+class Arbiter:
+    """Forks the workers, replaces any that die and stops them on SIGTERM / SIGINT."""
+
+    def __init__(self, sock, workers, threaded=SERVE_THREADED):
+        self.sock = sock
+        self.workers = workers
+        self.threaded = threaded
+        self.children = {}
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return pid
+        # Child: never returns into the parent's loop; sys.exit runs the atexit
+        # hooks (write-behind flush) like a normal shutdown
+        self.children = {}
+        try:
+            run_worker(self.sock, self.threaded)
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
+    def stop(self, *_):
+        if self.stopping:
+            return
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+
+        deadline = None
+        while self.children:
+            if self.stopping and deadline is None:
+                deadline = time.monotonic() + SERVE_GRACEFUL_TIMEOUT
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG if self.stopping else 0)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                if time.monotonic() > deadline:
+                    for pid in self.children:
+                        os.kill(pid, signal.SIGKILL)
+                time.sleep(0.05)
+                continue
+
+            started = self.children.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            print(f"⚠️ Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting", flush=True)
+            # Back off when workers die on startup (e.g. a broken bundle) instead of fork-looping
+            if time.monotonic() - started < 1.0:
+                time.sleep(1.0)
+            self.spawn()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the API from several pre-forked worker processes")
+    parser.add_argument('--host', default=SERVE_HOST)
+    parser.add_argument('--port', type=int, default=SERVE_PORT)
+    parser.add_argument('--workers', type=int, default=SERVE_WORKERS)
+    parser.add_argument('--no-threads', action='store_true', help="One connection at a time per worker")
+    parser.add_argument('--no-preload', action='store_true',
+                        help="Load everything in each worker instead (for comparison)")
+    args = parser.parse_args()
+
+    sock = listen(args.host, args.port)
+    # Read by prediction.py in every worker; see the note on per-process state above
+    os.environ["SERVE_WORKER_PROCESSES"] = str(args.workers)
+    if args.workers > 1:
+        print("ℹ️ Live streaming (/api/predict/stream/*) is disabled with more than one worker", flush=True)
+    if not args.no_preload:
+        bundle, seconds = preload()
+        print(f"📦 Preloaded model bundle {bundle.version} in {seconds:.2f}s "
+              f"(MODEL_MMAP={os.environ['MODEL_MMAP']})", flush=True)
+    print(f"🚀 Serving on http://{args.host}:{sock.getsockname()[1]} with {args.workers} workers "
+          f"(parent {os.getpid()})", flush=True)
+    Arbiter(sock, args.workers, threaded=not args.no_threads).run()
@@ -0,0 +1,251 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+STREAM_FEATURES = ['HeartRate', 'SkinConductance', 'EEG']
+
+
+class RingBuffer:
+    """The last ``size`` scored samples of one student, in preallocated arrays."""
+
+    __slots__ = ('features', 'levels', 'timestamps', 'head', 'count', 'last_seen')
+
+    def __init__(self, size):
+        self.features = np.full((size, len(STREAM_FEATURES)), np.nan)
+        self.levels = np.zeros(size, dtype=np.int8)
+        self.timestamps = np.zeros(size, dtype='datetime64[ms]')
+        self.head = 0
+        self.count = 0
+        self.last_seen = time.monotonic()
+
+    def append(self, features, level, timestamp):
+        self.features[self.head] = features
+        self.levels[self.head] = level
+        self.timestamps[self.head] = pd.Timestamp(timestamp).to_datetime64()
+        self.head = (self.head + 1) % len(self.levels)
+        self.count = min(self.count + 1, len(self.levels))
+        self.last_seen = time.monotonic()
+
+    def rolling_engagement(self):
+        return float(self.levels[:self.count].mean()) if self.count else None
+
+    @property
+    def nbytes(self):
+        return self.features.nbytes + self.levels.nbytes + self.timestamps.nbytes
+
+
+class Subscription:
+    def __init__(self, username, student_ids, max_queue):
+        self.username = username
+        self.student_ids = set(student_ids) if student_ids else None
+        self.queue = queue.Queue(max_queue)
+        self.dropped = 0
+
+    def offer(self, update):
+        if self.student_ids is not None and update['student_id'] not in self.student_ids:
+            return
+        try:
+            self.queue.put_nowait(update)
+        except queue.Full:
+            # A slow reader loses its oldest update, never blocks the scorer
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.dropped += 1
+            self.queue.put_nowait(update)
+
+
+class StreamHub:
+    """Scores live sensor samples in small batches and fans updates out to subscribers.
+
+    ``ingest`` queues samples (blocking while ``max_pending`` are waiting);
+    a background thread takes everything pending every ``batch_ms`` (sooner
+    once ``max_batch`` samples are queued) and calls
+    ``score_fn(username, samples) -> (records, rejected)`` once per user.
+    Each scored record lands in its student's ring buffer and is published
+    with the student's rolling engagement. At most ``max_students`` ring
+    buffers are kept; the least recently active ones are evicted first.
+    """
+
+    def __init__(self, score_fn, ring_size=256, batch_ms=250.0, max_batch=512, max_pending=8192,
+                 max_students=2000, idle_seconds=600.0, subscriber_queue=1000):
+        self.score_fn = score_fn
+        self.ring_size = ring_size
+        self.batch_interval = batch_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.max_students = max_students
+        self.idle_seconds = idle_seconds
+        self.subscriber_queue = subscriber_queue
+
+        self._pending = []
+        self._cond = threading.Condition()
+        self._rings = OrderedDict()
+        self._subscribers = {}
+        self._state_lock = threading.Lock()
+
+        self.ingested = 0
+        self.scored = 0
+        self.rejected = 0
+        self.batches = 0
+        self.evicted = 0
+        self.total_score_time = 0.0
+        self.max_lag = 0.0
+        self.last_error = None
+
+        self._worker = threading.Thread(target=self._run, name='stream-scorer', daemon=True)
+        self._worker.start()
+
+    # ---------------------- producers ----------------------
+    def ingest(self, username, samples, timeout=10.0):
+        """Queue samples for scoring; returns how many were accepted before the timeout."""
+        accepted = 0
+        now = time.monotonic()
+        deadline = now + timeout
+        with self._cond:
+            for sample in samples:
+                while len(self._pending) >= self.max_pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.ingested += accepted
+                        return accepted
+                    self._cond.wait(remaining)
+                self._pending.append((username, sample, now))
+                accepted += 1
+            self.ingested += accepted
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+        return accepted
+
+    # ---------------------- subscribers ----------------------
+    def subscribe(self, username, student_ids=None):
+        subscription = Subscription(username, student_ids, self.subscriber_queue)
+        with self._state_lock:
+            self._subscribers.setdefault(username, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._state_lock:
+            subscribers = self._subscribers.get(subscription.username, [])
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.username, None)
+
+    def snapshot(self, username, student_id):
+        """Recent scored samples for one student, oldest first."""
+        with self._state_lock:
+            ring = self._rings.get((username, student_id))
+            if ring is None:
+                return None
+            order = (np.arange(ring.count) + ring.head - ring.count) % len(ring.levels)
+            return {
+                "student_id": student_id,
+                "rolling_engagement": ring.rolling_engagement(),
+                "timestamp": [str(ts) for ts in ring.timestamps[order]],
+                "levels": ring.levels[order].tolist(),
+                **{col: ring.features[order, i].tolist() for i, col in enumerate(STREAM_FEATURES)},
+            }
+
+    # ---------------------- scoring ----------------------
+    def _take(self):
+        with self._cond:
+            if len(self._pending) < self.max_batch:
+                self._cond.wait(self.batch_interval)
+            batch, self._pending = self._pending, []
+            self._cond.notify_all()
+            return batch
+
+    def _ring(self, key):
+        ring = self._rings.get(key)
+        if ring is None:
+            if len(self._rings) >= self.max_students:
+                self._rings.popitem(last=False)
+                self.evicted += 1
+            ring = self._rings[key] = RingBuffer(self.ring_size)
+        else:
+            self._rings.move_to_end(key)
+        return ring
+
+    def _score(self, batch):
+        started = time.perf_counter()
+        by_user = {}
+        for username, sample, enqueued in batch:
+            by_user.setdefault(username, []).append(sample)
+
+        updates = []
+        for username, samples in by_user.items():
+            records, rejected = self.score_fn(username, samples)
+            self.rejected += len(rejected)
+            with self._state_lock:
+                for record in records:
+                    ring = self._ring((username, record['student_id']))
+                    ring.append([record[col] for col in STREAM_FEATURES],
+                                record['PredictedEngagementLevel'], record['timestamp'])
+                    updates.append((username, {
+                        **record,
+                        "rolling_engagement": ring.rolling_engagement(),
+                        "window": ring.count,
+                    }))
+            self.scored += len(records)
+
+        with self._state_lock:
+            for username, update in updates:
+                for subscription in self._subscribers.get(username, ()):
+                    subscription.offer(update)
+
+        finished = time.perf_counter()
+        self.batches += 1
+        self.total_score_time += finished - started
+        self.max_lag = max(self.max_lag, time.monotonic() - min(enqueued for _, _, enqueued in batch))
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._state_lock:
+            while self._rings:
+                key, ring = next(iter(self._rings.items()))
+                if ring.last_seen >= cutoff:
+                    break
+                del self._rings[key]
+                self.evicted += 1
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if batch:
+                try:
+                    self._score(batch)
+                except Exception as exc:
+                    # One bad batch must not stop the stream
+                    self.rejected += len(batch)
+                    self.last_error = repr(exc)
+            self._evict_idle()
+
+    def stats(self):
+        with self._state_lock:
+            rings = len(self._rings)
+            ring_bytes = sum(ring.nbytes for ring in self._rings.values())
+            subscribers = sum(len(subs) for subs in self._subscribers.values())
+            dropped = sum(sub.dropped for subs in self._subscribers.values() for sub in subs)
+        batches = self.batches or 1
+        return {
+            "active_students": rings,
+            "max_students": self.max_students,
+            "ring_size": self.ring_size,
+            "ring_bytes": ring_bytes,
+            "pending": len(self._pending),
+            "subscribers": subscribers,
+            "dropped_updates": dropped,
+            "ingested": self.ingested,
+            "scored": self.scored,
+            "rejected": self.rejected,
+            "evicted": self.evicted,
+            "batches": self.batches,
+            "avg_batch_ms": self.total_score_time / batches * 1000.0,
+            "max_lag_ms": self.max_lag * 1000.0,
+            "last_error": self.last_error,
+        }
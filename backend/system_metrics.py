@@ -1,10 +1,10 @@
 import pandas as pd
 import numpy as np
-import joblib
 import time
 import matplotlib.pyplot as plt
 import seaborn as sns
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+from artifacts import load_bundle
 
 # Load test dataset
 test_path = 'data/test.csv'
@@ -30,9 +30,10 @@ X = df[features].replace(0, np.nan)
 X.fillna(X.mean(), inplace=True)
 y_true = df['EngagementLevel']
 
-# Load model and scaler
-model = joblib.load('backend/model.pkl')
-scaler = joblib.load('backend/scaler.pkl')
+# Load model and scaler from the current bundle
+bundle = load_bundle()
+model = bundle.model
+scaler = bundle.scaler
 
 # Scale data
 X_scaled = scaler.transform(X)
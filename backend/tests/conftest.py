@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+
+# The backend is run from backend/ with flat imports, against an in-memory
+# database unless MONGO_URI points at a real one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MONGO_URI", "mongomock://")
+os.environ.setdefault("JOB_WORKERS", "0")
+os.environ.setdefault("JOBS_DIR", tempfile.mkdtemp(prefix='focus-jobs-'))
+os.environ.setdefault("WRITE_BEHIND", "0")
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(client):
+    """A registered user's (username, token)."""
+    import uuid
+    username = f"user-{uuid.uuid4().hex[:8]}"
+    client.post('/api/auth/register', json={"username": username, "password": "pw", "email": "u@example.com"})
+    token = client.post('/api/auth/login', json={"username": username, "password": "pw"}).get_json()["token"]
+    return username, token
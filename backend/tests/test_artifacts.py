@@ -0,0 +1,97 @@
+import glob
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+import artifacts
+from artifacts import current_version, load_bundle, reload_if_changed, write_bundle
+
+FEATURES = ['HeartRate', 'SkinConductance', 'EEG']
+
+
+def estimators(seed):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.uniform([20, 0.01, 1], [100, 20, 20], size=(300, 3)), columns=FEATURES)
+    y = (X['HeartRate'] > 60).astype(int) + (X['EEG'] > 10).astype(int)
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=5, max_depth=4, random_state=seed).fit(scaler.transform(X), y)
+    shap_summary = {level: {'HeartRate': 0.3, 'SkinConductance': 0.2, 'EEG': 0.1 * level} for level in range(3)}
+    return model, scaler, shap_summary, X.mean().to_dict()
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    # Served bundle and reload counters are restored after each test
+    monkeypatch.setattr(artifacts, '_current', None)
+    monkeypatch.setattr(artifacts, 'reload_stats', dict(artifacts.reload_stats, reloads=0, failures=0, last_error=None))
+    return str(tmp_path)
+
+
+def test_write_bundle_publishes_a_verified_version(root):
+    model, scaler, shap_summary, means = estimators(1)
+    path = write_bundle(model, scaler, shap_summary, means, root=root, version='v1')
+    assert current_version(root) == 'v1'
+    assert sorted(os.listdir(root)) == ['CURRENT', 'v1']
+
+    bundle = load_bundle(root=root)
+    assert bundle.version == 'v1' and bundle.path == path
+    assert set(bundle.manifest['files']) >= {'model.pkl', 'scaler.pkl', 'column_means.pkl'}
+    X = np.array([[45.0, 2.0, 8.0], [80.0, 10.0, 15.0], [61.0, 0.5, 11.0]])
+    assert bundle.predict(X).tolist() == model.predict(scaler.transform(pd.DataFrame(X, columns=FEATURES))).tolist()
+
+
+def test_checksum_mismatch_is_rejected(root):
+    write_bundle(*estimators(1), root=root, version='v1')
+    with open(os.path.join(root, 'v1', 'column_means.pkl'), 'ab') as f:
+        f.write(b'\0')
+    with pytest.raises(ValueError, match="Checksum mismatch for column_means.pkl in model bundle v1"):
+        load_bundle(root=root)
+
+
+def test_current_swaps_to_a_new_version_and_reload_picks_it_up(root):
+    write_bundle(*estimators(1), root=root, version='v1')
+    artifacts._current = load_bundle(root=root)
+    assert reload_if_changed(root) is False
+
+    in_flight = artifacts._current
+    write_bundle(*estimators(2), root=root, version='v2')
+    # Both renames are done: no temporary directory or pointer is left behind
+    assert sorted(os.listdir(root)) == ['CURRENT', 'v1', 'v2']
+    assert not glob.glob(os.path.join(root, '.*'))
+    assert current_version(root) == 'v2'
+
+    assert reload_if_changed(root) is True
+    assert artifacts._current.version == 'v2'
+    assert artifacts.reload_stats['reloads'] == 1
+    # A request still holding the old bundle keeps scoring with it
+    assert in_flight.version == 'v1' and len(in_flight.predict(np.array([[50.0, 1.0, 9.0]]))) == 1
+    assert reload_if_changed(root) is False
+
+
+@pytest.mark.parametrize('damage,error', [
+    (lambda path: open(os.path.join(path, 'model.pkl'), 'wb').close(), "Checksum mismatch for model.pkl"),
+    (lambda path: os.remove(os.path.join(path, 'scaler.pkl')), "No such file"),
+    (lambda path: os.remove(os.path.join(path, 'manifest.json')), "No such file"),
+])
+def test_failed_reload_keeps_serving_the_old_bundle(root, damage, error):
+    write_bundle(*estimators(1), root=root, version='v1')
+    artifacts._current = load_bundle(root=root)
+    write_bundle(*estimators(2), root=root, version='v2')
+    damage(os.path.join(root, 'v2'))
+
+    assert reload_if_changed(root) is False
+    assert artifacts._current.version == 'v1'
+    assert artifacts.reload_stats['failures'] == 1 and artifacts.reload_stats['reloads'] == 0
+    assert artifacts.reload_stats['last_error'].startswith('v2: ') and error in artifacts.reload_stats['last_error']
+
+    # Pointing CURRENT at a version that was never written fails the same way
+    with open(os.path.join(root, 'CURRENT'), 'w') as f:
+        f.write('v3')
+    assert reload_if_changed(root) is False
+    assert artifacts._current.version == 'v1' and artifacts.reload_stats['failures'] == 2
+
+    # Once a good version is published again it is picked up
+    write_bundle(*estimators(3), root=root, version='v4')
+    assert reload_if_changed(root) is True and artifacts._current.version == 'v4'
@@ -0,0 +1,176 @@
+import asyncio
+import io
+import os
+import subprocess
+import sys
+import uuid
+import pytest
+from werkzeug.datastructures import FileStorage
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_async_app_does_not_load_the_sync_stack():
+    pytest.importorskip('quart')
+    pytest.importorskip('quart_cors')
+    # A fresh interpreter: the test session has already imported the sync app
+    script = (
+        "import sys, threading\n"
+        "import async_app\n"
+        "print(sorted(m for m in ('db', 'prediction', 'jobs') if m in sys.modules))\n"
+        "print(threading.active_count())\n"
+    )
+    env = {**os.environ, "MONGO_URI": "mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=100"}
+    out = subprocess.run([sys.executable, '-c', script], cwd=BACKEND, env=env,
+                         capture_output=True, text=True, check=True).stdout.splitlines()
+    # No sync MongoClient, job runner or write-behind thread in the async process
+    assert out == ['[]', '1']
+
+
+def test_sync_blueprint_shares_the_scoring_helpers():
+    import prediction
+    import scoring
+    assert prediction.score_rows is scoring.score_rows
+    assert prediction.history_find is scoring.history_find
+
+
+# ---------------------- async routes on an async-wrapped mongomock ----------------------
+class AsyncCursor:
+    """The part of pymongo's AsyncCursor the async blueprints use, over a mongomock cursor."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self.cursor = self.cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, n):
+        self.cursor = self.cursor.limit(n)
+        return self
+
+    async def to_list(self, length=None):
+        return list(self.cursor)
+
+    async def __aiter__(self):
+        for doc in self.cursor:
+            yield doc
+
+
+class AsyncCollection:
+    """Awaitable methods over a mongomock collection, as AsyncMongoClient collections have."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self.collection.find(*args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+@pytest.fixture(scope='module')
+def async_app():
+    pytest.importorskip('quart')
+    pytest.importorskip('quart_cors')
+    import db
+    # async_db refuses mongomock:// and connects lazily, so point it nowhere and
+    # hand the blueprints the sync tests' in-memory collections instead
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv('MONGO_URI', 'mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=100')
+        import async_app
+        import async_auth
+        import async_prediction
+        for module, names in ((async_auth, ('users_collection', 'revoked_tokens_collection')),
+                              (async_prediction, ('predictions_collection', 'rollups_collection',
+                                                  'uploads_collection'))):
+            for name in names:
+                patch.setattr(module, name, AsyncCollection(getattr(db, name)))
+        yield async_app.app
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def login(client, username):
+    await client.post('/api/auth/register', json={"username": username, "password": "pw", "email": "a@example.com"})
+    response = await client.post('/api/auth/login', json={"username": username, "password": "pw"})
+    return {"Authorization": f"Bearer {(await response.get_json())['token']}"}
+
+
+def csv_upload(rows):
+    lines = ["student_id,timestamp,HeartRate,SkinConductance,EEG"]
+    lines += [f"{101 + i % 2},2026-05-04T09:00:{i:02d},{40 + i},{1 + i % 5},{5 + i % 9}" for i in range(rows)]
+    return {"file": FileStorage(io.BytesIO(("\n".join(lines) + "\n").encode()), filename='up.csv')}
+
+
+def test_async_profile_and_logout(async_app):
+    async def scenario():
+        client = async_app.test_client()
+        username = f"async-{uuid.uuid4().hex[:8]}"
+        headers = await login(client, username)
+        response = await client.get('/api/auth/profile', headers=headers)
+        assert response.status_code == 200
+        assert await response.get_json() == {"username": username, "email": "a@example.com"}
+        assert 'Server-Timing' in response.headers
+
+        assert (await client.post('/api/auth/logout', headers=headers)).status_code == 200
+        assert (await client.get('/api/auth/profile', headers=headers)).status_code == 401
+        # Revocations are shared through Mongo with the sync app
+        import db
+        assert db.revoked_tokens_collection.count_documents({}) >= 1
+    run(scenario())
+
+
+def test_async_csv_history_and_manual(async_app):
+    import db
+
+    async def scenario():
+        client = async_app.test_client()
+        username = f"async-{uuid.uuid4().hex[:8]}"
+        headers = await login(client, username)
+
+        response = await client.post('/api/predict/csv', headers=headers, files=csv_upload(12))
+        assert response.status_code == 200, await response.get_json()
+        body = await response.get_json()
+        assert len(body["results"]) == 12 and body["duplicates"] == {"file": False, "rows": 0}
+        assert db.predictions_collection.count_documents({"username": username}) == 12
+        # Stored rows are recognised on a second upload
+        body = await (await client.post('/api/predict/csv', headers=headers, files=csv_upload(12))).get_json()
+        assert body["duplicates"]["rows"] == 12
+        assert db.predictions_collection.count_documents({"username": username}) == 12
+
+        response = await client.post('/api/predict/manual', headers=headers,
+                                     json={"student_id": "s9", "HeartRate": 60, "SkinConductance": 2, "EEG": 9})
+        assert response.status_code == 200
+        assert (await response.get_json())["StudentID"] == "s9"
+
+        ids, cursor = [], None
+        while True:
+            query = {"limit": 5, **({"cursor": cursor} if cursor else {})}
+            response = await client.get('/api/predict/history', headers=headers, query_string=query)
+            assert response.status_code == 200
+            ids += [doc["_id"] for doc in await response.get_json()]
+            cursor = response.headers.get('X-Next-Cursor')
+            if not cursor:
+                break
+        expected = db.predictions_collection.find({"username": username}).sort([("timestamp", -1), ("_id", -1)])
+        assert ids == [str(doc["_id"]) for doc in expected]
+
+        response = await client.delete(f"/api/predict/history/{ids[-1]}", headers=headers)
+        assert response.status_code == 200
+        assert db.predictions_collection.count_documents({"username": username}) == 12
+
+        student = await (await client.get('/api/predict/history/student/101', headers=headers)).get_json()
+        assert len(student) == db.predictions_collection.count_documents({"username": username, "student_id": 101}) > 0
+
+        summary = await (await client.get('/api/predict/summary/101', headers=headers)).get_json()
+        assert summary["total"]["count"] == db.predictions_collection.count_documents(
+            {"username": username, "student_id": 101})
+    run(scenario())
@@ -0,0 +1,84 @@
+import importlib.util
+import time
+import pytest
+import utils
+
+
+def other_worker(monkeypatch, revocation_ttl=0.2):
+    """A second copy of utils with its own module state, as another server process has; the database is shared."""
+    monkeypatch.setenv("REVOCATION_CACHE_TTL", str(revocation_ttl))
+    spec = importlib.util.spec_from_file_location('utils_other_worker', utils.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_logout_applies_in_other_worker(client, user, monkeypatch):
+    username, token = user
+    worker = other_worker(monkeypatch)
+    # The other worker has already accepted (and cached) this token
+    assert worker.verify_token(token) == username
+
+    assert client.post('/api/auth/logout', headers=auth(token)).status_code == 200
+    assert client.get('/api/auth/profile', headers=auth(token)).status_code == 401
+    time.sleep(0.3)
+    assert worker.verify_token(token) is None
+
+
+def test_password_change_applies_in_other_worker(client, user, monkeypatch):
+    username, token = user
+    worker = other_worker(monkeypatch)
+    assert worker.verify_token(token) == username
+
+    response = client.post('/api/auth/password', headers=auth(token),
+                           json={"current_password": "pw", "new_password": "pw2"})
+    new_token = response.get_json()["token"]
+    assert client.get('/api/auth/profile', headers=auth(token)).status_code == 401
+    time.sleep(0.3)
+    assert worker.verify_token(token) is None
+    assert worker.verify_token(new_token) == username
+
+
+def test_other_tokens_survive_logout(client, user):
+    username, token = user
+    other = client.post('/api/auth/login', json={"username": username, "password": "pw"}).get_json()["token"]
+    client.post('/api/auth/logout', headers=auth(token))
+    assert utils.verify_token(token) is None
+    assert utils.verify_token(other) == username
+
+
+@pytest.mark.parametrize('token', ['', 'not-a-token'])
+def test_invalid_tokens(token):
+    assert utils.verify_token(token) is None
+
+
+def test_revocations_are_read_once_per_interval(client, user, monkeypatch):
+    import db
+    username, token = user
+    others = [client.post('/api/auth/login', json={"username": username, "password": "pw"}).get_json()["token"]
+              for _ in range(3)]
+    worker = other_worker(monkeypatch, revocation_ttl=60)
+    reads = []
+    find = db.revoked_tokens_collection.find
+    monkeypatch.setattr(db.revoked_tokens_collection, 'find', lambda *a, **kw: reads.append(a) or find(*a, **kw))
+
+    for _ in range(5):
+        for t in [token] + others:
+            assert worker.verify_token(t) == username
+    # One read of the whole collection, however many tokens were checked
+    assert len(reads) == 1
+    assert worker.revocation_cache.stats()["refreshes"] == 1
+
+
+def test_cache_reports_revocations(client, user):
+    username, token = user
+    other = client.post('/api/auth/login', json={"username": username, "password": "pw"}).get_json()["token"]
+    client.post('/api/auth/logout', headers=auth(other))
+    stats = client.get('/api/auth/cache', headers=auth(token)).get_json()
+    assert set(stats) == {"tokens", "users", "revocations"}
+    assert stats["revocations"]["tokens"] >= 1
+    assert stats["revocations"]["refreshes"] >= 1
@@ -0,0 +1,48 @@
+import threading
+from batcher import MicroBatcher
+from artifacts import current_bundle
+from explain import attribution_cache
+import scoring
+
+
+def test_rows_are_predicted_per_group():
+    calls = []
+
+    def predict(X, group):
+        calls.append((group, len(X)))
+        return [(group, row[0]) for row in X.tolist()]
+
+    batcher = MicroBatcher(predict, window_ms=50, max_batch=8)
+    results = {}
+
+    def submit(i, group):
+        results[i] = batcher.submit([float(i), 0.0, 0.0], group)
+
+    threads = [threading.Thread(target=submit, args=(i, 'v1' if i % 2 else 'v2')) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # Every row comes back from its own group's call
+    assert results == {i: ('v1' if i % 2 else 'v2', float(i)) for i in range(6)}
+    assert sum(n for _, n in calls) == 6
+    assert batcher.stats()["requests"] == 6
+
+
+def test_batched_manual_prediction_traverses_the_forest_once(monkeypatch):
+    bundle = current_bundle()
+    traversals = []
+    leaves = bundle.leaves
+    monkeypatch.setattr(bundle, 'leaves', lambda X: traversals.append(len(X)) or leaves(X))
+    monkeypatch.setattr(scoring, 'FEEDBACK_ATTRIBUTION', 'sample')
+    attribution_cache.clear()
+
+    batcher = MicroBatcher(scoring.predict_with_leaves_rows, window_ms=1, max_batch=4)
+    readings = {"HeartRate": 61.0, "SkinConductance": 0.43, "EEG": 9.7}
+    doc, body = scoring.score_manual('batch-user', 's1', readings, bundle, batcher)
+
+    assert traversals == [1]
+    expected = int(bundle.predict([[61.0, 0.43, 9.7]])[0])
+    assert body["EngagementLevel"] == doc["predicted_engagement_level"] == expected
+    assert len(body["TopFeatures"]) == 2
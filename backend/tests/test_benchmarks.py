@@ -0,0 +1,60 @@
+import json
+import pytest
+import benchmarks
+import prediction
+from benchmarks import bench_stages, compare_stages
+
+
+def result(stage, rows, median_ms):
+    return {"stage": stage, "rows": rows, "median_ms": median_ms}
+
+
+BASELINE = {"results": [result('parse', 1000, 10.0), result('predict', 1000, 2.0), result('predict', 10000, 0.0)]}
+
+
+def test_regression_needs_both_tolerance_and_noise():
+    regressions = compare_stages([
+        result('parse', 1000, 13.0),      # +30 %, +3 ms
+        result('predict', 1000, 2.9),     # +45 %, but under the noise floor
+        result('predict', 10000, 5.0),    # zero baseline: no ratio to compare
+        result('store', 1000, 99.0),      # new stage, nothing to compare
+    ], BASELINE, tolerance=0.25, noise_ms=1.0)
+    assert regressions == [result('parse', 1000, 13.0)]
+
+
+def test_faster_or_within_tolerance_passes():
+    assert compare_stages([result('parse', 1000, 12.4), result('predict', 1000, 1.0)],
+                          BASELINE, tolerance=0.25, noise_ms=0.5) == []
+    # Stages are matched by row count as well as name
+    assert compare_stages([result('parse', 5000, 50.0)], BASELINE, tolerance=0.25, noise_ms=0.5) == []
+
+
+@pytest.fixture
+def fake_stages(monkeypatch):
+    timings = {'parse': [0.010, 0.011, 0.012], 'predict': [0.002, 0.002, 0.003]}
+    monkeypatch.setattr(benchmarks, 'stage_timings', lambda n_rows, include_db=True: timings)
+    monkeypatch.setattr(prediction, 'write_behind', prediction.write_behind)
+    return timings
+
+
+def test_bench_stages_gates_on_the_baseline(fake_stages, tmp_path):
+    baseline = str(tmp_path / 'baseline.json')
+    bench_stages([100], False, None, baseline, 0.25, 0.5, update_baseline=True)
+    with open(baseline) as f:
+        saved = json.load(f)
+    assert [(r['stage'], r['rows'], r['median_ms']) for r in saved['results']] == [
+        ('parse', 100, pytest.approx(11.0)), ('predict', 100, pytest.approx(2.0))]
+
+    # Same timings pass
+    bench_stages([100], False, None, baseline, 0.25, 0.5, update_baseline=False)
+
+    fake_stages['parse'] = [0.020, 0.021, 0.022]
+    with pytest.raises(SystemExit) as exc:
+        bench_stages([100], False, str(tmp_path / 'run.json'), baseline, 0.25, 0.5, update_baseline=False)
+    assert exc.value.code == 1
+    with open(tmp_path / 'run.json') as f:
+        assert json.load(f)['results'][0]['median_ms'] == pytest.approx(21.0)
+
+
+def test_missing_baseline_does_not_fail(fake_stages, tmp_path):
+    bench_stages([100], False, None, str(tmp_path / 'missing.json'), 0.25, 0.5, update_baseline=False)
@@ -0,0 +1,132 @@
+import datetime
+import io
+import json
+import pandas as pd
+import pytest
+import db
+import prediction
+import scoring
+
+
+@pytest.fixture
+def post_csv(client, user):
+    username, token = user
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def post(text, extra_headers=None, **kwargs):
+        return client.post('/api/predict/csv', headers={**headers, **(extra_headers or {})},
+                           content_type='multipart/form-data',
+                           data={"file": (io.BytesIO(text.encode()), 'up.csv')}, **kwargs)
+
+    return username, post
+
+
+def stored(username):
+    return list(db.predictions_collection.find({"username": username}).sort("_id", 1))
+
+
+def test_mixed_utc_offsets_are_stored_in_utc(post_csv):
+    username, post = post_csv
+    response = post("student_id,timestamp,HeartRate,SkinConductance,EEG\n"
+                    "s1,2026-03-02T10:00:00Z,60,1,10\n"
+                    "s1,2026-03-02T10:00:05+02:00,61,1,10\n")
+    assert response.status_code == 200, response.get_json()
+    assert [doc["timestamp"] for doc in stored(username)] == [
+        datetime.datetime(2026, 3, 2, 10, 0, 0), datetime.datetime(2026, 3, 2, 8, 0, 5)]
+
+
+def test_blank_timestamp_among_aware_ones(post_csv):
+    username, post = post_csv
+    before = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    response = post("student_id,timestamp,HeartRate,SkinConductance,EEG\n"
+                    "s1,2026-03-02T10:00:00+01:00,60,1,10\n"
+                    "s1,,61,1,10\n")
+    assert response.status_code == 200, response.get_json()
+    first, blank = [doc["timestamp"] for doc in stored(username)]
+    assert first == datetime.datetime(2026, 3, 2, 9, 0, 0)
+    # Filled with the current time, in UTC like the rest of the column
+    assert before - datetime.timedelta(seconds=1) <= blank <= before + datetime.timedelta(minutes=1)
+
+
+@pytest.mark.parametrize('values,dtype', [
+    (['2026-03-02 10:00:00', '03/02/2026 10:00:05', 'not a date'], 'datetime64[us]'),
+    (['2026-03-02T10:00:00', '2026-03-02T10:00:05+02:00', ''], 'datetime64[us, UTC]'),
+])
+def test_parse_timestamps_fills_with_matching_now(values, dtype):
+    parsed = scoring.parse_timestamps(pd.DataFrame({'timestamp': values}))
+    assert str(parsed.dtype) == dtype
+    assert parsed.notna().all()
+    assert parsed[0] == pd.Timestamp('2026-03-02 10:00:00', tz=parsed.dt.tz)
+
+
+def test_non_numeric_reading_rejects_only_its_row(post_csv):
+    username, post = post_csv
+    response = post("student_id,timestamp,HeartRate,SkinConductance,EEG\n"
+                    "s1,2026-03-02T10:00:00,60,1,10\n"
+                    "s2,2026-03-02T10:00:01,n/a?,1,10\n"
+                    "s3,2026-03-02T10:00:02,61,1,500\n"
+                    "s4,2026-03-02T10:00:03,,1,10\n")
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert [row["student_id"] for row in body["results"]] == ["s1", "s4"]
+    assert body["rejected"] == [
+        {"row": 1, "student_id": "s2", "errors": ["HeartRate must be a number."]},
+        {"row": 2, "student_id": "s3", "errors": ["EEG Alpha Waves must be between 1 and 20 Hz."]},
+    ]
+    assert [doc["student_id"] for doc in stored(username)] == ["s1", "s4"]
+
+
+def readings_csv(rows, bad=()):
+    lines = ["student_id,timestamp,HeartRate,SkinConductance,EEG"]
+    lines += [f"s{i % 4},2026-03-02T10:{i // 60:02d}:{i % 60:02d},{500 if i in bad else 40 + i % 50},1,10"
+              for i in range(rows)]
+    return "\n".join(lines) + "\n"
+
+
+def ndjson(response):
+    assert response.mimetype == 'application/x-ndjson'
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_stream_scores_in_chunks(post_csv, monkeypatch):
+    username, post = post_csv
+    monkeypatch.setattr(prediction, 'CSV_CHUNK_SIZE', 10)
+    response = post(readings_csv(25, bad={3, 17}), query_string={'stream': 'true'})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    pieces = [piece.decode() for piece in response.response]
+    # One piece per 10-row chunk, then the summary
+    assert len(pieces) == 4 and all(piece.endswith("\n") for piece in pieces)
+
+    lines = [json.loads(line) for piece in pieces for line in piece.splitlines()]
+    assert lines[-1] == {"summary": {"accepted": 23, "rejected": 2, "duplicate_rows": 0}}
+    rejected = [line for line in lines[:-1] if "errors" in line]
+    assert [(line["row"], line["student_id"]) for line in rejected] == [(3, "s3"), (17, "s1")]
+    assert all(line["errors"] == ["HRV must be between 20 and 100 ms."] for line in rejected)
+    # Within a chunk, its rejected rows come before its results
+    first_chunk = [json.loads(line) for line in pieces[0].splitlines()]
+    assert "errors" in first_chunk[0] and len(first_chunk) == 10
+    results = [line for line in lines[:-1] if "errors" not in line]
+    assert [line["HeartRate"] for line in results] == [40 + i % 50 for i in range(25) if i not in (3, 17)]
+    assert len(stored(username)) == 23
+
+    # A repeat upload stores nothing new
+    lines = ndjson(post(readings_csv(25, bad={3, 17}), query_string={'stream': '1'}))
+    assert lines[-1] == {"summary": {"accepted": 0, "rejected": 2, "duplicate_rows": 23}}
+    assert len(stored(username)) == 23
+
+
+def test_stream_chosen_by_accept_header(post_csv):
+    username, post = post_csv
+    lines = ndjson(post(readings_csv(5), {"Accept": "application/x-ndjson"}))
+    assert lines[-1]["summary"]["accepted"] == 5
+    assert len(stored(username)) == 5
+
+
+def test_stream_needs_the_columns(post_csv):
+    username, post = post_csv
+    response = post("student_id,HeartRate,EEG\ns1,60,10\n", query_string={'stream': 'true'})
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith("CSV must contain columns")
+    # An empty file has no header row at all
+    assert post("", query_string={'stream': 'true'}).status_code == 400
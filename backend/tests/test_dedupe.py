@@ -0,0 +1,110 @@
+import io
+import pytest
+import db
+import prediction
+from jobs import FINISHED, JobRunner
+
+
+def upload_csv(rows, start=0):
+    lines = ["student_id,timestamp,HeartRate,SkinConductance,EEG"]
+    lines += [f"s{i % 3},2026-03-02T09:{i // 60:02d}:{i % 60:02d},{40 + i % 50},{1 + i % 10},{2 + i % 15}"
+              for i in range(start, start + rows)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+@pytest.fixture
+def uploader(client, user):
+    username, token = user
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def post(data):
+        response = client.post('/api/predict/csv', headers=headers,
+                               data={"file": (io.BytesIO(data), 'up.csv')}, content_type='multipart/form-data')
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()
+
+    return username, headers, post
+
+
+def stored(username):
+    return db.predictions_collection.count_documents({"username": username})
+
+
+def test_identical_upload_is_answered_from_cache(uploader):
+    username, _, post = uploader
+    first = post(upload_csv(30))
+    assert first["duplicates"] == {"file": False, "rows": 0}
+    second = post(upload_csv(30))
+    assert second["duplicates"] == {"file": True, "rows": 30}
+    assert second["results"] == first["results"]
+    assert stored(username) == 30
+
+
+def test_rows_already_stored_are_skipped(uploader):
+    username, _, post = uploader
+    post(upload_csv(20))
+    overlapping = post(upload_csv(20, start=10))
+    assert overlapping["duplicates"] == {"file": False, "rows": 10}
+    assert len(overlapping["results"]) == 10
+    assert stored(username) == 30
+
+
+def test_rows_repeated_within_a_file_are_skipped(uploader):
+    username, _, post = uploader
+    data = upload_csv(10)
+    body = post(data + data.split(b"\n", 1)[1])
+    assert body["duplicates"]["rows"] == 10
+    assert stored(username) == 10
+
+
+def test_delete_invalidates_cached_uploads(client, uploader):
+    username, headers, post = uploader
+    post(upload_csv(12))
+    doc = db.predictions_collection.find_one({"username": username})
+    assert client.delete(f"/api/predict/history/{doc['_id']}", headers=headers).status_code == 200
+
+    again = post(upload_csv(12))
+    # Not a cache hit: the deleted row is scored and stored again
+    assert again["duplicates"] == {"file": False, "rows": 11}
+    assert stored(username) == 12
+
+
+def run_job(username, data, tmp_path):
+    path = tmp_path / 'job.csv'
+    path.write_bytes(data)
+    state = prediction.job_store.create(username, str(path), 'job.csv')
+    runner = JobRunner(prediction.job_store, prediction.score_job_rows, prediction.store_job_documents,
+                       workers=0, chunk_rows=40, required_columns=prediction.expected_columns + ['student_id'])
+    # The store is shared with other tests, whose queued jobs come first
+    while prediction.job_store.load(state["id"])["status"] not in FINISHED and runner.run_next():
+        pass
+    return prediction.job_store.load(state["id"])
+
+
+def test_resubmitted_job_stores_nothing_twice(user, tmp_path):
+    username, _ = user
+    first = run_job(username, upload_csv(99), tmp_path)
+    assert first["status"] == 'done' and first["accepted"] == 99
+    assert stored(username) == 99
+
+    second = run_job(username, upload_csv(99), tmp_path)
+    assert second["status"] == 'done'
+    assert second["duplicate_rows"] == 99 and second["accepted"] == 0
+    assert stored(username) == 99
+
+
+def test_redone_job_chunk_keeps_its_results(user, tmp_path):
+    username, _ = user
+    state = run_job(username, upload_csv(50), tmp_path)
+    # As if the worker died after storing the last chunk but before its checkpoint
+    state.update(status='running', rows_done=40, pages=1, accepted=40)
+    prediction.job_store.save(state)
+    runner = JobRunner(prediction.job_store, prediction.score_job_rows, prediction.store_job_documents,
+                       workers=0, chunk_rows=40, required_columns=prediction.expected_columns + ['student_id'])
+    runner.run_next()
+
+    redone = prediction.job_store.load(state["id"])
+    assert redone["status"] == 'done' and redone["duplicate_rows"] == 0
+    assert redone["already_stored"] == 10
+    assert len(prediction.job_store.read_page(state["id"], 1)["results"]) == 10
+    assert stored(username) == 50
@@ -0,0 +1,126 @@
+import gzip
+import io
+import json
+import brotli
+import msgpack
+import pytest
+from werkzeug.datastructures import Accept, MIMEAccept
+from werkzeug.http import parse_accept_header
+import encoding
+from encoding import COLUMNAR_MIMETYPE, MSGPACK_MIMETYPE, columnar, compress, encode, negotiate
+from test_dedupe import upload_csv
+
+ROWS = [
+    {"student_id": "s1", "predicted_engagement_level": 2, "Feedback": ["Calm"], "TopFeatures": {"EEG": 0.4}},
+    {"student_id": "s2", "predicted_engagement_level": 0, "Feedback": ["Calm"]},
+    {"student_id": "s1", "predicted_engagement_level": 1, "Feedback": ["Tired", "Low HR"], "TopFeatures": {"EEG": 0.4}},
+]
+
+
+def rows_from_columnar(table):
+    """The row dicts a client rebuilds from a columnar() table, dropping absent keys."""
+    rows = [{} for _ in range(table["count"])]
+    for name, values in table["columns"].items():
+        lookup = table["dictionaries"].get(name)
+        for row, value in zip(rows, values):
+            value = lookup[value] if lookup is not None else value
+            if value is not None:
+                row[name] = value
+    return rows
+
+
+def accept(header):
+    return parse_accept_header(header, MIMEAccept)
+
+
+def accept_encoding(header):
+    return parse_accept_header(header, Accept)
+
+
+def test_columnar_dictionary_encodes_repeated_values():
+    table = columnar(ROWS)
+    assert table["dictionaries"]["student_id"] == ["s1", "s2"]
+    assert table["columns"]["student_id"] == [0, 1, 0]
+    assert table["dictionaries"]["Feedback"] == [["Calm"], ["Tired", "Low HR"]]
+    assert table["columns"]["predicted_engagement_level"] == [2, 0, 1]
+    assert rows_from_columnar(table) == ROWS
+
+
+@pytest.mark.parametrize('fmt', ['json', 'columnar', 'msgpack'])
+def test_encode_round_trips(fmt):
+    body = {"count": 3, "results": ROWS}
+    data, mimetype = encode(body, fmt, json.dumps, 'results')
+    decoded = msgpack.unpackb(data) if fmt == 'msgpack' else json.loads(data)
+    if fmt != 'json':
+        decoded["results"] = rows_from_columnar(decoded["results"])
+    assert decoded == body
+    assert mimetype == encoding.FORMATS[fmt]
+
+
+@pytest.mark.parametrize('args,header,expected', [
+    ({}, '', 'json'),
+    ({}, '*/*', 'json'),
+    ({}, COLUMNAR_MIMETYPE, 'columnar'),
+    ({}, 'application/x-msgpack', 'msgpack'),
+    ({}, f'application/json;q=0.5, {MSGPACK_MIMETYPE}', 'msgpack'),
+    ({}, 'text/html', 'json'),
+    ({'format': 'columnar'}, 'application/json', 'columnar'),
+])
+def test_negotiate(args, header, expected):
+    assert negotiate(args, accept(header)) == (expected, None)
+
+
+def test_negotiate_rejects_unknown_and_unavailable_formats(monkeypatch):
+    fmt, error = negotiate({'format': 'xml'}, accept(''))
+    assert fmt is None and 'format must be one of' in error
+    monkeypatch.setattr(encoding, 'msgpack', None)
+    assert negotiate({'format': 'msgpack'}, accept('')) == (None, "MessagePack responses need the msgpack package")
+    # Without msgpack, an Accept header asking for it falls back to JSON
+    assert negotiate({}, accept(MSGPACK_MIMETYPE)) == ('json', None)
+
+
+def test_compress_picks_the_best_accepted_encoding(monkeypatch):
+    data = json.dumps(ROWS * 200).encode()
+    body, content_encoding = compress(data, accept_encoding('gzip, br'))
+    assert content_encoding == 'br' and brotli.decompress(body) == data
+    body, content_encoding = compress(data, accept_encoding('gzip'))
+    assert content_encoding == 'gzip' and gzip.decompress(body) == data
+    assert compress(data, accept_encoding('')) == (data, None)
+    # Small bodies are not worth compressing
+    assert compress(data[:100], accept_encoding('gzip, br')) == (data[:100], None)
+    monkeypatch.setattr(encoding, 'brotli', None)
+    assert compress(data, accept_encoding('br, gzip'))[1] == 'gzip'
+
+
+@pytest.fixture
+def headers(user):
+    return {"Authorization": f"Bearer {user[1]}"}
+
+
+def post_csv(client, headers, **kwargs):
+    return client.post('/api/predict/csv', headers=headers, content_type='multipart/form-data',
+                       data={"file": (io.BytesIO(upload_csv(40)), 'up.csv')}, **kwargs)
+
+
+def test_csv_response_in_every_format(client, headers):
+    plain = post_csv(client, headers)
+    assert plain.mimetype == 'application/json'
+    expected = plain.get_json()
+
+    response = post_csv(client, {**headers, "Accept": MSGPACK_MIMETYPE, "Accept-Encoding": "gzip"})
+    assert response.mimetype == MSGPACK_MIMETYPE
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert {'Accept', 'Accept-Encoding'} <= set(response.vary)
+    body = msgpack.unpackb(gzip.decompress(response.data))
+    assert rows_from_columnar(body.pop("results")) == expected.pop("results")
+
+    response = post_csv(client, headers, query_string={'format': 'columnar'})
+    assert response.mimetype == COLUMNAR_MIMETYPE
+    assert rows_from_columnar(response.get_json()["results"]) == plain.get_json()["results"]
+
+
+def test_unknown_format_is_406(client, headers):
+    response = client.get('/api/predict/history', headers=headers, query_string={'format': 'xml'})
+    assert response.status_code == 406
+    assert 'format must be one of' in response.get_json()["error"]
+    assert post_csv(client, headers, query_string={'format': 'xml'}).status_code == 406
@@ -0,0 +1,68 @@
+import datetime
+import io
+import pytest
+import db
+
+START = datetime.datetime(2026, 4, 6, 9, 0)
+
+
+@pytest.fixture
+def exported(user):
+    username, token = user
+    db.predictions_collection.insert_many([{
+        "username": username,
+        # Numeric ids from a CSV are stored as ints
+        "student_id": 7 if i % 2 else "s1",
+        "timestamp": START + datetime.timedelta(minutes=i),
+        "input_data": {"HeartRate": 60.0 + i, "SkinConductance": 2.5, "EEG": 10.0},
+        "predicted_engagement_level": i % 3,
+        "feedback": "ok",
+        "top_features": ["EEG", "HeartRate"],
+        "severities": {"HeartRate": "normal", "SkinConductance": "low", "EEG": "normal"},
+    } for i in range(7)])
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_csv_export(client, exported, monkeypatch):
+    import prediction
+    monkeypatch.setattr(prediction, 'EXPORT_BATCH_SIZE', 3)
+    response = client.get('/api/predict/export?format=csv', headers=exported, buffered=False)
+    assert response.status_code == 200
+    chunks = [chunk.decode() for chunk in response.response]
+    response.close()
+    # The header, then 3 + 3 + 1 rows
+    assert [chunk.count('\n') for chunk in chunks] == [1, 3, 3, 1]
+    lines = ''.join(chunks).strip().splitlines()
+    assert lines[0].startswith('id,student_id,timestamp,HeartRate')
+    assert len(lines) == 8
+
+
+@pytest.mark.parametrize('student_id,rows', [('7', 3), ('s1', 4), ('7,s1', 7), ('8', 0)])
+def test_export_matches_numeric_student_ids(client, exported, student_id, rows):
+    response = client.get(f'/api/predict/export?format=csv&student_id={student_id}', headers=exported)
+    assert response.status_code == 200
+    assert len(response.get_data(as_text=True).strip().splitlines()) == rows + 1
+
+
+def test_parquet_export_round_trips(client, exported):
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    from export import EXPORT_COLUMNS
+    response = client.get('/api/predict/export?format=parquet', headers=exported)
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.get_data()))
+    assert table.column_names == EXPORT_COLUMNS
+    assert table.num_rows == 7
+    assert table.column('student_id').to_pylist() == ["s1", "7"] * 3 + ["s1"]
+    assert table.column('HeartRate').to_pylist() == [60.0 + i for i in range(7)]
+    assert table.column('top_features').to_pylist() == ["EEG;HeartRate"] * 7
+    assert table.column('timestamp').to_pylist()[0] == START
+
+
+def test_parquet_export_in_batches(user, exported):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    from export import parquet_chunks
+    docs = db.predictions_collection.find({"username": user[0]}).sort("timestamp", 1)
+    data = b''.join(parquet_chunks(docs, batch_size=2))
+    assert pq.ParquetFile(pa.BufferReader(data)).metadata.num_row_groups >= 2
@@ -0,0 +1,154 @@
+import datetime
+import pytest
+from werkzeug.datastructures import MultiDict
+import db
+import scoring
+from bson.objectid import ObjectId
+from scoring import history_find
+
+START = datetime.datetime(2026, 2, 2, 9, 0)
+
+
+def plan_stages(plan):
+    """Every stage name in an explain() winning plan, outermost first."""
+    stages = [plan.get('stage')]
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            stages += plan_stages(plan[key])
+    for child in plan.get('inputStages', []):
+        stages += plan_stages(child)
+    return [stage for stage in stages if stage]
+
+
+@pytest.fixture
+def history(user):
+    """A user's predictions where every timestamp is shared by four documents."""
+    username, token = user
+    db.predictions_collection.insert_many([{
+        "username": username, "student_id": f"s{i % 2}",
+        "timestamp": START + datetime.timedelta(seconds=i // 4),
+        "predicted_engagement_level": i % 3, "input_data": {},
+    } for i in range(22)])
+    return username, {"Authorization": f"Bearer {token}"}
+
+
+def walk(client, url, headers, **query):
+    ids, cursor = [], None
+    while True:
+        if cursor:
+            query['cursor'] = cursor
+        response = client.get(url, headers=headers, query_string=query)
+        assert response.status_code == 200
+        ids += [doc['_id'] for doc in response.get_json()]
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return ids
+
+
+def expected_ids(query, direction):
+    docs = db.predictions_collection.find(query).sort([("timestamp", direction), ("_id", direction)])
+    return [str(doc['_id']) for doc in docs]
+
+
+@pytest.mark.parametrize('order,direction', [('desc', -1), ('asc', 1)])
+@pytest.mark.parametrize('limit', [1, 3, 4, 5])
+def test_pages_through_timestamp_ties(client, history, order, direction, limit):
+    username, headers = history
+    ids = walk(client, '/api/predict/history', headers, limit=limit, order=order)
+    assert ids == expected_ids({"username": username}, direction)
+    assert len(set(ids)) == 22
+
+
+def test_student_pages_through_ties(client, history):
+    username, headers = history
+    ids = walk(client, '/api/predict/history/student/s1', headers, limit=2, fields='student_id')
+    assert ids == expected_ids({"username": username, "student_id": "s1"}, 1)
+    assert len(ids) == 11
+
+
+def test_student_history_matches_numeric_ids(client, user):
+    username, token = user
+    headers = {"Authorization": f"Bearer {token}"}
+    # A CSV with digit-only ids stores them as ints, /manual as the text sent
+    db.predictions_collection.insert_many([{
+        "username": username, "student_id": sid, "timestamp": START + datetime.timedelta(seconds=i),
+        "predicted_engagement_level": 1, "input_data": {},
+    } for i, sid in enumerate([101, 102, "101", 101, "1O1"])])
+    ids = walk(client, '/api/predict/history/student/101', headers, limit=2)
+    assert ids == expected_ids({"username": username, "student_id": {"$in": [101, "101"]}}, 1)
+    assert len(ids) == 3
+
+
+def test_invalid_cursor(client, history):
+    _, headers = history
+    response = client.get('/api/predict/history', headers=headers, query_string={'cursor': 'nope'})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('order,after', [('asc', '$gt'), ('desc', '$lt')])
+def test_cursor_filter_is_keyset_on_timestamp_and_id(order, after):
+    oid = ObjectId()
+    cursor = scoring.encode_cursor({"timestamp": START, "_id": oid})
+    find, error = history_find(MultiDict({'cursor': cursor, 'order': order}), {"username": "u"}, 10, 'desc')
+    assert error is None
+    assert find["filter"] == {"username": "u", "$or": [
+        {"timestamp": {after: START}},
+        {"timestamp": START, "_id": {after: oid}},
+    ]}
+    direction = 1 if order == 'asc' else -1
+    assert find["sort"] == [("timestamp", direction), ("_id", direction)]
+    assert find["limit"] == 11
+
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_cursor_filter_selects_documents_after_the_cursor(history, order):
+    username, _ = history
+    ordered = list(db.predictions_collection.find({"username": username}).sort(
+        [("timestamp", 1 if order == 'asc' else -1), ("_id", 1 if order == 'asc' else -1)]))
+    # A cursor in the middle of a run of equal timestamps
+    i = next(i for i in range(1, len(ordered) - 1)
+             if ordered[i - 1]["timestamp"] == ordered[i]["timestamp"] == ordered[i + 1]["timestamp"])
+    find, _ = history_find(MultiDict({'cursor': scoring.encode_cursor(ordered[i]), 'order': order}),
+                           {"username": username}, 100, 'desc')
+    docs = list(db.predictions_collection.find(find["filter"]).sort(find["sort"]))
+    assert [doc["_id"] for doc in docs] == [doc["_id"] for doc in ordered[i + 1:]]
+
+
+def test_plan_stages_walks_nested_plans():
+    plan = {"stage": "LIMIT", "inputStage": {"stage": "FETCH", "inputStage": {
+        "stage": "SORT_MERGE", "inputStages": [{"stage": "IXSCAN"}, {"stage": "IXSCAN"}]}}}
+    assert plan_stages(plan) == ['LIMIT', 'FETCH', 'SORT_MERGE', 'IXSCAN', 'IXSCAN']
+    assert plan_stages({"queryPlan": {"stage": "COLLSCAN"}}) == ['COLLSCAN']
+
+
+@pytest.fixture(scope='module')
+def mongod():
+    if db.mongomock is not None:
+        pytest.skip("query plans need a real mongod (set MONGO_URI)")
+    try:
+        db.client.admin.command('ping')
+    except Exception as exc:
+        pytest.skip(f"no mongod reachable: {exc}")
+    db.ensure_indexes()
+    return db.predictions_collection
+
+
+@pytest.mark.parametrize('query,index', [
+    ({"username": "plan-user"}, 'username_timestamp'),
+    ({"username": "plan-user", "student_id": "s1"}, 'username_student_timestamp'),
+])
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+@pytest.mark.parametrize('with_cursor', [False, True])
+def test_history_plans_use_index_without_sort(mongod, query, index, order, with_cursor):
+    args = MultiDict({'order': order, 'limit': 50})
+    if with_cursor:
+        args['cursor'] = scoring.encode_cursor({"timestamp": START, "_id": ObjectId()})
+    find, error = history_find(args, query, 50, order)
+    assert error is None
+
+    plan = mongod.find(find["filter"], find["projection"]).sort(find["sort"]).limit(find["limit"]).explain()
+    winning = plan['queryPlanner']['winningPlan']
+    stages = plan_stages(winning)
+    assert 'IXSCAN' in stages
+    assert 'SORT' not in stages and 'COLLSCAN' not in stages
+    assert index in str(winning)
@@ -0,0 +1,64 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from artifacts import current_bundle
+from inference import CompiledForest
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data', 'test.csv')
+
+
+@pytest.fixture(scope='module')
+def bundle():
+    return current_bundle()
+
+
+@pytest.fixture(scope='module')
+def X(bundle):
+    rng = np.random.default_rng(0)
+    synthetic = np.column_stack([rng.uniform(20, 100, 500), rng.uniform(0.01, 20, 500), rng.uniform(1, 20, 500)])
+    return np.vstack([pd.read_csv(DATA)[bundle.features].to_numpy(dtype=float), synthetic])
+
+
+def test_compiled_forest_matches_sklearn(bundle, X):
+    scaled = bundle.scaler.transform(pd.DataFrame(X, columns=bundle.features))
+    np.testing.assert_array_equal(bundle.compiled.predict(X), bundle.model.predict(scaled))
+    np.testing.assert_allclose(bundle.compiled.predict_proba(X), bundle.model.predict_proba(scaled))
+    # Global leaf ids are sklearn's per-tree ids offset by each tree's root
+    np.testing.assert_array_equal(bundle.compiled.apply(bundle.compiled.transform(X)),
+                                  bundle.model.apply(scaled) + bundle.compiled.roots)
+
+
+@pytest.mark.parametrize('rows', [5, 200])
+def test_contributions_add_up_to_the_predicted_probability(bundle, X, rows):
+    # 5 rows take the gather path, 200 the tree-by-tree loop
+    compiled = bundle.compiled
+    X = X[:rows]
+    leaves = compiled.apply(compiled.transform(X))
+    levels = compiled.predict_from_leaves(leaves)
+    class_idx = np.searchsorted(compiled.classes, levels)
+
+    bias = compiled.value[compiled.roots].mean(axis=0)[class_idx]
+    total = bias + compiled.contributions(leaves, levels).sum(axis=1)
+    expected = compiled.proba_from_leaves(leaves)[np.arange(rows), class_idx]
+    np.testing.assert_allclose(total, expected)
+
+
+def test_path_contributions_are_saved_and_mapped(bundle, tmp_path):
+    compiled = CompiledForest.from_estimators(bundle.model, bundle.scaler)
+    compiled.save(str(tmp_path))
+    loaded = CompiledForest.load(str(tmp_path), mmap=True)
+    assert isinstance(loaded.path_contributions, np.memmap)
+    np.testing.assert_array_equal(loaded.path_contributions, compiled.path_contributions)
+
+    # A bundle saved before they were stored computes them at load
+    os.remove(tmp_path / 'path_contributions.npy')
+    legacy = CompiledForest.load(str(tmp_path), mmap=True)
+    np.testing.assert_array_equal(legacy.path_contributions, compiled.path_contributions)
+
+
+def test_model_route_names_the_attribution_method(client, user):
+    body = client.get('/api/predict/model', headers={"Authorization": f"Bearer {user[1]}"}).get_json()
+    assert body["feedback_attribution"] == 'sample'
+    assert body["attribution_method"].startswith("tree-path (Saabas) contributions")
+    assert "approximation of SHAP" in body["attribution_method"]
@@ -0,0 +1,218 @@
+import threading
+import time
+import mongomock
+import pytest
+from jobs import JobRunner, JobStore, row_object_id
+from writer import insert_ignoring_duplicates
+
+ROWS = 25
+
+
+def write_csv(path, rows=ROWS):
+    path.write_text("student_id,value\n" + "".join(f"s{i % 3},{i}\n" for i in range(rows)))
+    return str(path)
+
+
+class Scorer:
+    """score()/store_docs() for a JobRunner, storing into mongomock and failing on request."""
+
+    def __init__(self):
+        self.collection = mongomock.MongoClient().db.predictions
+        self.fail_on_store = []
+
+    def score(self, df, username, ids):
+        docs = [{"_id": row_id, "student_id": sid, "value": int(v)}
+                for row_id, sid, v in zip(ids, df['student_id'], df['value'])]
+        return docs, [{"student_id": doc["student_id"]} for doc in docs], [], 0
+
+    def store_docs(self, docs):
+        if self.fail_on_store:
+            raise self.fail_on_store.pop(0)
+        return len(insert_ignoring_duplicates(self.collection, docs))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / 'jobs'))
+
+
+def runner_for(store, scorer, **kwargs):
+    kwargs.setdefault('retry_seconds', 0)
+    return JobRunner(store, scorer.score, scorer.store_docs, workers=0, chunk_rows=10,
+                     required_columns=['student_id', 'value'], **kwargs)
+
+
+def test_job_resumes_after_worker_stops_mid_job(store, tmp_path):
+    scorer = Scorer()
+    state = store.create('alice', write_csv(tmp_path / 'up.csv'), 'up.csv')
+    first = runner_for(store, scorer)
+    score = scorer.score
+
+    def stop_after_first_chunk(df, username, ids):
+        first._stopping.set()
+        return score(df, username, ids)
+
+    first.score = stop_after_first_chunk
+    first.run_next()
+    interrupted = store.load(state["id"])
+    assert interrupted["status"] == 'running' and interrupted["rows_done"] == 10
+
+    runner_for(store, scorer).run_next()
+    done = store.load(state["id"])
+    assert done["status"] == 'done' and done["rows_done"] == ROWS and done["resumed"] == 1
+    assert scorer.collection.count_documents({}) == ROWS
+
+
+def test_mongo_error_requeues_job_from_checkpoint(store, tmp_path):
+    scorer = Scorer()
+    state = store.create('alice', write_csv(tmp_path / 'up.csv'), 'up.csv')
+    runner = runner_for(store, scorer)
+    original = scorer.store_docs
+    calls = []
+
+    # The first chunk is stored; the second hits the outage
+    def store_docs(docs):
+        calls.append(len(docs))
+        if len(calls) == 2:
+            raise ConnectionError("mongo is down")
+        return original(docs)
+
+    runner.store_docs = store_docs
+    runner.run_next()
+    queued = store.load(state["id"])
+    assert queued["status"] == 'queued'
+    assert queued["rows_done"] == 10 and queued["attempts"] == 1
+    assert queued["error"].startswith('ConnectionError')
+
+    runner.run_next()
+    done = store.load(state["id"])
+    assert done["status"] == 'done' and done["error"] is None
+    assert scorer.collection.count_documents({}) == ROWS
+    assert runner.stats()["retries"] == 1
+
+
+def test_resume_counts_parsed_rows_across_blank_lines_and_quoted_newlines(store, tmp_path):
+    # Blank lines are dropped by pandas and a quoted field spans two lines,
+    # so physical lines and parsed rows disagree from the first chunk on
+    lines = []
+    for i in range(ROWS):
+        lines.append(f"s{i % 3},{i},\"note\nline {i}\"\n" if i % 4 == 0 else f"s{i % 3},{i},plain\n")
+        if i % 5 == 0:
+            lines.append("\n")
+    path = tmp_path / 'up.csv'
+    path.write_text("student_id,value,note\n" + "".join(lines))
+    scorer = Scorer()
+    state = store.create('alice', str(path), 'up.csv')
+
+    runner = runner_for(store, scorer)
+    original = scorer.store_docs
+    calls = []
+
+    # The second chunk hits an outage, so the job resumes from row 10
+    def store_docs(docs):
+        calls.append(len(docs))
+        if len(calls) == 2:
+            raise ConnectionError("mongo is down")
+        return original(docs)
+
+    runner.store_docs = store_docs
+    runner.run_next()
+    assert store.load(state["id"])["rows_done"] == 10
+    runner.run_next()
+
+    done = store.load(state["id"])
+    assert done["status"] == 'done'
+    assert done["total_rows"] == done["rows_done"] == ROWS
+    # Every row stored once, under the _id of its own row number
+    stored = {doc["value"]: doc["_id"] for doc in scorer.collection.find()}
+    assert sorted(stored) == list(range(ROWS))
+    assert all(stored[i] == row_object_id(state["id"], i) for i in range(ROWS))
+    pages = [store.read_page(state["id"], page)["rows"] for page in range(done["pages"])]
+    assert pages == [[0, 10], [10, 20], [20, 25]]
+
+
+def test_retry_waits_for_backoff(store, tmp_path):
+    scorer = Scorer()
+    state = store.create('alice', write_csv(tmp_path / 'up.csv'), 'up.csv')
+    runner = runner_for(store, scorer, retry_seconds=60)
+    scorer.fail_on_store = [ConnectionError("mongo is down")]
+    runner.run_next()
+    assert store.load(state["id"])["status"] == 'queued'
+    assert runner.run_next() is False
+
+
+def test_job_fails_after_max_attempts_and_can_be_requeued(store, tmp_path):
+    scorer = Scorer()
+    state = store.create('alice', write_csv(tmp_path / 'up.csv'), 'up.csv')
+    runner = runner_for(store, scorer, max_attempts=2)
+    scorer.fail_on_store = [ConnectionError("down"), ConnectionError("still down")]
+    runner.run_next()
+    runner.run_next()
+    failed = store.load(state["id"])
+    assert failed["status"] == 'failed' and failed["attempts"] == 2
+
+    assert store.requeue(state["id"])["status"] == 'queued'
+    runner.run_next()
+    assert store.load(state["id"])["status"] == 'done'
+    assert scorer.collection.count_documents({}) == ROWS
+
+
+def test_bad_file_fails_at_once(store, tmp_path):
+    path = tmp_path / 'up.csv'
+    path.write_text("student_id,other\ns1,1\n")
+    state = store.create('alice', str(path), 'up.csv')
+    runner_for(store, Scorer()).run_next()
+    failed = store.load(state["id"])
+    assert failed["status"] == 'failed' and 'missing columns' in failed["error"]
+    assert store.requeue('0' * 32) is None
+
+
+def test_worker_survives_job_deleted_mid_run(store, tmp_path):
+    scorer = Scorer()
+    doomed = store.create('alice', write_csv(tmp_path / 'a.csv'), 'a.csv')
+    time.sleep(0.01)
+    later = store.create('alice', write_csv(tmp_path / 'b.csv'), 'b.csv')
+    original = scorer.store_docs
+
+    def store_docs(docs):
+        if store.exists(doomed["id"]):
+            store.remove(doomed["id"])
+        return original(docs)
+
+    runner = JobRunner(store, scorer.score, store_docs, workers=1, chunk_rows=10, poll_seconds=0.05)
+    try:
+        deadline = time.monotonic() + 5
+        while (store.load(later["id"]) or {}).get("status") != 'done' and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert store.load(later["id"])["status"] == 'done'
+        assert store.load(doomed["id"]) is None
+        assert all(thread.is_alive() for thread in runner._threads)
+    finally:
+        runner.stop(timeout=5)
+
+
+def test_delete_route_removes_job_under_claim(client, user, tmp_path):
+    import prediction
+    username, token = user
+    state = prediction.job_store.create(username, write_csv(tmp_path / 'up.csv'), 'up.csv')
+    response = client.delete(f"/api/predict/jobs/{state['id']}", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert prediction.job_store.load(state["id"]) is None
+    # The claim was released after removal
+    assert prediction.job_store.claim(state["id"]) is None
+    assert not prediction.job_store._claimed
+
+
+def test_retry_route(client, user, tmp_path):
+    import prediction
+    username, token = user
+    headers = {"Authorization": f"Bearer {token}"}
+    state = prediction.job_store.create(username, write_csv(tmp_path / 'up.csv'), 'up.csv')
+    assert client.post(f"/api/predict/jobs/{state['id']}/retry", headers=headers).status_code == 409
+
+    state.update(status='failed', attempts=5, error="ServerSelectionTimeoutError: down")
+    prediction.job_store.save(state)
+    response = client.post(f"/api/predict/jobs/{state['id']}/retry", headers=headers)
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body["status"] == 'queued' and body["attempts"] == 0
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+import lookup
+from artifacts import current_bundle
+from lookup import LookupTable, parse_grid_spec
+
+
+@pytest.fixture(scope='module')
+def bundle():
+    return current_bundle()
+
+
+def grid_mesh(shape):
+    axes = LookupTable.grid_points(shape)
+    return np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, len(axes))
+
+
+def test_levels_match_exact_predictions_at_grid_nodes(bundle):
+    shape = (9, 7, 5)
+    table = LookupTable.build(bundle.predict_exact, shape)
+    mesh = grid_mesh(shape)
+    np.testing.assert_array_equal(table.predict(mesh), bundle.predict_exact(mesh))
+
+
+def test_readings_snap_to_the_nearest_node():
+    table = LookupTable(np.arange(2 * 3 * 2, dtype=np.uint8).reshape(2, 3, 2))
+    # HeartRate 20..100 in 2 steps, SkinConductance 0.01..20 geometric in 3, EEG 1..20 in 2
+    assert table.predict([[30.0, 0.02, 19.0], [90.0, 0.45, 2.0]]).tolist() == [1, 8]
+    # Out-of-box readings are clipped to the edge
+    assert table.predict([[500.0, 100.0, -1.0]]).tolist() == [10]
+
+
+def test_grid_spec():
+    assert parse_grid_spec("128") == (128, 128, 128)
+    assert parse_grid_spec("96,256,64") == (96, 256, 64)
+    with pytest.raises(ValueError):
+        parse_grid_spec("1")
+
+
+def test_cached_table_is_keyed_on_scaler_model_and_axes(tmp_path, monkeypatch):
+    scaler, model = tmp_path / 'scaler.pkl', tmp_path / 'model.pkl'
+    scaler.write_bytes(b'scaler v1')
+    model.write_bytes(b'model v1')
+    paths = [str(scaler), str(model)]
+    shape = (2, 2, 2)
+
+    first = LookupTable.load_or_build(lambda X: np.zeros(len(X)), shape, str(tmp_path / 'cache'), paths)
+    assert first.table.max() == 0
+    # Same bytes: served from the cache, not rebuilt
+    cached = LookupTable.load_or_build(lambda X: np.ones(len(X)), shape, str(tmp_path / 'cache'), paths)
+    assert cached.table.max() == 0
+
+    # Same model, new scaler: rebuilt
+    scaler.write_bytes(b'scaler v2')
+    rescaled = LookupTable.load_or_build(lambda X: np.ones(len(X)), shape, str(tmp_path / 'cache'), paths)
+    assert rescaled.table.min() == 1
+
+    # Same files, different grid bounds: rebuilt
+    key = LookupTable.cache_key(paths, shape)
+    monkeypatch.setattr(lookup, 'GRID_AXES', [('HeartRate', 30.0, 90.0, False)] + lookup.GRID_AXES[1:])
+    assert LookupTable.cache_key(paths, shape) != key
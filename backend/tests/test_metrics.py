@@ -0,0 +1,89 @@
+import io
+import re
+import pytest
+import metrics
+from metrics import Histogram
+from test_dedupe import upload_csv
+
+
+def sample(text, name, **labels):
+    """Value of one exposed series, or 0 when it has not been observed yet."""
+    wanted = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    for line in text.splitlines():
+        series, _, value = line.rpartition(' ')
+        if series == f"{name}{{{wanted}}}":
+            return float(value)
+    return 0.0
+
+
+def upload(client, user, rows=12):
+    _, token = user
+    return client.post('/api/predict/csv', headers={"Authorization": f"Bearer {token}"},
+                       data={"file": (io.BytesIO(upload_csv(rows)), 'up.csv')}, content_type='multipart/form-data')
+
+
+def test_server_timing_lists_the_request_stages(client, user):
+    response = upload(client, user)
+    assert response.status_code == 200
+    stages = dict(re.fullmatch(r"(\w+);dur=(\d+\.\d{3})", part).groups()
+                  for part in response.headers['Server-Timing'].split(', '))
+    assert {'upload', 'parse', 'serialize', 'total'} <= set(stages)
+    assert list(stages)[-1] == 'total'
+    # Each stage ran inside the request
+    assert all(float(stages[name]) <= float(stages['total']) for name in stages)
+
+
+def test_metrics_counts_requests_and_stages(client, user):
+    before = client.get('/metrics').get_data(as_text=True)
+    upload(client, user)
+    upload(client, user)
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert '# TYPE focus_request_seconds histogram' in text
+
+    request_labels = dict(endpoint='prediction.csv_predict', method='POST', status='200')
+    assert sample(text, 'focus_request_seconds_count', **request_labels) == \
+        sample(before, 'focus_request_seconds_count', **request_labels) + 2
+    # The repeated upload is answered from the upload cache, but is still read
+    stage_labels = dict(endpoint='prediction.csv_predict', stage='upload')
+    assert sample(text, 'focus_stage_seconds_count', **stage_labels) == \
+        sample(before, 'focus_stage_seconds_count', **stage_labels) + 2
+    # The +Inf bucket holds every observation
+    assert sample(text, 'focus_request_seconds_bucket', **request_labels, le='+Inf') == \
+        sample(text, 'focus_request_seconds_count', **request_labels)
+
+
+def test_metrics_token(client, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_TOKEN', 'scrape-secret')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get('/metrics', headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('h_seconds', "test", ('endpoint',), buckets=(0.001, 0.01))
+    for value in (0.0005, 0.001, 0.005, 2.0):
+        histogram.observe(('a',), value)
+    assert histogram.expose() == [
+        '# HELP h_seconds test',
+        '# TYPE h_seconds histogram',
+        'h_seconds_bucket{endpoint="a",le="0.001"} 2',
+        'h_seconds_bucket{endpoint="a",le="0.01"} 3',
+        'h_seconds_bucket{endpoint="a",le="+Inf"} 4',
+        'h_seconds_sum{endpoint="a"} 2.0065',
+        'h_seconds_count{endpoint="a"} 4',
+    ]
+
+
+@pytest.mark.parametrize('stages,expected', [
+    ([('parse', 0.001), ('predict', 0.002), ('parse', 0.003)], ['parse;dur=4.000', 'predict;dur=2.000']),
+    ([], []),
+])
+def test_repeated_stages_are_summed(stages, expected):
+    state = metrics.RequestTimings('e', 'GET')
+    state.stages = stages
+    parts = metrics.server_timing(state).split(', ')
+    assert parts[:-1] == expected
+    assert parts[-1].startswith('total;dur=')
@@ -0,0 +1,160 @@
+import datetime
+import io
+import mongomock
+import pytest
+import db
+import scoring
+from rollups import apply_rollups, rebuild, rollup_increments
+
+DAY = datetime.datetime(2026, 4, 6, 9, 30)
+
+
+def prediction(student_id, level, hr, hours=0, username='u1', severity='normal'):
+    return {
+        "username": username, "student_id": student_id, "predicted_engagement_level": level,
+        "input_data": {"HeartRate": hr, "SkinConductance": 1.0, "EEG": 10.0},
+        "severities": {"HeartRate": severity},
+        "timestamp": DAY + datetime.timedelta(hours=hours),
+    }
+
+
+DOCS = [prediction('s1', 2, 60.0), prediction('s1', 0, 70.0, hours=1, severity='mild'),
+        prediction('s1', 2, 80.0, hours=24), prediction('s2', 1, 50.0)]
+
+
+@pytest.fixture
+def collections():
+    database = mongomock.MongoClient().db
+    return database.predictions, database.rollups
+
+
+def rollup(collection, student_id, day):
+    return collection.find_one({"username": "u1", "student_id": student_id, "day": day}, {"_id": 0})
+
+
+def test_increments_group_by_student_and_day():
+    increments = rollup_increments(DOCS)
+    assert sorted(increments) == [('u1', 's1', '2026-04-06'), ('u1', 's1', '2026-04-07'), ('u1', 's2', '2026-04-06')]
+    assert increments[('u1', 's1', '2026-04-06')] == {
+        'count': 2, 'levels.2': 1, 'levels.0': 1,
+        'hours.09.count': 1, 'hours.09.levels.2': 1, 'hours.10.count': 1, 'hours.10.levels.0': 1,
+        'severity.HeartRate.normal': 1, 'severity.HeartRate.mild': 1,
+        'sum.HeartRate': 130.0, 'sumsq.HeartRate': 60.0 ** 2 + 70.0 ** 2,
+        'sum.SkinConductance': 2.0, 'sumsq.SkinConductance': 2.0,
+        'sum.EEG': 20.0, 'sumsq.EEG': 200.0,
+    }
+    assert rollup_increments(DOCS[:1], sign=-1)[('u1', 's1', '2026-04-06')]['sum.HeartRate'] == -60.0
+
+
+def test_apply_and_take_back_out(collections):
+    _, rollups = collections
+    apply_rollups(rollups, DOCS[:2])
+    apply_rollups(rollups, DOCS[2:])
+    assert rollups.count_documents({}) == 3
+    day = rollup(rollups, 's1', '2026-04-06')
+    assert day['count'] == 2 and day['levels'] == {'2': 1, '0': 1}
+    assert day['sum']['HeartRate'] == 130.0
+
+    # A deleted prediction is taken back out of its day
+    apply_rollups(rollups, [DOCS[1]], sign=-1)
+    day = rollup(rollups, 's1', '2026-04-06')
+    assert day['count'] == 1 and day['levels'] == {'2': 1, '0': 0}
+    assert day['sum']['HeartRate'] == 60.0 and day['sumsq']['HeartRate'] == 3600.0
+    assert day['hours']['10'] == {'count': 0, 'levels': {'0': 0}}
+    assert day['severity']['HeartRate'] == {'normal': 1, 'mild': 0}
+    assert rollup(rollups, 's1', '2026-04-07')['count'] == 1
+
+
+def test_rebuild_matches_incremental_rollups(collections):
+    predictions, rollups = collections
+    others = [prediction('s1', 1, 55.0, username='u2')]
+    predictions.insert_many([dict(doc) for doc in DOCS + others])
+    apply_rollups(rollups, DOCS + others)
+    expected = sorted(rollups.find({}, {"_id": 0}), key=lambda r: (r['username'], r['student_id'], r['day']))
+
+    # A stale rollup is replaced, and only the given user's are touched
+    rollups.update_one({"username": "u1", "student_id": "s2"}, {"$inc": {"count": 5}})
+    assert rebuild(predictions, rollups, username='u1', batch_size=3) == 4
+    rebuilt = sorted(rollups.find({}, {"_id": 0}), key=lambda r: (r['username'], r['student_id'], r['day']))
+    assert rebuilt == expected
+    assert rebuild(predictions, rollups) == 5
+
+
+@pytest.fixture
+def numeric_ids(client, user):
+    """An upload whose student ids are all digits, so they are stored as ints."""
+    username, token = user
+    headers = {"Authorization": f"Bearer {token}"}
+    lines = ["student_id,timestamp,HeartRate,SkinConductance,EEG"]
+    lines += [f"{101 + i % 2},2026-04-0{6 + i // 10}T{8 + i % 5:02d}:00:{i:02d},{40 + i * 3 % 50},{1 + i % 7},{2 + i % 15}"
+              for i in range(20)]
+    response = client.post('/api/predict/csv', headers=headers, content_type='multipart/form-data',
+                           data={"file": (io.BytesIO(("\n".join(lines) + "\n").encode()), 'ids.csv')})
+    assert response.status_code == 200, response.get_json()
+    return username, headers
+
+
+def raw_days(username, student_id):
+    pipeline = [
+        {"$match": {"username": username, "student_id": student_id}},
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+            "count": {"$sum": 1},
+            "hr": {"$avg": "$input_data.HeartRate"},
+            "high": {"$sum": {"$cond": [{"$eq": ["$predicted_engagement_level", 2]}, 1, 0]}},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+    return [(row["_id"], row["count"], row["hr"], row["high"])
+            for row in db.predictions_collection.aggregate(pipeline)]
+
+
+def summary_days(body):
+    return [(day["day"], day["count"], day["mean"]["HeartRate"], day["levels"]["2"]) for day in body["days"]]
+
+
+def test_summary_matches_raw_aggregation_for_numeric_ids(client, numeric_ids):
+    username, headers = numeric_ids
+    body = client.get('/api/predict/summary/101', headers=headers).get_json()
+    expected = raw_days(username, 101)
+    assert [row[:2] for row in expected] == [('2026-04-06', 5), ('2026-04-07', 5)]
+    assert summary_days(body) == pytest.approx(expected)
+    assert body["total"]["count"] == 10
+
+    body = client.get('/api/predict/summary/101', headers=headers, query_string={'from': '2026-04-07'}).get_json()
+    assert summary_days(body) == pytest.approx(expected[1:])
+
+
+def test_summary_after_delete(client, numeric_ids):
+    username, headers = numeric_ids
+    doc = db.predictions_collection.find_one({"username": username, "student_id": 102})
+    assert client.delete(f"/api/predict/history/{doc['_id']}", headers=headers).status_code == 200
+    body = client.get('/api/predict/summary/102', headers=headers).get_json()
+    assert summary_days(body) == pytest.approx(raw_days(username, 102))
+    assert body["total"]["count"] == 9
+
+
+def test_summary_adds_up_text_and_numeric_ids(client, numeric_ids):
+    username, headers = numeric_ids
+    # /manual stores the id as sent, so the same student also has a text-keyed rollup
+    response = client.post('/api/predict/manual', headers=headers,
+                           json={"student_id": "101", "HeartRate": 60, "SkinConductance": 2, "EEG": 9})
+    assert response.status_code == 200
+    body = client.get('/api/predict/summary/101', headers=headers).get_json()
+    assert body["total"]["count"] == 11
+    assert len({day["day"] for day in body["days"]}) == len(body["days"])
+    assert sum(day["count"] for day in body["days"]) == 11
+
+
+def test_same_day_rollups_of_one_student_are_added_up(collections):
+    _, rollups = collections
+    apply_rollups(rollups, [prediction('101', 0, 60.0), prediction(101, 2, 80.0, hours=1), prediction(101, 2, 70.0)])
+    query, error = scoring.summary_query({}, 'u1', '101')
+    assert error is None
+    body = scoring.summary_body('101', list(rollups.find(query, {"_id": 0}).sort("day", 1)))
+    [day] = body["days"]
+    assert day["day"] == '2026-04-06' and day["count"] == 3
+    assert day["levels"] == {'0': 1, '1': 0, '2': 2}
+    assert day["mean"]["HeartRate"] == pytest.approx(70.0)
+    assert day["hours"] == {'09': {'count': 2, 'levels': {'0': 1, '2': 1}}, '10': {'count': 1, 'levels': {'2': 1}}}
+    assert body["total"]["count"] == 3 and "hours" not in body["total"]
@@ -0,0 +1,154 @@
+import datetime
+import json
+import time
+import pytest
+import prediction
+from streaming import RingBuffer, StreamHub
+
+
+def test_stream_routes_refuse_several_workers(client, user, monkeypatch):
+    username, token = user
+    headers = {"Authorization": f"Bearer {token}"}
+    monkeypatch.setattr(prediction, 'STREAM_SERVER_PROCESSES', 3)
+    assert client.get('/api/predict/stream/stats', headers=headers).status_code == 503
+    assert client.get(f'/api/predict/stream/updates?token={token}').status_code == 503
+
+    monkeypatch.setattr(prediction, 'STREAM_SERVER_PROCESSES', 1)
+    assert client.get('/api/predict/stream/stats', headers=headers).status_code == 200
+
+
+def test_ingest_is_scored_into_the_ring_and_published(client, user):
+    username, token = user
+    headers = {"Authorization": f"Bearer {token}"}
+    updates = client.get(f'/api/predict/stream/updates?token={token}&student_id=live1')
+    events = iter(updates.response)
+    assert next(events) == b": connected\n\n"
+
+    samples = [{"student_id": "live1", "timestamp": f"2026-05-04T09:00:0{i}", "HeartRate": 60 + i,
+                "SkinConductance": 2, "EEG": 9} for i in range(3)]
+    body = "\n".join(json.dumps(sample) for sample in samples + [{"student_id": "other", "HeartRate": 61}])
+    response = client.post('/api/predict/stream/ingest', headers=headers, data=body + "\nnot json\n")
+    assert response.get_json() == {"accepted": 4, "invalid": 1}
+
+    received = [json.loads(next(events).removeprefix(b"data: ")) for _ in samples]
+    assert [update["HeartRate"] for update in received] == [60, 61, 62]
+    assert [update["window"] for update in received] == [1, 2, 3]
+    assert all(update["student_id"] == "live1" for update in received)
+    updates.close()
+
+    snapshot = client.get('/api/predict/stream/students/live1', headers=headers).get_json()
+    assert snapshot["HeartRate"] == [60.0, 61.0, 62.0]
+    assert snapshot["levels"] == [update["PredictedEngagementLevel"] for update in received]
+    assert snapshot["rolling_engagement"] == pytest.approx(received[-1]["rolling_engagement"])
+    assert client.get('/api/predict/stream/students/nobody', headers=headers).status_code == 404
+
+
+def test_ring_buffer_wraps_around():
+    ring = RingBuffer(4)
+    for i in range(6):
+        ring.append([i, i, i], i % 3, datetime.datetime(2026, 5, 4, 9, 0, i))
+    assert ring.count == 4 and ring.head == 2
+    # Samples 4 and 5 overwrote 0 and 1
+    assert ring.features[:, 0].tolist() == [4, 5, 2, 3]
+    assert ring.rolling_engagement() == pytest.approx((2 + 0 + 1 + 2) / 4)
+    assert RingBuffer(4).rolling_engagement() is None
+
+
+def fake_score(username, samples):
+    """score_fn for a StreamHub: every sample is kept, at engagement level HeartRate % 3."""
+    records = [{**sample, "PredictedEngagementLevel": int(sample["HeartRate"]) % 3,
+                "timestamp": datetime.datetime(2026, 5, 4, 9, 0, 0) + datetime.timedelta(seconds=sample["HeartRate"])}
+               for sample in samples if sample["HeartRate"] >= 0]
+    return records, [sample for sample in samples if sample["HeartRate"] < 0]
+
+
+def sample(student_id, n):
+    return {"student_id": student_id, "HeartRate": n, "SkinConductance": 1.0, "EEG": 10.0}
+
+
+def wait_scored(hub, n, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while hub.scored + hub.rejected < n:
+        assert time.monotonic() < deadline, hub.stats()
+        time.sleep(0.005)
+
+
+def test_snapshot_is_oldest_first_after_wraparound():
+    hub = StreamHub(fake_score, ring_size=5, batch_ms=5)
+    hub.ingest('u', [sample('s1', n) for n in range(12)] + [sample('s1', -1)])
+    wait_scored(hub, 13)
+    snapshot = hub.snapshot('u', 's1')
+    assert snapshot["HeartRate"] == [7.0, 8.0, 9.0, 10.0, 11.0]
+    assert snapshot["levels"] == [1, 2, 0, 1, 2]
+    assert snapshot["timestamp"] == [f"2026-05-04T09:00:{n:02d}.000" for n in range(7, 12)]
+    assert snapshot["rolling_engagement"] == pytest.approx(6 / 5)
+    assert hub.stats()["rejected"] == 1
+    assert hub.snapshot('u', 's2') is None and hub.snapshot('other', 's1') is None
+
+
+def test_subscribers_get_their_own_students_and_slow_ones_drop_the_oldest():
+    hub = StreamHub(fake_score, batch_ms=5, subscriber_queue=3)
+    everyone = hub.subscribe('u')
+    only_s2 = hub.subscribe('u', ['s2'])
+    other_user = hub.subscribe('v')
+    hub.ingest('u', [sample(f"s{n % 2 + 1}", n) for n in range(6)])
+    wait_scored(hub, 6)
+
+    received = [everyone.queue.get_nowait()["HeartRate"] for _ in range(everyone.queue.qsize())]
+    assert received == [3, 4, 5] and everyone.dropped == 3
+    assert [only_s2.queue.get_nowait()["HeartRate"] for _ in range(3)] == [1, 3, 5]
+    assert other_user.queue.empty()
+
+    hub.unsubscribe(everyone)
+    hub.ingest('u', [sample('s1', 10)])
+    wait_scored(hub, 7)
+    assert everyone.queue.empty()
+    assert hub.stats()["subscribers"] == 2
+
+
+def test_least_recently_active_students_are_evicted():
+    hub = StreamHub(fake_score, ring_size=4, batch_ms=5, max_students=2)
+    hub.ingest('u', [sample('a', 1), sample('b', 1)])
+    wait_scored(hub, 2)
+    hub.ingest('u', [sample('a', 2)])
+    wait_scored(hub, 3)
+    # b is now the least recently active
+    hub.ingest('u', [sample('c', 1)])
+    wait_scored(hub, 4)
+    assert hub.snapshot('u', 'b') is None
+    assert hub.snapshot('u', 'a')["HeartRate"] == [1.0, 2.0]
+    assert hub.snapshot('u', 'c')["HeartRate"] == [1.0]
+    assert hub.stats()["evicted"] == 1
+
+
+def test_idle_students_are_evicted():
+    hub = StreamHub(fake_score, batch_ms=5, idle_seconds=0.05)
+    hub.ingest('u', [sample('a', 1)])
+    wait_scored(hub, 1)
+    deadline = time.monotonic() + 5
+    while hub.snapshot('u', 'a') is not None:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert hub.stats()["active_students"] == 0
+
+
+def test_memory_stays_bounded_under_sustained_ingest():
+    hub = StreamHub(fake_score, ring_size=16, batch_ms=1, max_batch=64, max_pending=256, max_students=10)
+    ring_bytes = RingBuffer(16).nbytes
+    for burst in range(20):
+        accepted = hub.ingest('u', [sample(f"s{(burst * 500 + n) % 40}", n) for n in range(500)])
+        assert accepted == 500
+        assert len(hub._pending) <= 256
+    wait_scored(hub, 20 * 500)
+    stats = hub.stats()
+    assert stats["active_students"] == 10
+    assert stats["ring_bytes"] == 10 * ring_bytes
+    assert stats["pending"] == 0
+    assert stats["evicted"] >= 30
+
+
+def test_ingest_gives_up_when_the_queue_stays_full():
+    hub = StreamHub(lambda username, samples: time.sleep(0.5) or ([], []), batch_ms=1, max_batch=1, max_pending=2)
+    hub.ingest('u', [sample('a', 0)])
+    time.sleep(0.05)  # the scorer is now busy with that sample
+    assert hub.ingest('u', [sample('a', n) for n in range(5)], timeout=0.1) == 2
@@ -0,0 +1,40 @@
+import datetime
+import pytest
+import prediction
+from db import predictions_collection
+
+
+@pytest.fixture
+def readings(user):
+    username, token = user
+    start = datetime.datetime(2026, 1, 5, 9, 0)
+    predictions_collection.insert_many([{
+        "username": username, "student_id": "s1", "timestamp": start + datetime.timedelta(minutes=i),
+        "predicted_engagement_level": i % 3,
+        "input_data": {"HeartRate": 70.0 + i, "SkinConductance": 5.0, "EEG": 10.0},
+    } for i in range(5)])
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_fixed_window(client, readings):
+    response = client.get('/api/predict/trend?window=15min&points=3', headers=readings)
+    assert response.status_code == 200
+    student, = response.get_json()["students"]
+    assert student["raw_points"] == 5 and len(student["timestamp"]) == 3
+
+
+@pytest.mark.parametrize('window', ['1W', '1ME', 'soon'])
+def test_calendar_or_bad_window_is_rejected(client, readings, window):
+    response = client.get(f'/api/predict/trend?window={window}', headers=readings)
+    assert response.status_code == 400
+    assert 'fixed offset' in response.get_json()["error"]
+
+
+def test_documents_read_are_capped(client, readings, monkeypatch):
+    monkeypatch.setattr(prediction, 'TREND_MAX_DOCS', 4)
+    response = client.get('/api/predict/trend', headers=readings)
+    assert response.status_code == 400
+    assert 'narrow from/to' in response.get_json()["error"]
+
+    response = client.get('/api/predict/trend?from=2026-01-05T09:01:00', headers=readings)
+    assert response.status_code == 200
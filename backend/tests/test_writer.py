@@ -0,0 +1,87 @@
+import os
+import time
+import mongomock
+import pytest
+from bson import json_util
+from bson.objectid import ObjectId
+from writer import WriteBehindWriter, fcntl
+
+
+def write_segment(spill_dir, owner, docs):
+    path = os.path.join(spill_dir, f"predictions-{owner}-1.spill")
+    with open(path, 'w') as f:
+        f.writelines(json_util.dumps(doc) + '\n' for doc in docs)
+    return path
+
+
+def test_segment_of_crashed_process_with_same_pid_is_replayed(tmp_path):
+    # The crashed process had this PID too (PID 1 in a container)
+    path = write_segment(str(tmp_path), os.getpid(), [{"_id": ObjectId(), "n": 1}])
+    open(tmp_path / f"writer-{os.getpid()}.lock", 'w').close()
+    collection = mongomock.MongoClient().db.predictions
+
+    writer = WriteBehindWriter(collection, spill_dir=str(tmp_path))
+    writer.close()
+    assert writer.replayed == 1
+    assert collection.count_documents({}) == 1
+    assert not os.path.exists(path)
+
+
+def test_segment_of_dead_writer_is_replayed_once(tmp_path):
+    doc = {"_id": ObjectId(), "n": 1}
+    write_segment(str(tmp_path), 'ab' * 16, [doc])
+    collection = mongomock.MongoClient().db.predictions
+    collection.insert_one(dict(doc))
+
+    writer = WriteBehindWriter(collection, spill_dir=str(tmp_path))
+    writer.close()
+    assert writer.replayed == 1
+    assert collection.count_documents({}) == 1
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.skipif(fcntl is None, reason="needs flock")
+def test_live_writer_segments_are_not_replayed(tmp_path):
+    class Down:
+        def insert_many(self, docs, ordered=True):
+            raise ConnectionError("mongo is down")
+
+    live = WriteBehindWriter(Down(), spill_dir=str(tmp_path), flush_ms=10_000)
+    live.submit([{"n": 1}])
+    collection = mongomock.MongoClient().db.predictions
+
+    other = WriteBehindWriter(collection, spill_dir=str(tmp_path))
+    other.close()
+    assert other.replayed == 0
+    assert any(name.startswith(f"predictions-{live.instance}-") for name in os.listdir(tmp_path))
+
+
+def test_replay_failure_at_startup_is_retried_in_the_background(tmp_path):
+    class Flaky:
+        """Down for the first two inserts, then a working collection."""
+        def __init__(self):
+            self.calls = 0
+            self.collection = mongomock.MongoClient().db.predictions
+
+        def insert_many(self, docs, ordered=True):
+            self.calls += 1
+            if self.calls <= 2:
+                raise ConnectionError("mongo is down")
+            return self.collection.insert_many(docs, ordered=ordered)
+
+    path = write_segment(str(tmp_path), 'cd' * 16, [{"_id": ObjectId(), "n": 1}])
+    flaky = Flaky()
+
+    # Does not raise although Mongo is down
+    writer = WriteBehindWriter(flaky, spill_dir=str(tmp_path), flush_ms=10)
+    writer.submit([{"n": 2}])
+    deadline = time.monotonic() + 5
+    while writer.stats()["replay_pending"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    writer.close()
+
+    stats = writer.stats()
+    assert stats["replayed"] == 1 and not stats["replay_pending"]
+    assert stats["replay_failures"] >= 1 and 'mongo is down' in stats["last_replay_error"]
+    assert flaky.collection.count_documents({}) == 2
+    assert not os.path.exists(path)
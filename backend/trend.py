@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+TREND_SERIES = ['engagement', 'HeartRate', 'SkinConductance', 'EEG']
+
+
+def lttb_indices(x, y, n_out):
+    """Positions of the points Largest-Triangle-Three-Buckets keeps out of (x, y).
+
+    The first and last points are always kept; every bucket in between
+    contributes the point forming the largest triangle with the previous
+    pick and the mean of the next bucket, which preserves peaks and dips.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n) if n_out >= n else np.array([0, n - 1][:max(n_out, 0)], dtype=np.intp)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Bucket edges over the interior points 1 .. n-2
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    picked = np.empty(n_out, dtype=np.intp)
+    picked[0], picked[-1] = 0, n - 1
+
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs(
+            (x[prev] - next_x) * (y[start:end] - y[prev])
+            - (x[prev] - x[start:end]) * (next_y - y[prev])
+        )
+        prev = start + int(np.argmax(area))
+        picked[i + 1] = prev
+    return picked
+
+
+def student_trend(frame, window, points):
+    """Rolling means over a time window for one student's predictions, downsampled.
+
+    ``frame`` has a sorted DatetimeIndex and engagement/sensor columns. The
+    rolling engagement drives LTTB and every series is sampled at the same
+    timestamps so they stay aligned.
+    """
+    rolled = frame[TREND_SERIES].rolling(window, min_periods=1).mean()
+    x = rolled.index.asi8
+    keep = lttb_indices(x, rolled['engagement'].to_numpy(), points)
+    sampled = rolled.iloc[keep]
+    return {
+        "raw_points": len(frame),
+        "timestamp": [ts.isoformat() for ts in sampled.index],
+        **{name: sampled[name].round(4).tolist() for name in TREND_SERIES},
+    }
+
+
+def trend_frames(docs):
+    """{student_id: frame} from projected prediction documents sorted by timestamp."""
+    if not docs:
+        return {}
+    frame = pd.DataFrame({
+        'student_id': [doc['student_id'] for doc in docs],
+        'engagement': np.array([doc['predicted_engagement_level'] for doc in docs], dtype=float),
+        **{col: np.array([doc['input_data'][col] for doc in docs], dtype=float)
+           for col in TREND_SERIES[1:]},
+    }, index=pd.DatetimeIndex([doc['timestamp'] for doc in docs], name='timestamp'))
+    return {student_id: group.drop(columns='student_id') for student_id, group in frame.groupby('student_id', sort=True)}
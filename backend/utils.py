@@ -1,22 +1,281 @@
 import jwt
 import datetime
+import functools
+import hashlib
 import os
+import threading
+import time
+import uuid
+import asyncio
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from flask import request, jsonify
+from metrics import timed
 
 JWT_SECRET = os.getenv("JWT_SECRET", "your_jwt_secret")
 JWT_ALGORITHM = "HS256"
 JWT_EXP_DELTA_SECONDS = 3600 * 24  # 24 hours
 
+# Verified tokens are remembered for up to TOKEN_CACHE_TTL seconds (never past
+# their own expiry), so repeated requests skip the signature check
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", 300))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10_000))
+# Revocations (logout, password change) are kept in Mongo; each worker process
+# holds all of them in memory and re-reads the collection with one query at
+# most every REVOCATION_CACHE_TTL seconds: the longest any other worker keeps
+# accepting a token after it is revoked
+REVOCATION_CACHE_TTL = float(os.getenv("REVOCATION_CACHE_TTL", 5))
+# Threads the async app (async_app.py) runs CPU-bound work on: password
+# hashing, scaling and the forest. Bounds how much of it runs at once
+ASYNC_CPU_WORKERS = int(os.getenv("ASYNC_CPU_WORKERS", os.cpu_count() or 1))
+
+
+class TTLCache:
+    """Bounded LRU whose entries also expire after a per-entry deadline."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return entry[0] if entry is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "max_size": self.max_size, "ttl_seconds": self.ttl,
+                    "hits": self.hits, "misses": self.misses}
+
+
+class RevocationCache:
+    """Every revocation in db.revoked_tokens, held per process and replaced by periodic full reads.
+
+    Checking a token is a set lookup. The caller that finds the copy older
+    than ``refresh_seconds`` reads the collection (``begin_refresh`` lets one
+    caller at a time do it; the rest keep using the current copy), so a
+    process queries once per interval however many tokens it sees.
+    Revocations made in this process apply here at once.
+    """
+
+    # Only what is_revoked needs
+    projection = {"_id": 1, "valid_after": 1}
+
+    def __init__(self, refresh_seconds):
+        self.refresh_seconds = refresh_seconds
+        self._tokens = frozenset()
+        self._users = {}
+        self._loaded_at = None
+        self._refreshing = False
+        self._refresh_started = 0.0
+        # (time, doc) added by this process, re-applied over a read that began before them
+        self._local = []
+        self._lock = threading.Lock()
+        self.refreshes = 0
+        self.failures = 0
+        self.last_error = None
+
+    def begin_refresh(self):
+        """True if the caller should read the collection and pass the documents to finish_refresh."""
+        with self._lock:
+            now = time.monotonic()
+            if self._loaded_at is None:
+                # Nothing to answer from yet: every caller waits for a read
+                self._refresh_started = now
+                return True
+            if self._refreshing or now - self._loaded_at < self.refresh_seconds:
+                return False
+            self._refreshing = True
+            self._refresh_started = now
+            return True
+
+    def finish_refresh(self, docs):
+        tokens, users = set(), {}
+        for doc in docs:
+            self._apply(doc, tokens, users)
+        with self._lock:
+            self._local = [(added, doc) for added, doc in self._local if added >= self._refresh_started]
+            for _, doc in self._local:
+                self._apply(doc, tokens, users)
+            self._tokens, self._users = frozenset(tokens), users
+            self._loaded_at = time.monotonic()
+            self._refreshing = False
+            self.refreshes += 1
+
+    def abort_refresh(self, exc):
+        """Keep the current copy after a failed read; the next caller retries."""
+        with self._lock:
+            self._refreshing = False
+            self.failures += 1
+            self.last_error = repr(exc)
+
+    @staticmethod
+    def _apply(doc, tokens, users):
+        if str(doc["_id"]).startswith("user:"):
+            username = doc["_id"][5:]
+            users[username] = max(users.get(username, 0), doc.get("valid_after", 0))
+        else:
+            tokens.add(doc["_id"])
+
+    def add(self, doc):
+        """Apply a revocation document written by this process."""
+        with self._lock:
+            self._local.append((time.monotonic(), doc))
+            tokens, users = set(self._tokens), dict(self._users)
+            self._apply(doc, tokens, users)
+            self._tokens, self._users = frozenset(tokens), users
+
+    def is_revoked(self, claims):
+        username, issued_at, token_id, _ = claims
+        tokens, users = self._tokens, self._users
+        return token_id in tokens or issued_at < users.get(username, 0)
+
+    def stats(self):
+        with self._lock:
+            return {"tokens": len(self._tokens), "users": len(self._users),
+                    "refresh_seconds": self.refresh_seconds, "refreshes": self.refreshes,
+                    "age_seconds": None if self._loaded_at is None else time.monotonic() - self._loaded_at,
+                    "failures": self.failures, "last_error": self.last_error}
+
+
+token_cache = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+revocation_cache = RevocationCache(REVOCATION_CACHE_TTL)
+
+
 def generate_token(username: str):
+    now = datetime.datetime.now(datetime.timezone.utc)
     payload = {
         "username": username,
-        "exp": datetime.datetime.utcnow() + datetime.timedelta(seconds=JWT_EXP_DELTA_SECONDS)
+        "iat": now.timestamp(),
+        "exp": now + datetime.timedelta(seconds=JWT_EXP_DELTA_SECONDS),
+        "jti": uuid.uuid4().hex,
     }
     token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return token
 
-def verify_token(token: str):
+def token_claims(token: str):
+    """(username, issued at, token id) of a validly signed, unexpired token, else None."""
+    claims = token_cache.get(token)
+    if claims is None:
+        try:
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
+            return None
+        # Tokens issued before ids were added are identified by their hash
+        token_id = payload.get('jti') or hashlib.sha256(token.encode()).hexdigest()
+        claims = (payload['username'], payload.get('iat', 0), token_id, payload.get('exp', 0))
+        token_cache.put(token, claims, ttl=payload.get('exp', 0) - time.time())
+    return claims
+
+def token_revocation(claims):
+    """The db.revoked_tokens document that ends one token (logout); it expires with the token."""
+    username, _, token_id, exp = claims
+    return {"_id": token_id, "username": username,
+            "expires_at": datetime.datetime.fromtimestamp(exp, datetime.timezone.utc)}
+
+def user_revocation(username: str):
+    """The db.revoked_tokens document that ends every token issued to username so far (password change).
+
+    It can expire once the last of those tokens has.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return {"_id": f"user:{username}", "username": username, "valid_after": now.timestamp(),
+            "expires_at": now + datetime.timedelta(seconds=JWT_EXP_DELTA_SECONDS)}
+
+def refresh_revocations():
+    """Re-read db.revoked_tokens when this process's copy is due (see RevocationCache)."""
+    if not revocation_cache.begin_refresh():
+        return
+    # db connects on import, and serve.py imports this module before forking
+    from db import revoked_tokens_collection
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload['username']
-    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
+        docs = list(revoked_tokens_collection.find({}, RevocationCache.projection))
+    except Exception as exc:
+        revocation_cache.abort_refresh(exc)
+        raise
+    revocation_cache.finish_refresh(docs)
+
+def verify_token(token: str):
+    claims = token_claims(token)
+    if claims is None:
         return None
+    refresh_revocations()
+    return None if revocation_cache.is_revoked(claims) else claims[0]
+
+def revoke_token(token: str):
+    """Reject this token from now on, in every worker (logout)."""
+    claims = token_claims(token)
+    if claims is None:
+        return
+    from db import revoked_tokens_collection
+    doc = token_revocation(claims)
+    revoked_tokens_collection.replace_one({"_id": doc["_id"]}, doc, upsert=True)
+    revocation_cache.add(doc)
+
+def revoke_user_tokens(username: str):
+    """Reject every token issued to this user so far, in every worker (password change)."""
+    from db import revoked_tokens_collection
+    doc = user_revocation(username)
+    revoked_tokens_collection.replace_one({"_id": doc["_id"]}, doc, upsert=True)
+    # This process applies it at once; other workers within REVOCATION_CACHE_TTL
+    revocation_cache.add(doc)
+
+def bearer_token():
+    return request.headers.get('Authorization', '').replace('Bearer ', '')
+
+def require_auth(view):
+    """Reject the request with 401 unless it carries a valid token; passes the username to the view."""
+    @functools.wraps(view)
+    def wrapped(*args, **kwargs):
+        with timed('jwt'):
+            username = verify_token(bearer_token())
+        if not username:
+            return jsonify({"error": "Unauthorized"}), 401
+        return view(username, *args, **kwargs)
+    return wrapped
+
+
+_cpu_pool = None
+_cpu_pool_lock = threading.Lock()
+
+
+async def run_cpu(fn, *args):
+    """Await fn(*args) on the bounded CPU pool, keeping the request's context (metrics stages)."""
+    global _cpu_pool
+    if _cpu_pool is None:
+        with _cpu_pool_lock:
+            if _cpu_pool is None:
+                _cpu_pool = ThreadPoolExecutor(ASYNC_CPU_WORKERS, thread_name_prefix='async-cpu')
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_cpu_pool, context.run, fn, *args)
@@ -0,0 +1,316 @@
+import glob
+import os
+import re
+import threading
+import time
+import uuid
+from bson import json_util
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+
+try:
+    import fcntl
+except ImportError:  # Windows: no shared spill directories between processes
+    fcntl = None
+
+DUPLICATE_KEY = 11000
+
+
+def new_documents(docs, exc):
+    """The documents an unordered insert_many stored despite exc; re-raises exc unless every error is a duplicate key."""
+    errors = exc.details.get('writeErrors', [])
+    if any(err.get('code') != DUPLICATE_KEY for err in errors):
+        raise exc
+    duplicates = {err['index'] for err in errors}
+    return [doc for i, doc in enumerate(docs) if i not in duplicates]
+
+
+def insert_ignoring_duplicates(collection, docs):
+    """insert_many that treats documents hitting a unique key (_id or row_hash) as written, so replays are idempotent.
+
+    Returns the documents that were actually new.
+    """
+    try:
+        collection.insert_many(docs, ordered=False)
+    except BulkWriteError as exc:
+        return new_documents(docs, exc)
+    return docs
+
+
+class WriteBehindWriter:
+    """Buffers prediction documents in memory and writes them with insert_many.
+
+    A background thread flushes whatever is buffered every ``flush_ms`` (or
+    as soon as ``batch_size`` documents are waiting). ``submit`` blocks while
+    ``max_queue`` documents are already buffered and, after ``put_timeout``
+    seconds, writes the documents itself so callers are slowed down rather
+    than dropped.
+
+    With a ``spill_dir`` every submitted document is first appended to a
+    local segment file; a segment is deleted only after all of its documents
+    are in Mongo, and segments left by dead writers are replayed by the
+    background thread once it starts. A replay that fails (Mongo still down)
+    is retried every ``flush_ms`` like a failed flush, while new documents
+    keep being buffered; the error is kept in ``stats()`` rather than raised.
+    Segments are named after a per-writer id, and each writer holds a lock on
+    its own ``writer-<id>.lock`` for as long as it lives, so writers sharing a
+    spill directory never replay each other's live segments. Whether a
+    writer is alive is decided only by that lock: PIDs are reused (a
+    container's app is always PID 1), so a PID says nothing about it.
+    Documents get their ``_id`` up front so a replay never inserts one twice.
+
+    ``on_written`` is called with every batch of newly inserted documents.
+    """
+
+    def __init__(self, collection, max_queue=10_000, batch_size=1_000, flush_ms=200.0,
+                 put_timeout=5.0, spill_dir=None, fsync=False, on_written=None):
+        self.collection = collection
+        self.on_written = on_written
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000.0
+        self.put_timeout = put_timeout
+        self.spill_dir = spill_dir
+        self.fsync = fsync
+
+        self._buffer = []
+        self._segments = []
+        self._spill = None
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.submitted = 0
+        self.written = 0
+        self.flushes = 0
+        self.failures = 0
+        self.callback_failures = 0
+        self.blocked_submits = 0
+        self.direct_writes = 0
+        self.replayed = 0
+        self.replay_failures = 0
+        self.last_replay_error = None
+        self._replay_pending = bool(spill_dir)
+        self.total_flush_time = 0.0
+        self.max_flush_time = 0.0
+        self.last_error = None
+
+        self.instance = uuid.uuid4().hex
+        self._lock_file = None
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._lock_file = open(os.path.join(spill_dir, f"writer-{self.instance}.lock"), 'w')
+            if fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._open_segment()
+
+        self._worker = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._worker.start()
+
+    # ---------------------- spill segments ----------------------
+    def _open_segment(self):
+        path = os.path.join(self.spill_dir, f"predictions-{self.instance}-{time.time_ns()}.spill")
+        self._spill = open(path, 'a', encoding='utf-8')
+        self._segments.append(path)
+
+    def _owner_alive(self, owner):
+        """Whether the writer that named its files after owner (an id, or a PID for older segments) still runs."""
+        if owner == self.instance:
+            return True
+        if fcntl is None:
+            return False
+        try:
+            with open(os.path.join(self.spill_dir, f"writer-{owner}.lock"), 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        return False
+
+    def replay_spill(self):
+        """Insert documents left in spill segments by dead writers, then delete them.
+
+        Raises whatever the insert raised; segments replayed before the
+        failure are already deleted, and the rest are retried by the next call.
+        """
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, '*.spill'))):
+            match = re.search(r'predictions-([0-9a-f]+)-', os.path.basename(path))
+            if match and self._owner_alive(match.group(1)):
+                continue
+            try:
+                with open(path, encoding='utf-8') as f:
+                    # A crash can leave the last line half written; it was never acknowledged
+                    docs = []
+                    for line in f:
+                        try:
+                            docs.append(json_util.loads(line))
+                        except ValueError:
+                            pass
+            except FileNotFoundError:
+                # Another writer starting up replayed it first
+                continue
+            self._insert(docs)
+            with self._cond:
+                self.replayed += len(docs)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        for lock_path in glob.glob(os.path.join(self.spill_dir, 'writer-*.lock')):
+            match = re.search(r'writer-([0-9a-f]+)\.lock', os.path.basename(lock_path))
+            if match and not self._owner_alive(match.group(1)):
+                try:
+                    os.remove(lock_path)
+                except FileNotFoundError:
+                    pass
+
+    # ---------------------- producers ----------------------
+    def submit(self, docs):
+        for doc in docs:
+            doc.setdefault('_id', ObjectId())
+
+        with self._cond:
+            if len(self._buffer) + len(docs) > self.max_queue and not self._closed:
+                self.blocked_submits += 1
+                deadline = time.monotonic() + self.put_timeout
+                # An oversized submit only waits for the buffer to empty
+                while self._buffer and len(self._buffer) + len(docs) > self.max_queue:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or self._closed:
+                        break
+                    self._cond.wait(remaining)
+
+            if self._closed or len(self._buffer) + len(docs) > max(self.max_queue, len(docs)):
+                direct = True
+            else:
+                direct = False
+                if self._spill is not None:
+                    self._spill.writelines(json_util.dumps(doc) + '\n' for doc in docs)
+                    self._spill.flush()
+                    if self.fsync:
+                        os.fsync(self._spill.fileno())
+                self._buffer.extend(docs)
+                self.submitted += len(docs)
+                if len(self._buffer) >= self.batch_size:
+                    self._cond.notify_all()
+
+        if direct:
+            # Queue still full (or shutting down): write in the caller's thread
+            self._insert(docs)
+            with self._cond:
+                self.direct_writes += len(docs)
+
+    def _insert(self, docs):
+        for start in range(0, len(docs), self.batch_size):
+            inserted = insert_ignoring_duplicates(self.collection, docs[start:start + self.batch_size])
+            if self.on_written is not None and inserted:
+                try:
+                    self.on_written(inserted)
+                except Exception as exc:
+                    # The documents are stored; only the follow-up failed, so don't retry them
+                    with self._cond:
+                        self.callback_failures += 1
+                        self.last_error = repr(exc)
+
+    # ---------------------- background flushing ----------------------
+    def _take(self):
+        with self._cond:
+            if len(self._buffer) < self.batch_size and not self._closed:
+                self._cond.wait(self.flush_interval)
+            batch, self._buffer = self._buffer, []
+            segments = []
+            if batch and self._spill is not None:
+                # Later submits go to a fresh segment; these are deleted once written
+                self._spill.close()
+                segments, self._segments = self._segments, []
+                self._open_segment()
+            self._cond.notify_all()
+            return batch, segments
+
+    def _flush(self, batch, segments):
+        started = time.perf_counter()
+        try:
+            self._insert(batch)
+        except Exception as exc:
+            # Put the batch back in front and retry on the next tick
+            with self._cond:
+                self.failures += 1
+                self.last_error = repr(exc)
+                self._buffer[:0] = batch
+                self._segments[:0] = segments
+            return False
+
+        for path in segments:
+            os.remove(path)
+        elapsed = time.perf_counter() - started
+        with self._cond:
+            self.written += len(batch)
+            self.flushes += 1
+            self.total_flush_time += elapsed
+            self.max_flush_time = max(self.max_flush_time, elapsed)
+        return True
+
+    def _replay(self):
+        try:
+            self.replay_spill()
+        except Exception as exc:
+            with self._cond:
+                self.replay_failures += 1
+                self.last_replay_error = repr(exc)
+            return
+        with self._cond:
+            self._replay_pending = False
+
+    def _run(self):
+        while True:
+            if self._replay_pending:
+                # Retried on every tick until it succeeds; _take waits flush_ms in between
+                self._replay()
+            batch, segments = self._take()
+            if batch and not self._flush(batch, segments):
+                time.sleep(self.flush_interval)
+            with self._cond:
+                if self._closed and not self._buffer:
+                    self._cond.notify_all()
+                    return
+
+    def close(self, timeout=30.0):
+        """Flush everything buffered and stop the writer (graceful shutdown)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join(timeout)
+        if self._spill is not None:
+            self._spill.close()
+            # Nothing is left unwritten, so the current segment is empty
+            for path in self._segments:
+                if not self._buffer and os.path.exists(path) and os.path.getsize(path) == 0:
+                    os.remove(path)
+            if not self._buffer and not glob.glob(os.path.join(self.spill_dir, f"predictions-{self.instance}-*.spill")):
+                os.remove(self._lock_file.name)
+            self._lock_file.close()
+
+    def stats(self):
+        with self._cond:
+            flushes = self.flushes or 1
+            return {
+                "queue_depth": len(self._buffer),
+                "max_queue": self.max_queue,
+                "batch_size": self.batch_size,
+                "flush_ms": self.flush_interval * 1000.0,
+                "submitted": self.submitted,
+                "written": self.written,
+                "flushes": self.flushes,
+                "avg_flush_ms": self.total_flush_time / flushes * 1000.0,
+                "max_flush_ms": self.max_flush_time * 1000.0,
+                "failures": self.failures,
+                "callback_failures": self.callback_failures,
+                "last_error": self.last_error,
+                "blocked_submits": self.blocked_submits,
+                "direct_writes": self.direct_writes,
+                "replayed": self.replayed,
+                "replay_pending": self._replay_pending,
+                "replay_failures": self.replay_failures,
+                "last_replay_error": self.last_replay_error,
+                "spill_dir": self.spill_dir,
+            }
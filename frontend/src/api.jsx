@@ -19,6 +19,11 @@ axiosInstance.interceptors.request.use(config => {
 export const registerUser = (data) => axiosInstance.post("/auth/register", data);
 export const loginUser = (data) => axiosInstance.post("/auth/login", data);
 export const fetchUserProfile = () => axiosInstance.get("/auth/profile");
+// Reads the token now: interceptors run after the caller has cleared it
+export const logoutUser = () =>
+  axiosInstance
+    .post("/auth/logout", null, { headers: { Authorization: `Bearer ${localStorage.getItem("token")}` } })
+    .catch(() => {});
 
 // Prediction API calls
 export const manualPredict = (data) => axiosInstance.post("/predict/manual", data);
@@ -33,5 +38,11 @@ export const csvPredict = (file) => {
 
 export const fetchHistory = () => axiosInstance.get("/predict/history");
 export const deleteHistoryItem = (id) => axiosInstance.delete(`/predict/history/${id}`);
-export const fetchHistoryByStudentId = (studentId) =>
-  axiosInstance.get(`/predict/history/student/${studentId}`);
+// Most recent predictions first, only the fields the Suggestion page reads
+export const fetchHistoryByStudentId = (studentId, limit = 200) =>
+  axiosInstance.get(`/predict/history/student/${studentId}`, {
+    params: { order: "desc", limit, fields: "input_data,predicted_engagement_level,feedback,timestamp" },
+  });
+// Rolling means downsampled server-side to at most `points` per student
+export const fetchStudentTrend = (studentId, points = 300, window = "15min") =>
+  axiosInstance.get("/predict/trend", { params: { student_id: studentId, points, window } });
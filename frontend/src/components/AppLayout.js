@@ -1,11 +1,13 @@
 // components/AppLayout.js
 import React from "react";
 import { Link, useNavigate } from "react-router-dom";
+import { logoutUser } from "../api";
 
 const AppLayout = ({ children }) => {
   const navigate = useNavigate();
 
   const handleLogout = () => {
+    logoutUser();
     localStorage.removeItem("token");
     navigate("/login");
   };
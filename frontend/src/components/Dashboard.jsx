@@ -25,6 +25,7 @@ const Dashboard = () => {
   const [csvFile, setCsvFile] = useState(null);
   const [csvResults, setCsvResults] = useState([]);
   const [csvError, setCsvError] = useState("");
+  const [csvRejected, setCsvRejected] = useState([]);
 
   const [showManual, setShowManual] = useState(false);
   const [showCSV, setShowCSV] = useState(false);
@@ -51,6 +52,7 @@ const Dashboard = () => {
   const handleCsvSubmit = async () => {
     setCsvResults([]);
     setCsvError("");
+    setCsvRejected([]);
 
     if (!csvFile) {
       setCsvError("Please select a CSV file");
@@ -59,9 +61,11 @@ const Dashboard = () => {
 
     try {
       const res = await csvPredict(csvFile);
-      setCsvResults(res.data);
+      setCsvResults(res.data.results);
+      setCsvRejected(res.data.rejected || []);
     } catch (err) {
       setCsvError(err.response?.data?.error || "CSV Prediction failed");
+      setCsvRejected(err.response?.data?.rejected || []);
     }
   };
 
@@ -203,6 +207,21 @@ const Dashboard = () => {
           </div>
           {csvError && <p className="text-red-600 mb-4">{csvError}</p>}
 
+          {csvRejected.length > 0 && (
+            <details className="mb-4 text-sm text-red-700">
+              <summary className="cursor-pointer">
+                {csvRejected.length} row(s) skipped due to out-of-range values
+              </summary>
+              <ul className="list-disc ml-6 mt-2">
+                {csvRejected.map((r) => (
+                  <li key={r.row}>
+                    Row {r.row + 1} ({r.student_id}): {r.errors.join(" | ")}
+                  </li>
+                ))}
+              </ul>
+            </details>
+          )}
+
           {csvResults.length > 0 && (
             <div className="overflow-x-auto">
               <table className="min-w-full border border-gray-300 rounded-md border-collapse">
@@ -1,6 +1,7 @@
 // src/components/Header.jsx
 import React from "react";
 import { Link, useLocation, useNavigate } from "react-router-dom";
+import { logoutUser } from "../api";
 
 const Header = () => {
   const location = useLocation();
@@ -12,6 +13,7 @@ const Header = () => {
   }
 
   const handleLogout = () => {
+    logoutUser();
     localStorage.removeItem("token");
     navigate("/login");
   };
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from "react";
-import { fetchHistory, deleteHistoryItem } from "../api";
+import { fetchHistory, deleteHistoryItem, logoutUser } from "../api";
 import { useNavigate } from "react-router-dom";
 
 const History = () => {
@@ -8,6 +8,7 @@ const History = () => {
   const navigate = useNavigate();
 
   const handleLogout = () => {
+    logoutUser();
     localStorage.removeItem("token");
     navigate("/login");
   };
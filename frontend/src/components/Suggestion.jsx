@@ -1,5 +1,5 @@
 import React, { useState } from "react";
-import { fetchHistoryByStudentId } from "../api";
+import { fetchHistoryByStudentId, fetchStudentTrend } from "../api";
 import { useNavigate } from "react-router-dom";
 import { Line } from "react-chartjs-2";
 import {
@@ -26,6 +26,7 @@ ChartJS.register(
 const Suggestion = () => {
   const [studentId, setStudentId] = useState("");
   const [history, setHistory] = useState([]);
+  const [trend, setTrend] = useState(null);
   const [error, setError] = useState("");
   const navigate = useNavigate();
 
@@ -33,12 +34,16 @@ const Suggestion = () => {
     if (studentId.trim()) {
       fetchHistoryByStudentId(studentId.trim())
         .then((res) => {
-          setHistory(res.data);
+          // Oldest first, as the trend and "recent" calculations expect
+          setHistory([...res.data].reverse());
           setError("");
         })
         .catch((err) =>
           setError(err.response?.data?.error || "Search failed")
         );
+      fetchStudentTrend(studentId.trim())
+        .then((res) => setTrend(res.data.students[0] || null))
+        .catch(() => setTrend(null));
     }
   };
 
@@ -202,11 +207,13 @@ const Suggestion = () => {
             <h4 className="text-lg font-semibold mb-4">Physiological Trends</h4>
             <Line
               data={{
-                labels: history.map((h) => new Date(h.timestamp).toLocaleTimeString()),
+                labels: trend
+                  ? trend.timestamp.map((t) => new Date(t).toLocaleString())
+                  : history.map((h) => new Date(h.timestamp).toLocaleTimeString()),
                 datasets: [
                   {
                     label: "Heart Rate",
-                    data: history.map((h) => h.input_data?.HeartRate ?? 0),
+                    data: trend ? trend.HeartRate : history.map((h) => h.input_data?.HeartRate ?? 0),
                     borderColor: "rgb(239 68 68)",
                     backgroundColor: "rgba(239,68,68,0.2)",
                     fill: true,
@@ -215,7 +222,7 @@ const Suggestion = () => {
                   },
                   {
                     label: "Skin Conductance",
-                    data: history.map((h) => h.input_data?.SkinConductance ?? 0),
+                    data: trend ? trend.SkinConductance : history.map((h) => h.input_data?.SkinConductance ?? 0),
                     borderColor: "rgb(59 130 246)",
                     backgroundColor: "rgba(59,130,246,0.2)",
                     fill: true,
@@ -224,7 +231,7 @@ const Suggestion = () => {
                   },
                   {
                     label: "EEG",
-                    data: history.map((h) => h.input_data?.EEG ?? 0),
+                    data: trend ? trend.EEG : history.map((h) => h.input_data?.EEG ?? 0),
                     borderColor: "rgb(34 197 94)",
                     backgroundColor: "rgba(34,197,94,0.2)",
                     fill: true,
@@ -0,0 +1,195 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from artifacts import COMPILED_MAX_BATCH, INFERENCE_ENGINE
+from inference import CompiledForest
+
+# Only averaging forests: the compiled serving engine and the path
+# attributions need per-tree class probabilities
+CANDIDATES = {
+    'random_forest': RandomForestClassifier,
+    'extra_trees': ExtraTreesClassifier,
+}
+PARAM_GRID = {
+    'n_estimators': [25, 50, 100, 200],
+    'max_depth': [4, 6, 8, 12, None],
+}
+
+
+def sklearn_predict(model, scaler, compiled, X, features):
+    """Levels as a bundle computes them for batches over COMPILED_MAX_BATCH rows:
+    sklearn's apply finds the leaves, the compiled forest votes."""
+    local = model.apply(scaler.transform(pd.DataFrame(X, columns=features)))
+    return compiled.predict_from_leaves(local + compiled.roots)
+
+
+def served_path(rows):
+    """The engine ModelBundle.predict_exact uses for a batch of rows."""
+    if INFERENCE_ENGINE == 'sklearn':
+        return 'sklearn'
+    return 'compiled' if rows <= COMPILED_MAX_BATCH else 'sklearn_apply'
+
+
+def _median_ms(predict, batch, repeats):
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        predict(batch)
+        times.append(time.perf_counter() - started)
+    return float(np.median(times) * 1000.0)
+
+
+def measure_serving_cost(model, scaler, X, repeats=300, batch_rows=1_000):
+    """Latency of the served path plus size on disk and in memory for one fitted model.
+
+    Single rows always go through the compiled forest (unless
+    INFERENCE_ENGINE=sklearn). A batch of batch_rows is timed on both the
+    compiled forest and the sklearn fallback; batch_ms is whichever of the
+    two serving uses for that many rows (COMPILED_MAX_BATCH).
+    """
+    compiled = CompiledForest.from_estimators(model, scaler)
+    features = list(scaler.feature_names_in_)
+    rows = np.asarray(X, dtype=np.float64)
+    engines = {
+        'compiled': compiled.predict,
+        'sklearn_apply': lambda batch: sklearn_predict(model, scaler, compiled, batch, features),
+        'sklearn': lambda batch: model.predict(scaler.transform(pd.DataFrame(batch, columns=features))),
+    }
+
+    single_predict = engines[served_path(1)]
+    single = []
+    for i in range(repeats):
+        row = rows[i % len(rows)][None, :]
+        started = time.perf_counter()
+        single_predict(row)
+        single.append(time.perf_counter() - started)
+
+    batch = rows[np.arange(batch_rows) % len(rows)]
+    batch_repeats = max(repeats // 30, 3)
+    batch_ms = {engine: _median_ms(engines[engine], batch, batch_repeats) for engine in ('compiled', 'sklearn_apply')}
+    batch_engine = served_path(batch_rows)
+    if batch_engine not in batch_ms:
+        batch_ms[batch_engine] = _median_ms(engines[batch_engine], batch, batch_repeats)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        joblib.dump(model, os.path.join(tmp, 'model.pkl'))
+        compiled.save(os.path.join(tmp, 'compiled'))
+        disk_bytes = sum(os.path.getsize(os.path.join(dirpath, name))
+                         for dirpath, _, names in os.walk(tmp) for name in names)
+
+    single_ms = np.array(single) * 1000.0
+    return {
+        "single_p50_ms": float(np.percentile(single_ms, 50)),
+        "single_p99_ms": float(np.percentile(single_ms, 99)),
+        "batch_rows": batch_rows,
+        "batch_engine": batch_engine,
+        "batch_ms": batch_ms[batch_engine],
+        "batch_compiled_ms": batch_ms['compiled'],
+        "batch_sklearn_ms": batch_ms['sklearn_apply'],
+        "disk_bytes": disk_bytes,
+        # What a server keeps resident: the compiled arrays (sklearn is loaded lazily)
+        "memory_bytes": int(sum(getattr(compiled, name).nbytes
+                                for name in CompiledForest._arrays + CompiledForest._derived_arrays)),
+        "n_nodes": int(len(compiled.threshold)),
+        "max_depth": int(compiled.max_depth),
+    }
+
+
+def mark_frontier(results):
+    """Flag candidates no other candidate beats on both accuracy and single-row p99."""
+    for result in results:
+        result["frontier"] = not any(
+            other["cv_accuracy"] >= result["cv_accuracy"]
+            and other["single_p99_ms"] <= result["single_p99_ms"]
+            and (other["cv_accuracy"] > result["cv_accuracy"] or other["single_p99_ms"] < result["single_p99_ms"])
+            for other in results
+        )
+
+
+def search(X_train, y_train, scaler, latency_budget_ms, batch_budget_ms=None, memory_budget_mb=None,
+           n_jobs=-1, cv=5, random_state=42):
+    """Cross-validated search over forest kind, size and depth under a serving budget.
+
+    Every candidate is scored by CV accuracy, refit on the whole training
+    set and timed on the path serving would use. The most accurate candidate
+    whose single-row p99 (and, when given, batch latency and resident
+    memory) fits the budget wins; if none fits, the fastest one is chosen.
+    Returns (fitted model, report).
+    """
+    X_scaled = scaler.transform(X_train)
+    folds = StratifiedKFold(n_splits=cv, shuffle=True, random_state=random_state)
+
+    results = []
+    for kind, estimator_cls in CANDIDATES.items():
+        grid = GridSearchCV(estimator_cls(random_state=random_state), PARAM_GRID,
+                            scoring='accuracy', cv=folds, n_jobs=n_jobs, refit=False)
+        grid.fit(X_scaled, y_train)
+        for params, mean, std, fit_time in zip(grid.cv_results_['params'], grid.cv_results_['mean_test_score'],
+                                               grid.cv_results_['std_test_score'],
+                                               grid.cv_results_['mean_fit_time']):
+            results.append({"kind": kind, "params": params, "cv_accuracy": float(mean),
+                            "cv_std": float(std), "fit_seconds": float(fit_time)})
+
+    # Timing runs one candidate at a time so measurements don't compete for CPU
+    models = []
+    for result in results:
+        model = CANDIDATES[result["kind"]](random_state=random_state, n_jobs=1, **result["params"])
+        model.fit(X_scaled, y_train)
+        result.update(measure_serving_cost(model, scaler, X_train))
+        result["within_budget"] = (
+            result["single_p99_ms"] <= latency_budget_ms
+            and (batch_budget_ms is None or result["batch_ms"] <= batch_budget_ms)
+            and (memory_budget_mb is None or result["memory_bytes"] <= memory_budget_mb * 1024 * 1024)
+        )
+        models.append(model)
+    mark_frontier(results)
+
+    eligible = [i for i, result in enumerate(results) if result["within_budget"]]
+    if eligible:
+        best = max(eligible, key=lambda i: (results[i]["cv_accuracy"], -results[i]["single_p99_ms"]))
+    else:
+        best = min(range(len(results)), key=lambda i: results[i]["single_p99_ms"])
+    results[best]["selected"] = True
+
+    report = {
+        "budget": {"single_p99_ms": latency_budget_ms, "batch_ms": batch_budget_ms, "memory_mb": memory_budget_mb},
+        "cv_folds": cv,
+        "train_rows": int(len(X_train)),
+        "budget_met": bool(eligible),
+        "selected": results[best],
+        "candidates": sorted(results, key=lambda r: (-r["cv_accuracy"], r["single_p99_ms"])),
+    }
+    return models[best], report
+
+
+def print_frontier(report):
+    print(f"{'kind':<14} {'trees':>5} {'depth':>5} {'cv acc':>7} {'p99 ms':>7} {'batch ms':>9} "
+          f"{'compiled':>9} {'sklearn':>8} {'mem KB':>8}")
+    frontier = sorted((r for r in report["candidates"] if r["frontier"]), key=lambda r: r["single_p99_ms"])
+    for r in frontier:
+        mark = ' ← selected' if r.get("selected") else ('' if r["within_budget"] else ' (over budget)')
+        print(f"{r['kind']:<14} {r['params']['n_estimators']:>5} {str(r['params']['max_depth']):>5} "
+              f"{r['cv_accuracy']:>7.3f} {r['single_p99_ms']:>7.3f} {r['batch_ms']:>9.2f} "
+              f"{r['batch_compiled_ms']:>9.2f} {r['batch_sklearn_ms']:>8.2f} "
+              f"{r['memory_bytes'] / 1024:>8.0f}{mark}")
+    if report["candidates"]:
+        r = report["candidates"][0]
+        print(f"ℹ️ batch ms is {r['batch_rows']:,} rows on the served path ({r['batch_engine']}, "
+              f"COMPILED_MAX_BATCH={COMPILED_MAX_BATCH})")
+    if not report["budget_met"]:
+        print("⚠️ No candidate met the budget; the fastest one was selected")
+
+
+def write_report(report, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, default=lambda value: value.item() if hasattr(value, 'item') else str(value))
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import shap
+
+FEATURES = ['HeartRate', 'SkinConductance', 'EEG']
+LEVELS = range(3)  # 0=Low, 1=Moderate, 2=High
+CACHE_DIR = os.path.join('data', 'shap_cache')
+
+_explainer = None
+
+
+def stratified_sample(y, n, random_state=42):
+    """Row positions of a sample of about n rows with every class in its original proportion."""
+    y = np.asarray(y)
+    if n >= len(y):
+        return np.arange(len(y))
+    rng = np.random.default_rng(random_state)
+    picked = []
+    for level in np.unique(y):
+        members = np.flatnonzero(y == level)
+        take = max(1, round(n * len(members) / len(y)))
+        picked.append(rng.choice(members, size=min(take, len(members)), replace=False))
+    return np.sort(np.concatenate(picked))
+
+
+def model_checksum(model):
+    return hashlib.sha256(pickle.dumps(model, protocol=4)).hexdigest()
+
+
+def _init_worker(model, background, perturbation):
+    global _explainer
+    _explainer = shap.TreeExplainer(model, data=background, feature_perturbation=perturbation)
+
+
+def _explain_chunk(X_chunk):
+    values = _explainer.shap_values(X_chunk, check_additivity=False)
+    # Older shap returns one (rows, features) array per class
+    if isinstance(values, list):
+        values = np.stack(values, axis=-1)
+    return values
+
+
+def shap_values(model, X, background=None, perturbation='interventional', workers=1, chunk_rows=256):
+    """(rows, features, classes) SHAP values from TreeExplainer, computed in chunks across processes.
+
+    interventional explains against the background rows, as the served
+    summary always has; its cost grows with the background size.
+    tree_path_dependent needs no background and is faster, but attributes
+    through the trees' own cover, so its values (and top causes) can differ.
+    """
+    chunks = [X[start:start + chunk_rows] for start in range(0, len(X), chunk_rows)]
+    if workers <= 1 or len(chunks) == 1:
+        _init_worker(model, background, perturbation)
+        return np.concatenate([_explain_chunk(chunk) for chunk in chunks])
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model, background, perturbation)) as pool:
+        return np.concatenate(list(pool.map(_explain_chunk, chunks)))
+
+
+def summarize(values, y):
+    """{level: {feature: mean |SHAP|}} over the rows of each true level, as the bundle stores it.
+
+    The served summary has always used the first output's SHAP values.
+    """
+    y = np.asarray(y)
+    summary, stderr = {}, {}
+    for level in LEVELS:
+        class_shap = np.abs(values[y == level][..., 0])
+        summary[int(level)] = {name: float(v) for name, v in zip(FEATURES, class_shap.mean(axis=0))}
+        stderr[int(level)] = {name: float(v) for name, v in
+                              zip(FEATURES, class_shap.std(axis=0) / np.sqrt(max(len(class_shap), 1)))}
+    return summary, stderr
+
+
+def top_causes(summary):
+    return {level: [name for name, _ in sorted(weights.items(), key=lambda x: -x[1])[:2]]
+            for level, weights in summary.items()}
+
+
+def compare(sampled, full):
+    """Absolute and relative error of a sampled summary against the full one, and whether
+    the top-two causes the API serves are unchanged."""
+    errors = {}
+    for level, weights in full.items():
+        errors[level] = {
+            name: {"abs": abs(sampled[level][name] - value),
+                   "rel": abs(sampled[level][name] - value) / value if value else 0.0}
+            for name, value in weights.items()
+        }
+    worst = max(e["rel"] for level_errors in errors.values() for e in level_errors.values())
+    return {"per_level": errors, "max_rel_error": worst,
+            "top_causes_match": top_causes(sampled) == top_causes(full)}
+
+
+def shap_stage(model, X, y, samples=1_000, background_rows=100, perturbation='interventional',
+               workers=None, chunk_rows=256, check=False, cache_dir=CACHE_DIR, random_state=42):
+    """The per-level SHAP summary stored in a bundle, computed on a stratified sample.
+
+    The default matches the summary shap.Explainer(model, X_train) produced
+    before: interventional against 100 background rows.
+    Results are cached under ``cache_dir`` by model checksum, data checksum
+    and settings, so retraining with an unchanged model skips the stage.
+    With ``check`` a full computation (every training row explained,
+    interventional against the whole training set) also runs and the
+    sample's error against it is reported.
+    Returns (summary, report).
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    workers = workers or os.cpu_count() or 1
+    settings = {"samples": samples, "background_rows": background_rows, "perturbation": perturbation,
+                "random_state": random_state, "check": check}
+    data_digest = hashlib.sha256(X.tobytes() + y.astype(np.int64).tobytes()).hexdigest()
+    key = hashlib.sha256(f"{model_checksum(model)}|{data_digest}|{json.dumps(settings, sort_keys=True)}".encode()).hexdigest()
+    cache_file = os.path.join(cache_dir, f"{key}.json")
+    if os.path.exists(cache_file):
+        with open(cache_file) as f:
+            cached = json.load(f)
+        summary = {int(level): weights for level, weights in cached["summary"].items()}
+        return summary, {**cached["report"], "cached": True}
+
+    started = time.perf_counter()
+    explained = stratified_sample(y, samples, random_state)
+    background = None
+    if perturbation == 'interventional':
+        background = X[stratified_sample(y, background_rows, random_state + 1)]
+    values = shap_values(model, X[explained], background, perturbation, workers, chunk_rows)
+    summary, stderr = summarize(values, y[explained])
+    report = {
+        "explained_rows": int(len(explained)),
+        "total_rows": int(len(X)),
+        "background_rows": None if background is None else int(len(background)),
+        "perturbation": perturbation,
+        "workers": workers,
+        "seconds": time.perf_counter() - started,
+        "stderr": stderr,
+        "cached": False,
+    }
+
+    if check:
+        started = time.perf_counter()
+        full_values = shap_values(model, X, X, 'interventional', workers, chunk_rows)
+        full_summary, _ = summarize(full_values, y)
+        report["full_seconds"] = time.perf_counter() - started
+        report["error"] = compare(summary, full_summary)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump({"summary": summary, "report": report}, f, indent=2)
+    os.replace(tmp, cache_file)
+    return summary, report
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Training scripts are run from model_training/ with flat imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
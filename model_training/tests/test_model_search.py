@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+import model_search
+from inference import CompiledForest
+from model_search import measure_serving_cost, sklearn_predict
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(2_000, 3)), columns=['HeartRate', 'SkinConductance', 'EEG'])
+    y = np.digitize(X['HeartRate'] + 0.5 * X['EEG'], [-0.5, 0.5])
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=20, max_depth=6, random_state=42).fit(scaler.transform(X), y)
+    return model, scaler, X
+
+
+def test_sklearn_fallback_matches_the_model(fitted):
+    model, scaler, X = fitted
+    compiled = CompiledForest.from_estimators(model, scaler)
+    levels = sklearn_predict(model, scaler, compiled, X.to_numpy(), list(X.columns))
+    np.testing.assert_array_equal(levels, model.predict(scaler.transform(X)))
+
+
+@pytest.mark.parametrize('batch_rows, engine', [(100, 'compiled'), (1_000, 'sklearn_apply')])
+def test_batch_latency_is_timed_on_the_served_path(fitted, monkeypatch, batch_rows, engine):
+    model, scaler, X = fitted
+    monkeypatch.setattr(model_search, 'COMPILED_MAX_BATCH', 512)
+    cost = measure_serving_cost(model, scaler, X, repeats=30, batch_rows=batch_rows)
+    assert cost["batch_engine"] == engine
+    served = cost["batch_compiled_ms"] if engine == 'compiled' else cost["batch_sklearn_ms"]
+    assert cost["batch_ms"] == served
+
+
+def test_sklearn_engine_is_timed_as_served(fitted, monkeypatch):
+    model, scaler, X = fitted
+    monkeypatch.setattr(model_search, 'INFERENCE_ENGINE', 'sklearn')
+    cost = measure_serving_cost(model, scaler, X, repeats=30, batch_rows=100)
+    assert cost["batch_engine"] == 'sklearn'
+    assert cost["batch_ms"] > 0
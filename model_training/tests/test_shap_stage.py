@@ -0,0 +1,54 @@
+import os
+import numpy as np
+import pytest
+
+shap = pytest.importorskip('shap')
+from sklearn.ensemble import RandomForestClassifier
+from shap_stage import shap_stage, shap_values, stratified_sample
+
+
+@pytest.fixture(scope='module')
+def trained():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 3))
+    y = np.digitize(X[:, 0] + 0.5 * X[:, 2], [-0.5, 0.5])
+    model = RandomForestClassifier(n_estimators=10, max_depth=4, random_state=42).fit(X, y)
+    return model, X, y
+
+
+def test_cached_summary_equals_recomputed(trained, tmp_path):
+    model, X, y = trained
+    first, report = shap_stage(model, X, y, samples=120, workers=1, cache_dir=tmp_path / 'a')
+    assert not report["cached"]
+    cached, cached_report = shap_stage(model, X, y, samples=120, workers=1, cache_dir=tmp_path / 'a')
+    assert cached_report["cached"]
+    recomputed, recomputed_report = shap_stage(model, X, y, samples=120, workers=1, cache_dir=tmp_path / 'b')
+    assert not recomputed_report["cached"]
+    assert cached == first == recomputed
+    assert cached_report["perturbation"] == recomputed_report["perturbation"] == 'interventional'
+
+
+def test_settings_are_part_of_the_cache_key(trained, tmp_path):
+    model, X, y = trained
+    shap_stage(model, X, y, samples=120, workers=1, cache_dir=tmp_path)
+    fast, report = shap_stage(model, X, y, samples=120, perturbation='tree_path_dependent',
+                              workers=1, cache_dir=tmp_path)
+    assert not report["cached"]
+    assert report["background_rows"] is None
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_default_matches_the_original_explainer(trained):
+    model, X, y = trained
+    background = X[stratified_sample(y, 100, 43)]
+    assert len(background) == 100  # shap.Explainer keeps a 100-row background as given
+    expected = shap.Explainer(model, background)(X[:50], check_additivity=False).values
+    np.testing.assert_allclose(shap_values(model, X[:50], background), expected, atol=1e-10)
+
+
+def test_chunks_across_processes_match_one_pass(trained):
+    model, X, y = trained
+    background = X[:20]
+    one = shap_values(model, X[:60], background, chunk_rows=1_000)
+    chunked = shap_values(model, X[:60], background, workers=2, chunk_rows=16)
+    np.testing.assert_allclose(chunked, one, atol=1e-12)
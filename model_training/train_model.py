@@ -1,3 +1,4 @@
+import argparse
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
@@ -5,7 +6,30 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 import joblib
 import os
-import shap
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from artifacts import write_bundle
+from model_search import print_frontier, search, write_report
+from shap_stage import shap_stage
+
+parser = argparse.ArgumentParser(description="Train the engagement model and publish a new bundle")
+parser.add_argument('--search', action='store_true',
+                    help="Cross-validated search over forest kind, size and depth under a serving budget")
+parser.add_argument('--latency-budget-ms', type=float, default=1.0, help="Single-row p99 budget (compiled engine)")
+parser.add_argument('--batch-budget-ms', type=float, default=None, help="Budget for scoring 1,000 rows on the served path")
+parser.add_argument('--memory-budget-mb', type=float, default=None, help="Budget for the resident compiled forest")
+parser.add_argument('--n-jobs', type=int, default=-1, help="Parallel cross-validation jobs")
+parser.add_argument('--report', default='data/model_search.json', help="Where to write the search report")
+parser.add_argument('--shap-samples', type=int, default=1_000, help="Training rows explained for the SHAP summary")
+parser.add_argument('--shap-perturbation', choices=['tree_path_dependent', 'interventional'],
+                    default='interventional',
+                    help="TreeExplainer mode; tree_path_dependent is faster but changes what the summary means")
+parser.add_argument('--shap-background', type=int, default=100, help="Background rows for interventional SHAP")
+parser.add_argument('--shap-workers', type=int, default=None, help="Processes explaining chunks (default: CPU count)")
+parser.add_argument('--shap-check', action='store_true',
+                    help="Also run the full SHAP computation and report the sampled estimate's error")
+args = parser.parse_args()
 
 # Load dataset
 data2 = pd.read_csv('data/data2.csv')
@@ -49,30 +73,31 @@ scaler = StandardScaler()
 X_train_scaled = scaler.fit_transform(X_train)
 
 # Train model
-model = RandomForestClassifier(n_estimators=100, random_state=42)
-model.fit(X_train_scaled, y_train)
+if args.search:
+    model, report = search(X_train, y_train, scaler, args.latency_budget_ms, args.batch_budget_ms,
+                           args.memory_budget_mb, n_jobs=args.n_jobs)
+    print_frontier(report)
+    write_report(report, args.report)
+    print(f"📁 Model search report saved to: {args.report}")
+else:
+    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model.fit(X_train_scaled, y_train)
 
-# SHAP explanation (CPU mode)
-explainer = shap.Explainer(model, X_train_scaled)
-shap_values = explainer(X_train_scaled)
-
-# Compute SHAP summary
-shap_summary = {}
-for i in range(3):  # 0=Low, 1=Moderate, 2=High
-    class_shap = np.abs(shap_values.values[y_train == i])
-    means = class_shap.mean(axis=0)
-    shap_summary[int(i)] = {
-        name: float(val[0] if isinstance(val, (np.ndarray, list)) else val)
-        for name, val in zip(['HeartRate', 'SkinConductance', 'EEG'], means)
-    }
+# SHAP summary on a stratified sample, cached per model
+shap_summary, shap_report = shap_stage(
+    model, X_train_scaled, y_train, samples=args.shap_samples, background_rows=args.shap_background,
+    perturbation=args.shap_perturbation, workers=args.shap_workers, check=args.shap_check,
+)
+print(f"🧮 SHAP summary from {shap_report['explained_rows']:,} of {shap_report['total_rows']:,} rows "
+      + ("(cached)" if shap_report['cached'] else f"in {shap_report['seconds']:.1f} s"))
+if 'error' in shap_report:
+    print(f"🧮 Full run took {shap_report['full_seconds']:.1f} s; max relative error "
+          f"{shap_report['error']['max_rel_error']:.1%}, top causes "
+          + ("unchanged" if shap_report['error']['top_causes_match'] else "CHANGED"))
 
-# Save everything to backend/
-os.makedirs('backend', exist_ok=True)
-joblib.dump(model, 'backend/model.pkl')
-joblib.dump(scaler, 'backend/scaler.pkl')
-joblib.dump(column_means.to_dict(), 'backend/column_means.pkl')
-joblib.dump(shap_summary, 'backend/feature_importance_shap.pkl')
+# Save everything as a new versioned bundle under backend/artifacts/
+bundle_dir = write_bundle(model, scaler, shap_summary, column_means.to_dict())
 
 print("✅ Training done with stratified split.")
-print("📁 Saved: model, scaler, SHAP summary to backend/")
+print(f"📁 Saved: model, scaler, SHAP summary bundle to {bundle_dir}")
 print("📁 Test data saved to: data/test.csv")
@@ -0,0 +1,164 @@
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+import time
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet / Arrow IPC need pyarrow; the CSV layout works without it
+    pa = None
+
+FORMATS = ['csv', 'parquet', 'arrow']
+VALUE_COLUMNS = ['HeartRate', 'EEG', 'SkinConductance', 'timestamp']
+EXTENSIONS = {'parquet': 'parquet', 'arrow': 'arrow'}
+
+
+def require_pyarrow(fmt):
+    if fmt != 'csv' and pa is None:
+        raise SystemExit(f"❌ The {fmt} format needs pyarrow (pip install pyarrow)")
+
+
+def partition_path(root, student_id, session_date, fmt='csv'):
+    """Where one student's day lives.
+
+    CSV keeps the historical cleaneddata/<student>/cleaned_focus_data_<student>_<date>.csv
+    names; columnar formats use hive-style student_id=<s>/date=<d>/ directories so
+    pyarrow can prune partitions from the path alone.
+    """
+    if fmt == 'csv':
+        return os.path.join(root, student_id, f"cleaned_focus_data_{student_id}_{session_date}.csv")
+    return os.path.join(root, f"student_id={student_id}", f"date={session_date}", f"part-0.{EXTENSIONS[fmt]}")
+
+
+def write_partition(df, root, student_id, session_date, fmt='csv'):
+    """Write one converted export; returns the file written."""
+    path = partition_path(root, student_id, session_date, fmt)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if fmt == 'csv':
+        df.to_csv(path, index=False)
+        return path
+
+    require_pyarrow(fmt)
+    # student_id and date come from the directory names; fixed dtypes keep every partition's schema equal
+    values = df[VALUE_COLUMNS].astype({'HeartRate': float, 'EEG': float, 'SkinConductance': float})
+    table = pa.Table.from_pandas(values, preserve_index=False)
+    if fmt == 'parquet':
+        pq.write_table(table, path, compression='zstd')
+    else:
+        feather.write_feather(table, path, compression='lz4')
+    return path
+
+
+def detect_format(root):
+    for fmt in ('parquet', 'arrow'):
+        if glob.glob(os.path.join(root, 'student_id=*', 'date=*', f"*.{EXTENSIONS[fmt]}")):
+            return fmt
+    return 'csv'
+
+
+def read_focus_data(root, students=None, start=None, end=None, columns=None, fmt=None):
+    """Cleaned focus data for some students and dates, as one DataFrame.
+
+    ``students`` is a list of student ids, ``start``/``end`` inclusive
+    YYYY-MM-DD bounds and ``columns`` the columns to load (student_id and
+    date are always available). Only matching partitions are opened: for
+    Parquet / Arrow the filter is pushed down into the dataset scan and
+    unread columns are never decoded; for CSV the file names are filtered
+    before parsing and only ``columns`` are parsed.
+    """
+    fmt = fmt or detect_format(root)
+    if fmt == 'csv':
+        return _read_csv_layout(root, students, start, end, columns)
+
+    require_pyarrow(fmt)
+    partitioning = ds.partitioning(pa.schema([('student_id', pa.string()), ('date', pa.string())]), flavor='hive')
+    dataset = ds.dataset(root, format='parquet' if fmt == 'parquet' else 'ipc', partitioning=partitioning)
+
+    predicate = None
+    for clause in (
+        ds.field('student_id').isin(list(students)) if students else None,
+        ds.field('date') >= start if start else None,
+        ds.field('date') <= end if end else None,
+    ):
+        if clause is not None:
+            predicate = clause if predicate is None else predicate & clause
+
+    wanted = ['student_id', 'date'] + [col for col in (columns or VALUE_COLUMNS) if col not in ('student_id', 'date')]
+    return dataset.to_table(columns=wanted, filter=predicate).to_pandas()
+
+
+def _read_csv_layout(root, students, start, end, columns):
+    wanted = [col for col in (columns or VALUE_COLUMNS) if col not in ('student_id', 'date')]
+    frames = []
+    for path in sorted(glob.glob(os.path.join(root, '*', 'cleaned_focus_data_*.csv'))):
+        student_id = os.path.basename(os.path.dirname(path))
+        session_date = os.path.splitext(os.path.basename(path))[0][-10:]
+        if students and student_id not in students:
+            continue
+        if (start and session_date < start) or (end and session_date > end):
+            continue
+        frame = pd.read_csv(path, usecols=wanted, parse_dates=['timestamp'] if 'timestamp' in wanted else False)
+        frame.insert(0, 'date', session_date)
+        frame.insert(0, 'student_id', student_id)
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=['student_id', 'date'] + wanted)
+    return pd.concat(frames, ignore_index=True)
+
+
+def directory_size(root):
+    return sum(os.path.getsize(os.path.join(dirpath, name))
+               for dirpath, _, names in os.walk(root) for name in names if not name.startswith('.'))
+
+
+def compare(csv_root, repeats=3):
+    """Size on disk and load times of the CSV layout against Parquet and Arrow copies of it."""
+    full = read_focus_data(csv_root, fmt='csv')
+    if full.empty:
+        raise SystemExit(f"❌ No cleaned CSVs under {csv_root}")
+    students = sorted(full['student_id'].unique())
+    one_student = students[:1]
+    print(f"📦 {len(full):,} rows, {len(students)} students, "
+          f"{full.groupby(['student_id', 'date']).ngroups} partitions")
+
+    def timed(fn):
+        best = float('inf')
+        for _ in range(repeats):
+            started = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - started)
+        return best * 1000.0
+
+    scratch = tempfile.mkdtemp(prefix='focus_store_')
+    try:
+        layouts = {'csv': csv_root}
+        for fmt in ('parquet', 'arrow'):
+            if pa is None:
+                print(f"⚠️ pyarrow is not installed; skipping {fmt}")
+                continue
+            layouts[fmt] = os.path.join(scratch, fmt)
+            for (student_id, session_date), part in full.groupby(['student_id', 'date']):
+                write_partition(part, layouts[fmt], student_id, session_date, fmt)
+
+        print(f"{'layout':<8} {'size KB':>10} {'full ms':>9} {'1 student ms':>13} {'HeartRate only ms':>18}")
+        for fmt, root in layouts.items():
+            print(f"{fmt:<8} {directory_size(root) / 1024:>10.1f} "
+                  f"{timed(lambda: read_focus_data(root, fmt=fmt)):>9.1f} "
+                  f"{timed(lambda: read_focus_data(root, students=one_student, fmt=fmt)):>13.1f} "
+                  f"{timed(lambda: read_focus_data(root, columns=['HeartRate'], fmt=fmt)):>18.1f}")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare cleaned focus data layouts")
+    parser.add_argument('root', nargs='?', default='cleaneddata', help="Cleaned CSV directory")
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    compare(args.root, args.repeats)
@@ -1,7 +1,14 @@
+import argparse
+import hashlib
+import json
 import pandas as pd
-from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import glob
 import os
 import csv
+import time
+from focus_store import FORMATS, partition_path, require_pyarrow, write_partition
 
 def parse_custom_csv(filepath, student_id, session_date_str):
     session_date = datetime.strptime(session_date_str, "%Y-%m-%d")
@@ -51,11 +58,10 @@ def parse_custom_csv(filepath, student_id, session_date_str):
             session_df = session_df.replace('', pd.NA)
 
             try:
-                session_df['timestamp'] = session_df.apply(
-                    lambda row: current_start_dt +
-                                timedelta(minutes=int(float(row.get('Time, min', 0))),
-                                          seconds=int(float(row.get('Time, sec', 0)))), axis=1
-                )
+                # Whole minutes plus whole seconds, as for the original per-row timedelta
+                minutes = pd.to_numeric(session_df.get('Time, min', 0)).astype(float).astype('int64')
+                seconds = pd.to_numeric(session_df.get('Time, sec', 0)).astype(float).astype('int64')
+                session_df['timestamp'] = pd.Timestamp(current_start_dt) + pd.to_timedelta(minutes * 60 + seconds, unit='s')
             except Exception as e:
                 print(f"❌ Timestamp error: {e}")
                 continue
@@ -78,24 +84,123 @@ def parse_custom_csv(filepath, student_id, session_date_str):
         return pd.DataFrame(columns=["student_id", "HeartRate", "EEG", "SkinConductance", "timestamp"])
 
 
-# -------------------------
-# 👇 DEVELOPER SETTINGS
-# -------------------------
-file_path = r"pre-dataset\metrics6.csv"
-student_id = "Stu05"
-session_date = "2025-07-01"
-# -------------------------
-
-final_df = parse_custom_csv(file_path, student_id, session_date)
-
-if not final_df.empty:
-    output_dir = os.path.join("cleaneddata", student_id)
-    os.makedirs(output_dir, exist_ok=True)
-
-    output_file = os.path.join(output_dir, f"cleaned_focus_data_{student_id}_{session_date}.csv")
-    final_df.to_csv(output_file, index=False)
-
-    print(f"✅ Cleaned data saved to {output_file}")
-    print(final_df.head())
-else:
-    print("❌ No data to save.")
+def load_manifest(path):
+    """{relative file path: (student_id, session date)} from a CSV with file,student_id,session_date."""
+    manifest = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            manifest[os.path.normpath(row['file'].strip())] = (row['student_id'].strip(), row['session_date'].strip())
+    return manifest
+
+
+def file_hash(filepath, student_id, session_date, fmt='csv'):
+    """Content hash of an export, salted with the student, date and format it converts to."""
+    digest = hashlib.sha256(f"{student_id}|{session_date}|{fmt}|".encode())
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def convert_file(filepath, student_id, session_date, output_root, fmt='csv'):
+    """Convert one export (runs in a worker process); returns the number of rows written."""
+    final_df = parse_custom_csv(filepath, student_id, session_date)
+    if final_df.empty:
+        return 0
+    write_partition(final_df, output_root, student_id, session_date, fmt)
+    return len(final_df)
+
+
+def convert_tree(root, manifest, output_root, workers=None, force=False, fmt='csv'):
+    """Convert every metrics*.csv under root listed in the manifest, skipping converted content.
+
+    Converted hashes are kept in <output_root>/.converted.json; an export is
+    converted again only when its bytes, student, date or format change, or
+    its output file is missing.
+    """
+    state_file = os.path.join(output_root, '.converted.json')
+    converted = {}
+    if os.path.exists(state_file) and not force:
+        with open(state_file, encoding='utf-8') as f:
+            converted = json.load(f)
+
+    jobs, skipped, unmapped = [], 0, []
+    targets = {}
+    for filepath in sorted(glob.glob(os.path.join(root, '**', 'metrics*.csv'), recursive=True)):
+        rel = os.path.normpath(os.path.relpath(filepath, root))
+        if rel not in manifest:
+            unmapped.append(rel)
+            continue
+        student_id, session_date = manifest[rel]
+        output_file = partition_path(output_root, student_id, session_date, fmt)
+        if output_file in targets:
+            raise SystemExit(f"❌ {rel} and {targets[output_file]} both map to {student_id} on {session_date}")
+        targets[output_file] = rel
+        digest = file_hash(filepath, student_id, session_date, fmt)
+        if digest in converted and os.path.exists(output_file):
+            skipped += 1
+            continue
+        jobs.append(((filepath, student_id, session_date, output_root, fmt), output_file, digest))
+
+    for rel in unmapped:
+        print(f"⚠️ Not in manifest, skipped: {rel}")
+
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    rows = failed = 0
+
+    def record(job, result):
+        nonlocal rows, failed
+        args, output_file, digest = job
+        filepath = args[0]
+        try:
+            n = result()
+        except Exception as e:
+            failed += 1
+            print(f"❌ {os.path.relpath(filepath, root)}: {e}")
+            return
+        rows += n
+        converted[digest] = {"file": os.path.relpath(filepath, root), "output": output_file, "rows": n}
+        print(f"✅ {os.path.relpath(filepath, root)} → {output_file} ({n} rows)" if n
+              else f"❌ {os.path.relpath(filepath, root)}: no data to save")
+
+    try:
+        if workers == 1 or len(jobs) <= 1:
+            for job in jobs:
+                record(job, lambda: convert_file(*job[0]))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(convert_file, *job[0]): job for job in jobs}
+                for future in as_completed(futures):
+                    record(futures[future], future.result)
+    finally:
+        # Saved even when interrupted, so finished files are not converted again
+        os.makedirs(output_root, exist_ok=True)
+        tmp = state_file + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(converted, f, indent=1)
+        os.replace(tmp, state_file)
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    done = len(jobs) - failed
+    print(f"📊 {done} converted, {skipped} unchanged, {len(unmapped)} unmapped, {failed} failed "
+          f"in {elapsed:.2f} s with {workers} workers "
+          f"({done / elapsed:,.1f} files/sec, {rows / elapsed:,.0f} rows/sec)")
+    return done, skipped, rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert raw headset metrics*.csv exports into cleaned focus data")
+    parser.add_argument('root', nargs='?', default='pre-dataset', help="Directory tree of raw exports")
+    parser.add_argument('--manifest', required=True,
+                        help="CSV with file,student_id,session_date (file relative to root)")
+    parser.add_argument('--out', help="Output directory (default: cleaneddata, or cleaneddata-<format>)")
+    parser.add_argument('--format', choices=FORMATS, default='csv',
+                        help="csv files, or Parquet / Arrow IPC partitioned by student_id and date")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--force', action='store_true', help="Convert everything, ignoring earlier runs")
+    args = parser.parse_args()
+
+    require_pyarrow(args.format)
+    out = args.out or ('cleaneddata' if args.format == 'csv' else f"cleaneddata-{args.format}")
+    convert_tree(args.root, load_manifest(args.manifest), out, args.workers, args.force, args.format)
@@ -0,0 +1,71 @@
+import argparse
+import json
+import time
+import uuid
+from focus_store import read_focus_data
+from simulate_stream import connect, login
+
+# The columns the /jobs upload needs; the date partition is dropped
+UPLOAD_COLUMNS = ['student_id', 'timestamp', 'HeartRate', 'SkinConductance', 'EEG']
+
+
+def upload_csv(root, students=None, start=None, end=None):
+    """The cleaned focus data matching the filters as /jobs CSV bytes, and its row count."""
+    df = read_focus_data(root, students=students, start=start, end=end)
+    return df[UPLOAD_COLUMNS].to_csv(index=False).encode(), len(df)
+
+
+def submit_job(api, token, payload, filename='focus_data.csv'):
+    """POST a CSV to /predict/jobs; returns the queued job."""
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: text/csv\r\n\r\n"
+    ).encode() + payload + f"\r\n--{boundary}--\r\n".encode()
+    conn, base = connect(api)
+    conn.request('POST', f"{base}/predict/jobs", body,
+                 {'Authorization': f"Bearer {token}", 'Content-Type': f"multipart/form-data; boundary={boundary}"})
+    response = conn.getresponse()
+    job = json.loads(response.read())
+    if response.status != 202:
+        raise SystemExit(f"❌ Job was not accepted: {job}")
+    return job
+
+
+def wait_for(api, token, job_id, poll_seconds=1.0):
+    conn, base = connect(api)
+    while True:
+        conn.request('GET', f"{base}/predict/jobs/{job_id}", headers={'Authorization': f"Bearer {token}"})
+        job = json.loads(conn.getresponse().read())
+        print(f"⏳ {job['status']} {job['rows_done']:,}/{job['total_rows'] or 0:,} rows", flush=True)
+        if job['status'] in ('done', 'failed', 'cancelled'):
+            return job
+        time.sleep(poll_seconds)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Score stored focus data (CSV, Parquet or Arrow layout) as a background job")
+    parser.add_argument('root', nargs='?', default='cleaneddata', help="Cleaned data directory, any layout")
+    parser.add_argument('--api', default="http://localhost:5000/api")
+    parser.add_argument('--username')
+    parser.add_argument('--password')
+    parser.add_argument('--token', help="Use this token instead of logging in")
+    parser.add_argument('--students', nargs='+', help="Only these student ids")
+    parser.add_argument('--from', dest='start', help="First session date (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='end', help="Last session date (YYYY-MM-DD)")
+    parser.add_argument('--wait', action='store_true', help="Poll until the job finishes")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    payload, rows = upload_csv(args.root, args.students, args.start, args.end)
+    if not rows:
+        raise SystemExit("❌ No focus data matches those filters")
+    print(f"📦 Read {rows:,} rows from {args.root} in {time.perf_counter() - started:.2f}s")
+
+    token = args.token or login(args.api, args.username, args.password)
+    job = submit_job(args.api, token, payload)
+    print(f"🧵 Job {job['id']} queued")
+    if args.wait:
+        job = wait_for(args.api, token, job['id'])
+        print(f"✅ {job['status']}: {job['accepted']:,} scored, {job['rejected']:,} rejected, "
+              f"{job.get('duplicate_rows', 0):,} already stored")
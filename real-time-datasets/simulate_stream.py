@@ -0,0 +1,116 @@
+import argparse
+import glob
+import http.client
+import json
+import os
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+import pandas as pd
+from process import parse_custom_csv
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_schedule(n_students, session_date):
+    """Every sample of the pre-dataset sessions as (offset seconds, sample), in send order.
+
+    With more students than files, files are reused for extra student ids.
+    """
+    files = sorted(glob.glob(os.path.join(HERE, 'pre-dataset', '*.csv')))
+    frames = {path: parse_custom_csv(path, 'template', session_date) for path in files}
+    frames = {path: df for path, df in frames.items() if not df.empty}
+    if not frames:
+        raise SystemExit("❌ No usable session data in pre-dataset/")
+
+    schedule = []
+    for i in range(n_students):
+        df = list(frames.values())[i % len(frames)]
+        start = df['timestamp'].iloc[0]
+        for row in df.itertuples(index=False):
+            schedule.append(((row.timestamp - start).total_seconds(), {
+                "student_id": f"Sim{i + 1:03d}",
+                "HeartRate": None if pd.isna(row.HeartRate) else float(row.HeartRate),
+                "EEG": None if pd.isna(row.EEG) else float(row.EEG),
+                "SkinConductance": None,
+                "timestamp": row.timestamp.isoformat(),
+            }))
+    schedule.sort(key=lambda item: item[0])
+    return schedule
+
+
+def connect(url):
+    parts = urlsplit(url)
+    cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    return cls(parts.netloc, timeout=60), parts.path.rstrip('/')
+
+
+def login(api, username, password):
+    conn, base = connect(api)
+    conn.request('POST', f"{base}/auth/login", json.dumps({"username": username, "password": password}),
+                 {'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    body = json.loads(response.read())
+    if response.status != 200:
+        raise SystemExit(f"❌ Login failed: {body}")
+    return body['token']
+
+
+def subscribe(api, token):
+    conn, base = connect(api)
+    conn.request('GET', f"{base}/predict/stream/updates?{urlencode({'token': token})}")
+    response = conn.getresponse()
+    for raw in response:
+        line = raw.decode().strip()
+        if line.startswith('data: '):
+            update = json.loads(line[6:])
+            print(f"📡 {update['student_id']} level {update['PredictedEngagementLevel']} "
+                  f"(rolling {update['rolling_engagement']:.2f} over {update['window']})")
+
+
+def replay(api, token, schedule, speed):
+    """Send the whole schedule as one long-lived chunked NDJSON upload."""
+    def body():
+        started = time.monotonic()
+        for offset, sample in schedule:
+            if speed > 0:
+                delay = offset / speed - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            yield (json.dumps(sample) + '\n').encode()
+
+    conn, base = connect(api)
+    conn.request('POST', f"{base}/predict/stream/ingest", body(),
+                 {'Authorization': f"Bearer {token}", 'Content-Type': 'application/x-ndjson'},
+                 encode_chunked=True)
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay the pre-dataset headset sessions as a live stream")
+    parser.add_argument('--api', default="http://localhost:5000/api")
+    parser.add_argument('--username')
+    parser.add_argument('--password')
+    parser.add_argument('--token', help="Use this token instead of logging in")
+    parser.add_argument('--students', type=int, default=6, help="Simulated students (files are reused)")
+    parser.add_argument('--speed', type=float, default=10.0, help="Replay speed-up; 0 sends as fast as possible")
+    parser.add_argument('--date', default=pd.Timestamp.now().strftime("%Y-%m-%d"), help="Session date")
+    parser.add_argument('--watch', action='store_true', help="Print the engagement updates pushed back")
+    parser.add_argument('--linger', type=float, default=3.0, help="Seconds to keep watching after the replay")
+    args = parser.parse_args()
+
+    token = args.token or login(args.api, args.username, args.password)
+    schedule = load_schedule(args.students, args.date)
+    print(f"▶️ Replaying {len(schedule):,} samples for {args.students} students at {args.speed:g}x")
+
+    if args.watch:
+        threading.Thread(target=subscribe, args=(args.api, token), daemon=True).start()
+        time.sleep(0.5)
+
+    started = time.perf_counter()
+    status, summary = replay(args.api, token, schedule, args.speed)
+    print(f"✅ {status} {summary} in {time.perf_counter() - started:.1f} s")
+    if args.watch:
+        # The last samples are scored one batch interval after they are sent
+        time.sleep(args.linger)
@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+from focus_store import FORMATS, detect_format, read_focus_data, write_partition
+
+PARTITIONS = [('Stu01', '2025-07-01'), ('Stu01', '2025-07-02'), ('Stu02', '2025-07-01'), ('Stu03', '2025-07-03')]
+
+
+def partition_frame(student_id, session_date, n=3):
+    return pd.DataFrame({
+        'student_id': student_id,
+        'HeartRate': [60.0 + i for i in range(n)],
+        'EEG': [9.0 + i / 10 for i in range(n)],
+        'SkinConductance': None,
+        'timestamp': pd.date_range(f"{session_date} 09:00:00", periods=n, freq='30s'),
+    })
+
+
+@pytest.fixture(params=FORMATS)
+def layout(request, tmp_path):
+    fmt = request.param
+    if fmt != 'csv':
+        pytest.importorskip('pyarrow')
+    root = str(tmp_path / fmt)
+    for student_id, session_date in PARTITIONS:
+        write_partition(partition_frame(student_id, session_date), root, student_id, session_date, fmt)
+    return root, fmt
+
+
+def keys(df):
+    return sorted(set(zip(df['student_id'], df['date'])))
+
+
+def test_format_is_detected_from_the_layout(layout):
+    root, fmt = layout
+    assert detect_format(root) == fmt
+
+
+def test_full_read(layout):
+    root, fmt = layout
+    df = read_focus_data(root)
+    assert len(df) == 3 * len(PARTITIONS)
+    assert keys(df) == sorted(PARTITIONS)
+    assert list(df.columns) == ['student_id', 'date', 'HeartRate', 'EEG', 'SkinConductance', 'timestamp']
+    assert pd.api.types.is_datetime64_any_dtype(df['timestamp'])
+
+
+def test_student_and_date_filters(layout):
+    root, fmt = layout
+    assert keys(read_focus_data(root, students=['Stu01'])) == [('Stu01', '2025-07-01'), ('Stu01', '2025-07-02')]
+    # Bounds are inclusive on both ends
+    assert keys(read_focus_data(root, start='2025-07-02', end='2025-07-03')) == [
+        ('Stu01', '2025-07-02'), ('Stu03', '2025-07-03')]
+    assert keys(read_focus_data(root, students=['Stu01', 'Stu02'], end='2025-07-01')) == [
+        ('Stu01', '2025-07-01'), ('Stu02', '2025-07-01')]
+
+
+def test_columns_are_pruned(layout):
+    root, fmt = layout
+    df = read_focus_data(root, students=['Stu02'], columns=['HeartRate'])
+    assert list(df.columns) == ['student_id', 'date', 'HeartRate']
+    assert df['HeartRate'].tolist() == [60.0, 61.0, 62.0]
+
+
+def test_no_matching_partition(layout):
+    root, fmt = layout
+    df = read_focus_data(root, students=['Stu99'], columns=['EEG'])
+    assert df.empty
+    assert list(df.columns) == ['student_id', 'date', 'EEG']
@@ -0,0 +1,76 @@
+import csv
+import glob
+import os
+from datetime import datetime, timedelta
+import pandas as pd
+import pytest
+from focus_store import partition_path
+from process import convert_tree, load_manifest, parse_custom_csv
+
+PRE_DATASET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pre-dataset')
+
+
+def per_row_timestamps(path, session_date):
+    """Timestamps as the original converter built them: one timedelta per data row."""
+    timestamps, start, columns = [], None, []
+    with open(path, encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if not row or all(cell.strip() == '' for cell in row):
+                continue
+            if row[0].startswith("Session start time"):
+                start = datetime.strptime(f"{session_date} {row[1].strip()}", "%Y-%m-%d %H:%M:%S")
+            elif row[0].startswith("Markdown"):
+                columns = row[1:]
+            elif columns and (row[0].startswith("IAPF") or row[0].startswith("Baseline")):
+                values = dict(zip(columns, row[1:]))
+                timestamps.append(start + timedelta(minutes=int(float(values['Time, min'])),
+                                                    seconds=int(float(values['Time, sec']))))
+    return timestamps
+
+
+def write_export(path, start, rows):
+    """A one-session export shaped like the devices write them."""
+    lines = [f"Session start time,{start},,,", "Session stop time,23:59:59,,,",
+             "Markdown,\"Time, min\",\"Time, sec\",Heart Rate,Alpha Peak frequency"]
+    lines += [f"IAPF Calibration,{minute},{second},{hr},{eeg}" for minute, second, hr, eeg in rows]
+    path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    return str(path)
+
+
+@pytest.mark.parametrize('path', sorted(glob.glob(os.path.join(PRE_DATASET, 'metrics*.csv'))))
+def test_timestamps_match_per_row_timedelta(path):
+    df = parse_custom_csv(path, 'Stu01', '2025-07-01')
+    assert len(df) > 0
+    assert df['timestamp'].tolist() == per_row_timestamps(path, '2025-07-01')
+
+
+def test_fractional_times_are_truncated(tmp_path):
+    path = write_export(tmp_path / 'metrics1.csv', '09:15:05', [
+        (0, 30, 60.5, 9.1), (1.9, 90.7, 61, 9.2), (0, 0, '', 8.8), (2, 130, 70, ''),
+    ])
+    df = parse_custom_csv(path, 'Stu07', '2025-07-02')
+    assert df['timestamp'].tolist() == per_row_timestamps(path, '2025-07-02') == [
+        datetime(2025, 7, 2, 9, 15, 35), datetime(2025, 7, 2, 9, 17, 35),
+        datetime(2025, 7, 2, 9, 15, 5), datetime(2025, 7, 2, 9, 19, 15),
+    ]
+    assert df['student_id'].unique().tolist() == ['Stu07']
+    assert df['HeartRate'].isna().tolist() == [False, False, True, False]
+    assert df['EEG'].tolist()[:3] == [9.1, 9.2, 8.8]
+
+
+def test_unchanged_exports_are_not_converted_again(tmp_path):
+    root = tmp_path / 'raw'
+    root.mkdir()
+    write_export(root / 'metrics1.csv', '09:00:00', [(0, 30, 60, 9)])
+    write_export(root / 'metrics2.csv', '11:00:00', [(0, 30, 65, 10), (1, 60, 66, 11)])
+    (tmp_path / 'manifest.csv').write_text(
+        "file,student_id,session_date\nmetrics1.csv,Stu01,2025-07-01\nmetrics2.csv,Stu02,2025-07-01\n")
+    manifest = load_manifest(str(tmp_path / 'manifest.csv'))
+    out = str(tmp_path / 'out')
+
+    assert convert_tree(str(root), manifest, out, workers=1) == (2, 0, 3)
+    assert convert_tree(str(root), manifest, out, workers=1) == (0, 2, 0)
+    # Changed bytes are converted again
+    write_export(root / 'metrics2.csv', '11:00:00', [(0, 30, 65, 10)])
+    assert convert_tree(str(root), manifest, out, workers=1) == (1, 1, 1)
+    assert len(pd.read_csv(partition_path(out, 'Stu02', '2025-07-01'))) == 1